@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""Doppelte und fast gleiche Automationen ueber alle Packages finden.
+
+Jede Automation wird normalisiert, bevor verglichen wird:
+
+  - id, alias, description und trace zaehlen nicht
+  - Reihenfolge der Keys egal; trigger/triggers, condition/conditions,
+    action/actions, platform/trigger, service/action sind gleich
+  - Einzelwert und Liste sind gleich (entity_id: light.a == [light.a]),
+    Entity-/Area-/Device-Listen, Trigger und Bedingungen ohne Reihenfolge
+    (Aktionen behalten ihre Reihenfolge)
+  - entity_id direkt an einer Aktion == target: entity_id:
+  - Whitespace in Texten/Templates wird zusammengefasst
+
+Daraus entstehen drei Stufen:
+
+  Identisch        gleicher Fingerabdruck der normalisierten Automation
+  Gleiche Struktur gleicher Fingerabdruck, wenn Entity-IDs nur als Domain
+                   zaehlen (light.flur -> light.*) -- Blueprint-Kandidaten
+  Aehnlich         Jaccard-Aehnlichkeit der Merkmale (Pfad=Wert je Blatt)
+                   ab --threshold, gefunden per MinHash/LSH
+
+Kosten: die Merkmale und MinHash-Signaturen werden pro Datei gememot und
+mit dem ParseCache gespeichert. Gruppiert wird ueber Hash-Tabellen
+(Fingerabdruecke, LSH-Baender) -- nur Automationen, die sich ein Band
+teilen, werden paarweise verglichen; es gibt keinen Vergleich aller Paare.
+
+Nutzung:
+  python tools/automation_duplicates.py                   # alle Packages
+  python tools/automation_duplicates.py --threshold 0.7 --top 0
+  python tools/automation_duplicates.py --strict          # Exit 1 bei identischen
+"""
+
+import sys
+import json
+import struct
+import hashlib
+import argparse
+from collections import defaultdict
+from typing import NamedTuple
+
+from ha_yaml import (add_loader_arguments, collect_files, load_documents, open_cache,
+                     save_documents, DEFAULT_PACKAGES_DIR, PackageDocument)
+from dependency_graph import automation_node
+from entity_reference_checker import ENTITY_PATTERN, VALID_DOMAINS
+
+# Windows-Encoding fix: UTF-8 erzwingen
+if sys.stdout.encoding != "utf-8":
+    sys.stdout.reconfigure(encoding="utf-8")
+
+IGNORED_KEYS = {"id", "alias", "description", "trace"}
+# Singular (alt) -> Plural (neu), wie HA sie gleichwertig akzeptiert
+KEY_ALIASES = {
+    "trigger": "triggers",
+    "condition": "conditions",
+    "action": "actions",
+}
+UNORDERED_KEYS = {"entity_id", "area_id", "device_id", "floor_id", "label_id",
+                  "triggers", "conditions"}
+LIST_KEYS = UNORDERED_KEYS | {"actions", "sequence", "then", "else", "default",
+                              "to", "from", "not_to", "not_from", "event_type"}
+# Werte dieser Keys sind Typen/Services, keine Entity-Referenzen
+TYPE_KEYS = {"trigger", "condition", "action"}
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+DEFAULT_THRESHOLD = 0.8
+# NUM_PERM unabhaengige 32-Bit-Hashes pro Merkmal: je blake2b-Aufruf (64 Byte)
+# 16 Werte, unterschieden ueber das Salt
+_WORDS = struct.Struct("<16I")
+_SALTS = [f"minhash{i}".encode() for i in range(NUM_PERM // 16)]
+
+
+# ---------------------------------------------------------------------------
+# Normalisierung pro Automation (gememot)
+# ---------------------------------------------------------------------------
+def _scalar(value):
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, (bool, int, float)) or value is None:
+        return value
+    return str(value)
+
+
+def _sort_key(value) -> str:
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def normalize(value, section: str = ""):
+    """Kanonische Form eines Automations-Teilbaums (nur dict/list/Skalare).
+
+    section ist "" (Automation selbst), "triggers", "conditions" oder
+    "actions". Nur auf oberster Ebene sind trigger/condition/action die
+    Singular-Formen der Abschnitte; darunter sind es Typ-Keys.
+    """
+    if isinstance(value, list):
+        return [normalize(item, section) for item in value]
+    if not isinstance(value, dict):
+        return _scalar(value)
+
+    result = {}
+    for key, item in value.items():
+        key = str(key)
+        if section == "triggers" and key == "platform":
+            key = "trigger"
+        elif section == "actions" and key == "service":
+            key = "action"
+        elif not section and key in KEY_ALIASES:
+            key = KEY_ALIASES[key]
+        if key in ("triggers", "conditions", "actions"):
+            child = key
+        elif key in ("sequence", "then", "else", "default"):
+            child = "actions"
+        elif key in ("if", "while", "until"):
+            child = "conditions"
+        else:
+            child = section
+        item = normalize(item, child)
+        if key in LIST_KEYS and not isinstance(item, list):
+            item = [item]
+        if key in UNORDERED_KEYS:
+            item = sorted(item, key=_sort_key)
+        result[key] = item
+
+    # entity_id direkt an der Aktion == target: entity_id:
+    if section == "actions" and "action" in result and "entity_id" in result:
+        target = result.setdefault("target", {})
+        if isinstance(target, dict):
+            ids = target.get("entity_id", []) + result.pop("entity_id")
+            target["entity_id"] = sorted(set(map(str, ids)))
+    return result
+
+
+def _abstract(value, key: str = ""):
+    """Entity-IDs in Werten durch domain.* ersetzen (Struktur-Fingerabdruck)."""
+    if isinstance(value, dict):
+        return {k: _abstract(v, k) for k, v in value.items()}
+    if isinstance(value, list):
+        items = [_abstract(item, key) for item in value]
+        return sorted(items, key=_sort_key) if key in UNORDERED_KEYS else items
+    if isinstance(value, str) and key not in TYPE_KEYS:
+        return ENTITY_PATTERN.sub(
+            lambda m: m.group(1).split(".", 1)[0] + ".*"
+            if m.group(1).split(".", 1)[0] in VALID_DOMAINS else m.group(1), value)
+    return value
+
+
+def fingerprint(value) -> str:
+    return hashlib.blake2b(_sort_key(value).encode("utf-8"), digest_size=8).hexdigest()
+
+
+def features(value, path: str = "", out: set | None = None) -> set:
+    """Merkmale pfad=wert fuer jedes Blatt (Listen-Positionen zaehlen nicht)."""
+    if out is None:
+        out = set()
+    if isinstance(value, dict):
+        if not value:
+            out.add(f"{path}={{}}")
+        for key, item in value.items():
+            features(item, f"{path}/{key}", out)
+    elif isinstance(value, list):
+        if not value:
+            out.add(f"{path}=[]")
+        for item in value:
+            features(item, path, out)
+    else:
+        out.add(f"{path}={value!r}")
+    return out
+
+
+def minhash(items) -> tuple:
+    """MinHash-Signatur (NUM_PERM Werte) einer Merkmalsmenge."""
+    rows = []
+    for item in items:
+        data = item.encode("utf-8")
+        row = ()
+        for salt in _SALTS:
+            row += _WORDS.unpack(hashlib.blake2b(data, salt=salt).digest())
+        rows.append(row)
+    return tuple(map(min, zip(*rows)))
+
+
+def extract_automations(content, stem: str) -> list[tuple]:
+    """[(automation, fingerprint, struktur, merkmale, signatur), ...] einer Datei.
+
+    Als Tupel: Klassen aus diesem Skript sind im Cache nicht von jedem Skript
+    aus importierbar.
+    """
+    if isinstance(content, dict):
+        automations = content.get("automation")
+    else:
+        automations = content
+    result = []
+    if not isinstance(automations, list):
+        return result
+    for i, auto in enumerate(automations):
+        if not isinstance(auto, dict):
+            continue
+        body = normalize({k: v for k, v in auto.items() if k not in IGNORED_KEYS})
+        found = features(body)
+        if not found:
+            continue
+        result.append((automation_node(auto, i, stem), fingerprint(body),
+                       fingerprint(_abstract(body)), tuple(sorted(found)),
+                       minhash(found)))
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Gruppierung
+# ---------------------------------------------------------------------------
+class Automation(NamedTuple):
+    name: str
+    file: str
+    exact: str
+    structure: str
+    features: frozenset
+    signature: tuple
+
+
+class Group(NamedTuple):
+    kind: str                   # "identisch", "struktur", "aehnlich"
+    members: list               # [Automation]
+    similarity: float           # kleinste bestaetigte Aehnlichkeit (1.0 bei identisch)
+
+
+class DuplicateReport:
+    def __init__(self):
+        self.automations = []                   # [Automation]
+        self.groups = []                        # [Group]
+        self.candidates = 0                     # per LSH verglichene Paare
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def _find(parent: list, i: int) -> int:
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def _buckets(items: list, key) -> list[list]:
+    groups = defaultdict(list)
+    for item in items:
+        groups[key(item)].append(item)
+    return [g for g in groups.values() if len(g) > 1]
+
+
+def group_automations(automations: list[Automation],
+                      threshold: float = DEFAULT_THRESHOLD) -> DuplicateReport:
+    """Identische, strukturgleiche und aehnliche Automationen gruppieren."""
+    report = DuplicateReport()
+    report.automations = automations
+    order = lambda a: (a.file, a.name)
+
+    exact = _buckets(automations, lambda a: a.exact)
+    for members in exact:
+        report.groups.append(Group("identisch", sorted(members, key=order), 1.0))
+
+    # Pro Fingerabdruck ein Vertreter -- Kopien kommen nicht noch einmal vor
+    first = {}
+    for auto in automations:
+        first.setdefault(auto.exact, auto)
+    reps = list(first.values())
+    for members in _buckets(reps, lambda a: a.structure):
+        similarity = min(jaccard(members[0].features, m.features) for m in members[1:])
+        report.groups.append(Group("struktur", sorted(members, key=order), similarity))
+
+    # LSH: Kandidaten teilen mindestens ein Band der Signatur
+    bands = defaultdict(list)
+    for i, auto in enumerate(reps):
+        for band in range(BANDS):
+            bands[band, auto.signature[band * ROWS:(band + 1) * ROWS]].append(i)
+    parent = list(range(len(reps)))
+    lowest = {}
+    seen = set()
+    for members in bands.values():
+        for x in range(len(members)):
+            for y in range(x + 1, len(members)):
+                i, j = members[x], members[y]
+                if (i, j) in seen:
+                    continue
+                seen.add((i, j))
+                if reps[i].structure == reps[j].structure:
+                    continue
+                score = jaccard(reps[i].features, reps[j].features)
+                if score < threshold:
+                    continue
+                root_i, root_j = _find(parent, i), _find(parent, j)
+                low = min(score, lowest.get(root_i, 1.0), lowest.get(root_j, 1.0))
+                parent[root_j] = root_i
+                lowest[root_i] = low
+    report.candidates = len(seen)
+
+    near = defaultdict(list)
+    for i in range(len(reps)):
+        near[_find(parent, i)].append(reps[i])
+    for root, members in near.items():
+        if len(members) > 1:
+            report.groups.append(Group("aehnlich", sorted(members, key=order), lowest[root]))
+
+    rank = {"identisch": 0, "struktur": 1, "aehnlich": 2}
+    report.groups.sort(key=lambda g: (rank[g.kind], -len(g.members), -g.similarity,
+                                      order(g.members[0])))
+    return report
+
+
+def duplicate_pass(documents: list[PackageDocument],
+                   threshold: float = DEFAULT_THRESHOLD) -> DuplicateReport:
+    """Gruppen ueber alle Dokumente (Extraktion aus dem Cache)."""
+    automations = []
+    for doc in documents:
+        if not doc.ok or doc.content is None:
+            continue
+        for name, exact, structure, found, signature in doc.memo(
+                "duplicates", lambda: extract_automations(doc.content, doc.path.stem)):
+            automations.append(Automation(name, doc.name, exact, structure,
+                                          frozenset(found), signature))
+    return group_automations(automations, threshold)
+
+
+# ---------------------------------------------------------------------------
+# Ausgabe
+# ---------------------------------------------------------------------------
+TITLES = {
+    "identisch": "Identisch (nach Normalisierung)",
+    "struktur": "Gleiche Struktur, andere Entities -- Blueprint-Kandidaten",
+    "aehnlich": "Aehnlich",
+}
+
+
+def _differences(a: Automation, b: Automation, limit: int = 4) -> list[str]:
+    only_a = sorted(a.features - b.features)
+    only_b = sorted(b.features - a.features)
+    lines = [f"- {f}" for f in only_a[:limit]] + [f"+ {f}" for f in only_b[:limit]]
+    rest = max(len(only_a) - limit, 0) + max(len(only_b) - limit, 0)
+    if rest:
+        lines.append(f"  ... {rest} weitere")
+    return lines
+
+
+def print_report(total: int, report: DuplicateReport, top: int = 20,
+                 strict: bool = False) -> int:
+    print(f"\n{'='*60}")
+    print(f"  Doppelte Automationen -- {total} Datei(en), "
+          f"{len(report.automations)} Automation(en)")
+    print(f"{'='*60}")
+
+    counts = defaultdict(int)
+    copies = {}                                 # Vertreter -> Anzahl identischer Kopien
+    for group in report.groups:
+        counts[group.kind] += 1
+        if group.kind == "identisch":
+            copies[group.members[0].exact] = len(group.members) - 1
+    for kind in ("identisch", "struktur", "aehnlich"):
+        groups = [g for g in report.groups if g.kind == kind]
+        if not groups:
+            continue
+        extra = sum(len(g.members) - 1 for g in groups)
+        print(f"\n  {TITLES[kind]}: {len(groups)} Gruppe(n), {extra} ueberzaehlig")
+        for group in groups[:top] if top else groups:
+            share = f" ({group.similarity:.0%})" if kind == "aehnlich" else ""
+            print(f"\n    {len(group.members)}x{share}")
+            for auto in group.members:
+                extra = f" +{copies[auto.exact]} identisch" \
+                    if kind != "identisch" and auto.exact in copies else ""
+                print(f"      {auto.name} ({auto.file}){extra}")
+            if kind == "aehnlich":
+                for line in _differences(group.members[0], group.members[1]):
+                    print(f"        {line}")
+        if top and len(groups) > top:
+            print(f"\n    ... {len(groups) - top} weitere Gruppe(n) (--top 0 zeigt alle)")
+
+    if not report.groups:
+        print(f"\n  Keine doppelten oder aehnlichen Automationen gefunden.")
+    print(f"\n  {report.candidates} Kandidaten-Paar(e) per LSH verglichen "
+          f"(statt {len(report.automations) * (len(report.automations) - 1) // 2})")
+
+    failed = strict and counts["identisch"] > 0
+    if failed:
+        print(f"\n  FEHLER: {counts['identisch']} Gruppe(n) identischer Automationen")
+    print(f"\n  ERGEBNIS: {'FEHLGESCHLAGEN' if failed else 'BESTANDEN'}")
+    print(f"{'='*60}\n")
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Doppelte und aehnliche Automationen finden")
+    parser.add_argument("files", nargs="*", help="YAML-Dateien (Default: alle Packages)")
+    parser.add_argument("--packages-dir", "-d", default=str(DEFAULT_PACKAGES_DIR),
+                        help="Packages-Verzeichnis (Default: packages/)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"Mindest-Aehnlichkeit 0..1 (Default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--top", type=int, default=20,
+                        help="Gruppen pro Stufe (Default: 20, 0 = alle)")
+    parser.add_argument("--strict", action="store_true",
+                        help="Exit 1, wenn identische Automationen gefunden werden")
+    add_loader_arguments(parser)
+    args = parser.parse_args()
+
+    if not 0 < args.threshold <= 1:
+        print("--threshold muss zwischen 0 und 1 liegen.")
+        return 1
+    files = collect_files(args.files, args.packages_dir)
+    if not files:
+        print("Keine YAML-Dateien gefunden.")
+        return 0
+    cache = open_cache(not args.no_cache)
+    documents = load_documents(files, cache, args.jobs)
+    report = duplicate_pass(documents, args.threshold)
+    save_documents(documents, cache)
+    return print_report(len(files), report, args.top, args.strict)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
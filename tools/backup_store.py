@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""Content-adressierter Backup-Speicher fuer HA-Packages (bash ha backup).
+
+Jeder Datei-Inhalt wird genau einmal als Blob (gzip) unter seinem SHA-256
+abgelegt; ein Snapshot ist nur ein kleines JSON-Manifest Pfad -> Hash:
+
+  backups/store/objects/ab/abcdef...     Blob (gzip)
+  backups/store/snapshots/<zeitstempel>.json
+
+Ein Backup uebertraegt und speichert damit nur Inhalte, die noch nicht im
+Speicher liegen (siehe `missing`).
+
+Nutzung:
+  python tools/backup_store.py missing --manifest remote.sha256
+  python tools/backup_store.py ingest --from tmp/ [--manifest remote.sha256]
+  python tools/backup_store.py ingest --from backups/20240101_120000   # Zeit aus dem Namen
+  python tools/backup_store.py list
+  python tools/backup_store.py diff <snapshot-a> [<snapshot-b>]
+  python tools/backup_store.py restore <snapshot> [pfad ...] --to packages/
+  python tools/backup_store.py prune --keep-last 10 --keep-daily 14 --keep-weekly 8
+"""
+
+import os
+import sys
+import gzip
+import json
+import hashlib
+import argparse
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+from ha_yaml import PROJECT_DIR
+from package_sync import (ADDED, MODIFIED, DELETED, STATUS_LABELS, diff_manifests,
+                          local_manifest, parse_manifest)
+
+# Windows-Encoding fix: UTF-8 erzwingen
+if sys.stdout.encoding != "utf-8":
+    sys.stdout.reconfigure(encoding="utf-8")
+
+DEFAULT_STORE_DIR = PROJECT_DIR / "backups" / "store"
+SNAPSHOT_FORMAT = "%Y%m%d_%H%M%S"
+SNAPSHOT_STAMP_LEN = len("20240101_120000")
+
+
+def snapshot_time(name: str) -> datetime:
+    """Zeitpunkt eines Snapshots aus dem Namen (ohne Suffix _1, _2 ...)."""
+    return datetime.strptime(name[:SNAPSHOT_STAMP_LEN], SNAPSHOT_FORMAT)
+
+
+def parse_created(value: str) -> datetime:
+    """Zeitpunkt als 20240101_120000 oder ISO (2024-01-01T12:00:00)."""
+    try:
+        return datetime.strptime(value, SNAPSHOT_FORMAT)
+    except ValueError:
+        return datetime.fromisoformat(value)
+
+
+def _atomic_write(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+class BackupStore:
+    """Blobs nach Inhalt, Snapshots als Manifest."""
+
+    def __init__(self, directory: Path = DEFAULT_STORE_DIR):
+        self.directory = Path(directory)
+        self.objects = self.directory / "objects"
+        self.snapshots = self.directory / "snapshots"
+
+    # -- Blobs --------------------------------------------------------------
+    def _blob_path(self, digest: str) -> Path:
+        return self.objects / digest[:2] / digest
+
+    def has_blob(self, digest: str) -> bool:
+        return self._blob_path(digest).is_file()
+
+    def put_file(self, filepath: Path) -> tuple[str, bool]:
+        """Legt den Inhalt ab; (hash, neu_geschrieben)."""
+        data = filepath.read_bytes()
+        digest = hashlib.sha256(data).hexdigest()
+        if self.has_blob(digest):
+            return digest, False
+        _atomic_write(self._blob_path(digest), gzip.compress(data, mtime=0))
+        return digest, True
+
+    def read_blob(self, digest: str) -> bytes:
+        with gzip.open(self._blob_path(digest), "rb") as f:
+            return f.read()
+
+    # -- Snapshots ----------------------------------------------------------
+    def snapshot_names(self) -> list[str]:
+        if not self.snapshots.is_dir():
+            return []
+        return sorted(p.stem for p in self.snapshots.glob("*.json"))
+
+    def load_snapshot(self, name: str) -> dict:
+        with open(self.snapshots / f"{name}.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def resolve(self, name: str) -> str:
+        """Snapshot-Name, 'latest' oder eindeutiges Praefix -> Name."""
+        names = self.snapshot_names()
+        if name == "latest" and names:
+            return names[-1]
+        matches = [n for n in names if n.startswith(name)]
+        if len(matches) != 1:
+            raise SystemExit(f"Snapshot '{name}' nicht eindeutig/gefunden "
+                             f"({len(matches)} Treffer).")
+        return matches[0]
+
+    def write_snapshot(self, files: dict[str, str], source: str = "",
+                       created: datetime | None = None) -> str:
+        """Manifest schreiben; ein bestehender Snapshot wird nie ueberschrieben.
+
+        Gibt es den Namen (gleiche Sekunde) schon, bekommt der neue Snapshot
+        ein Suffix _1, _2 ... -- die Namen bleiben chronologisch sortierbar.
+        """
+        created = (created or datetime.now()).replace(microsecond=0)
+        stamp = created.strftime(SNAPSHOT_FORMAT)
+        data = {"created": created.isoformat(), "source": source,
+                "files": dict(sorted(files.items()))}
+        self.snapshots.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.snapshots, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(json.dumps(data, ensure_ascii=False, indent=1).encode("utf-8"))
+            suffix = 0
+            while True:
+                name = f"{stamp}_{suffix}" if suffix else stamp
+                try:
+                    # link() schlaegt fehl, wenn das Ziel existiert (anders als replace)
+                    os.link(tmp, self.snapshots / f"{name}.json")
+                    return name
+                except FileExistsError:
+                    suffix += 1
+        finally:
+            Path(tmp).unlink(missing_ok=True)
+
+    def ingest(self, root: Path, manifest: dict[str, str] | None = None,
+               source: str = "", created: datetime | None = None) -> tuple[str, int, int]:
+        """Snapshot aus Manifest + Dateien unter root.
+
+        Dateien, deren Hash schon im Speicher liegt, muessen unter root nicht
+        vorhanden sein. Ohne Manifest wird root komplett eingelesen. Ohne
+        created gilt bei alten Backup-Ordnern (backups/<zeitstempel>/) die
+        Zeit aus dem Ordnernamen, sonst jetzt.
+        Liefert (snapshot, neue_blobs, dateien).
+        """
+        if created is None:
+            try:
+                created = datetime.strptime(Path(root).resolve().name, SNAPSHOT_FORMAT)
+            except ValueError:
+                created = None
+        if manifest is None:
+            manifest = local_manifest(root)
+        new = 0
+        for path, digest in manifest.items():
+            if self.has_blob(digest):
+                continue
+            filepath = root / path
+            if not filepath.is_file():
+                raise SystemExit(f"Inhalt fuer '{path}' fehlt in {root}.")
+            stored, written = self.put_file(filepath)
+            if stored != digest:
+                raise SystemExit(f"Hash von '{path}' weicht vom Manifest ab.")
+            new += written
+        return self.write_snapshot(manifest, source, created), new, len(manifest)
+
+    def restore(self, name: str, target: Path, paths: list[str] | None = None) -> int:
+        files = self.load_snapshot(name)["files"]
+        selected = paths or sorted(files)
+        for path in selected:
+            if path not in files:
+                raise SystemExit(f"'{path}' ist nicht in Snapshot {name}.")
+        for path in selected:
+            _atomic_write(target / path, self.read_blob(files[path]))
+        return len(selected)
+
+    # -- Aufraeumen ---------------------------------------------------------
+    def prune(self, keep_last: int = 0, keep_daily: int = 0, keep_weekly: int = 0,
+              dry_run: bool = False) -> tuple[list[str], int]:
+        """Retention anwenden, danach unreferenzierte Blobs loeschen.
+
+        Behalten werden die letzten keep_last Snapshots sowie der jeweils
+        neueste Snapshot der letzten keep_daily Tage und keep_weekly Wochen.
+        """
+        names = self.snapshot_names()
+        keep = set(names[-keep_last:]) if keep_last else set()
+        for count, bucket in ((keep_daily, "%Y%m%d"), (keep_weekly, "%G%V")):
+            seen = []
+            for name in reversed(names):
+                key = snapshot_time(name).strftime(bucket)
+                if key in seen:
+                    continue
+                if len(seen) >= count:
+                    break
+                seen.append(key)
+                keep.add(name)
+        removed = [n for n in names if n not in keep]
+        # Erst die Manifeste loeschen: bricht prune danach ab, bleiben nur
+        # unreferenzierte Blobs liegen, nie Snapshots mit fehlenden Blobs
+        if not dry_run:
+            for name in removed:
+                (self.snapshots / f"{name}.json").unlink()
+        referenced = set()
+        for name in (keep if dry_run else self.snapshot_names()):
+            referenced.update(self.load_snapshot(name)["files"].values())
+        blobs = 0
+        if self.objects.is_dir():
+            for blob in self.objects.glob("*/*"):
+                if blob.name not in referenced and not blob.name.endswith(".tmp"):
+                    blobs += 1
+                    if not dry_run:
+                        blob.unlink()
+        return removed, blobs
+
+
+# ---------------------------------------------------------------------------
+# Main
+# ---------------------------------------------------------------------------
+def _read_manifest(path: str) -> dict[str, str]:
+    if path == "-":
+        return parse_manifest(sys.stdin)
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_manifest(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HA Backup-Speicher (content-adressiert)")
+    parser.add_argument("--store", default=str(DEFAULT_STORE_DIR),
+                        help="Speicher-Verzeichnis (Default: backups/store)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("missing", help="Pfade, deren Inhalt noch nicht gespeichert ist")
+    p.add_argument("--manifest", required=True, help="sha256sum-Manifest ('-' = stdin)")
+
+    p = sub.add_parser("ingest", help="Snapshot anlegen")
+    p.add_argument("--from", dest="source", required=True, help="Verzeichnis mit den Dateien")
+    p.add_argument("--manifest", help="sha256sum-Manifest (Default: Verzeichnis einlesen)")
+    p.add_argument("--label", default="", help="Herkunft (z.B. Host:Pfad)")
+    p.add_argument("--created", "--name", dest="created",
+                   help="Zeitpunkt/Name des Snapshots (20240101_120000 oder ISO; "
+                        "Default: Zeit aus dem Ordnernamen backups/<zeitstempel>, sonst jetzt)")
+
+    sub.add_parser("list", help="Snapshots auflisten")
+
+    p = sub.add_parser("diff", help="Zwei Snapshots vergleichen")
+    p.add_argument("old")
+    p.add_argument("new", nargs="?", default="latest")
+
+    p = sub.add_parser("restore", help="Snapshot oder einzelne Dateien wiederherstellen")
+    p.add_argument("snapshot")
+    p.add_argument("paths", nargs="*", help="Nur diese Dateien (Default: alle)")
+    p.add_argument("--to", required=True, help="Zielverzeichnis")
+
+    p = sub.add_parser("prune", help="Alte Snapshots und unreferenzierte Blobs loeschen")
+    p.add_argument("--keep-last", type=int, default=0)
+    p.add_argument("--keep-daily", type=int, default=0)
+    p.add_argument("--keep-weekly", type=int, default=0)
+    p.add_argument("--dry-run", "-n", action="store_true")
+    args = parser.parse_args()
+
+    store = BackupStore(Path(args.store))
+
+    if args.command == "missing":
+        seen = set()
+        for path, digest in _read_manifest(args.manifest).items():
+            if digest not in seen and not store.has_blob(digest):
+                seen.add(digest)
+                print(path)
+        return 0
+
+    if args.command == "ingest":
+        manifest = _read_manifest(args.manifest) if args.manifest else None
+        try:
+            created = parse_created(args.created) if args.created else None
+        except ValueError:
+            print(f"Ungueltiger Zeitpunkt: {args.created} (erwartet 20240101_120000 oder ISO)")
+            return 1
+        name, new, total = store.ingest(Path(args.source), manifest, args.label, created)
+        print(f"Snapshot {name}: {total} Datei(en), {new} neue(r) Inhalt(e) gespeichert.")
+        return 0
+
+    if args.command == "list":
+        names = store.snapshot_names()
+        if not names:
+            print("Keine Snapshots.")
+        previous = {}
+        for name in names:
+            files = store.load_snapshot(name)["files"]
+            changes = diff_manifests(files, previous)
+            print(f"  {name:<17}  {len(files):4d} Datei(en)  {len(changes):4d} Aenderung(en)")
+            previous = files
+        return 0
+
+    if args.command == "diff":
+        old, new = store.resolve(args.old), store.resolve(args.new)
+        changes = diff_manifests(store.load_snapshot(new)["files"],
+                                 store.load_snapshot(old)["files"])
+        print(f"  {old} -> {new}")
+        for status, path in changes:
+            print(f"  {STATUS_LABELS[status]:<10} {path}")
+        counts = {s: sum(1 for c, _ in changes if c == s) for s in (ADDED, MODIFIED, DELETED)}
+        print(f"\n  {counts[ADDED]} neu, {counts[MODIFIED]} geaendert, {counts[DELETED]} geloescht")
+        return 0
+
+    if args.command == "restore":
+        name = store.resolve(args.snapshot)
+        count = store.restore(name, Path(args.to), args.paths)
+        print(f"{count} Datei(en) aus Snapshot {name} nach {args.to} wiederhergestellt.")
+        return 0
+
+    if args.command == "prune":
+        if not (args.keep_last or args.keep_daily or args.keep_weekly):
+            print("Mindestens eine --keep-* Option angeben.")
+            return 1
+        removed, blobs = store.prune(args.keep_last, args.keep_daily, args.keep_weekly,
+                                     args.dry_run)
+        verb = "wuerden geloescht" if args.dry_run else "geloescht"
+        print(f"{len(removed)} Snapshot(s) und {blobs} Blob(s) {verb}.")
+        for name in removed:
+            print(f"  {name}")
+        return 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
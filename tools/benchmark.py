@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""Benchmark der Validatoren ueber synthetische Package-Baeume.
+
+Erzeugt pro Groesse einen Baum mit corpus_generator.py (fester Seed) und
+misst jede Phase der Pruefung einzeln -- genau die Passes, die auch
+run_tests.py ausfuehrt:
+
+  Laden            Parsen aller Dateien (ohne Cache)
+  Laden (Cache)    dieselben Dateien aus einem warmen Parse-Cache
+  Struktur         syntax_pass + structure_pass
+  Extraktion       Entity- und Automation-IDs (extraction_pass)
+  Namensregeln     Umlaut-/Namensregeln
+  Duplikate        doppelte Automation-IDs (beide Validatoren)
+  KNX              GA-Index, Kollisionen, sync_state-Last
+  Abhaengigkeiten  Abhaengigkeitsgraph und Rueckkopplungen (dependency_pass)
+  Report           Ausgabe beider Reports (nach /dev/null)
+
+Jede Messung wird --repeat mal wiederholt (frisch geladene Dokumente, damit
+keine Memo-Daten mitgemessen werden); gespeichert werden Minimum und Median.
+Das Ergebnis landet als JSON in .cache/benchmarks/ -- inkl. Git-Commit, so
+dass zwei Laeufe mit `compare` gegeneinander gestellt werden koennen.
+
+Nutzung:
+  python tools/benchmark.py run                         # Groessen 100, 1000
+  python tools/benchmark.py run --sizes 100,1000,10000 --repeat 5
+  python tools/benchmark.py compare alt.json neu.json   # Exit 1 bei Regression
+  python tools/benchmark.py list
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+import statistics
+from contextlib import redirect_stdout
+from datetime import datetime
+from pathlib import Path
+
+import yaml
+
+import yaml_validator
+import entity_reference_checker
+from corpus_generator import DEFAULT_SEED, generate_corpus
+from dependency_graph import dependency_pass
+from ha_yaml import PROJECT_DIR, collect_files, load_documents, save_documents
+from knx_checker import knx_pass
+from naming_rules import DEFAULT_RULES
+from parse_cache import ParseCache
+
+# Windows-Encoding fix: UTF-8 erzwingen
+if sys.stdout.encoding != "utf-8":
+    sys.stdout.reconfigure(encoding="utf-8")
+
+DEFAULT_RESULTS_DIR = PROJECT_DIR / ".cache" / "benchmarks"
+DEFAULT_SIZES = [100, 1000]
+DEFAULT_REPEAT = 3
+# Abweichung (Prozent des Medians), ab der compare eine Regression meldet
+DEFAULT_THRESHOLD = 10.0
+# Phasen unter dieser Dauer sind zu kurz fuer einen stabilen Vergleich
+MIN_COMPARABLE_SECONDS = 0.005
+
+PHASES = ["Laden", "Laden (Cache)", "Struktur", "Extraktion", "Namensregeln",
+          "Duplikate", "KNX", "Abhaengigkeiten", "Report"]
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "-C", str(PROJECT_DIR), "rev-parse", "--short", "HEAD"],
+                             capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def run_phases(files: list[Path], cache: ParseCache, jobs: int | None) -> dict[str, float]:
+    """Ein Durchlauf aller Phasen; liefert Sekunden pro Phase."""
+    timings = {}
+
+    def measure(name, func):
+        start = time.perf_counter()
+        value = func()
+        timings[name] = time.perf_counter() - start
+        return value
+
+    documents = measure("Laden", lambda: load_documents(files, None, jobs))
+    # Warmer Cache: einmal befuellen (nicht gemessen), dann laden
+    save_documents(load_documents(files, cache, jobs), cache)
+    measure("Laden (Cache)", lambda: load_documents(files, cache, jobs))
+
+    result = yaml_validator.ValidationResult()
+    report = entity_reference_checker.ReferenceReport()
+
+    def structure():
+        yaml_validator.syntax_pass(documents, result)
+        yaml_validator.structure_pass(documents, result)
+
+    def duplicates():
+        yaml_validator.duplicate_id_pass(documents, result)
+        entity_reference_checker.duplicate_id_pass(report)
+
+    def render():
+        with redirect_stdout(io.StringIO()):
+            yaml_validator.print_report(len(files), result)
+            entity_reference_checker.print_report(len(files), report)
+
+    measure("Struktur", structure)
+    measure("Extraktion", lambda: entity_reference_checker.extraction_pass(documents, report))
+    measure("Namensregeln", lambda: entity_reference_checker.naming_pass(report, DEFAULT_RULES))
+    measure("Duplikate", duplicates)
+    measure("KNX", lambda: knx_pass(documents, result))
+    measure("Abhaengigkeiten", lambda: dependency_pass(documents, result))
+    measure("Report", render)
+    return timings
+
+
+def benchmark_size(automations: int, repeat: int, seed: int, jobs: int | None,
+                   knx: int | None, template_depth: int, knx_depth: int) -> dict:
+    with tempfile.TemporaryDirectory(prefix="ha_bench_") as tmp:
+        root = Path(tmp) / "packages"
+        corpus = generate_corpus(root, automations, knx, template_depth, knx_depth, seed)
+        files = collect_files(packages_dir=str(root))
+        cache = ParseCache(Path(tmp) / "cache", max_bytes=1 << 40)
+        runs = [run_phases(files, cache, jobs) for _ in range(repeat)]
+    phases = {}
+    for name in PHASES:
+        values = [run[name] for run in runs]
+        phases[name] = {"min": min(values), "median": statistics.median(values)}
+    total = [sum(run.values()) for run in runs]
+    phases["Gesamt"] = {"min": min(total), "median": statistics.median(total)}
+    return {"corpus": corpus, "phases": phases}
+
+
+def run(args) -> int:
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    results = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "label": args.label,
+        "python": platform.python_version(),
+        "pyyaml": yaml.__version__,
+        "libyaml": bool(getattr(yaml, "__with_libyaml__", False)),
+        "cpus": os.cpu_count(),
+        "jobs": args.jobs,
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "sizes": [],
+    }
+    for size in sizes:
+        print(f"  Groesse {size} ...", flush=True)
+        entry = benchmark_size(size, args.repeat, args.seed, args.jobs, args.knx,
+                               args.template_depth, args.knx_depth)
+        results["sizes"].append(entry)
+        print_size(entry)
+
+    out = Path(args.output) if args.output else (
+        DEFAULT_RESULTS_DIR / f"{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+                              f"_{results['commit'] or 'nogit'}.json")
+    out.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=out.parent, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, out)
+    print(f"\n  Ergebnis: {out}")
+    return 0
+
+
+def print_size(entry: dict):
+    corpus = entry["corpus"]
+    print(f"\n  {corpus['automations']} Automationen, {corpus['knx']} KNX-Entities, "
+          f"{corpus['files']} Datei(en), {corpus['bytes'] / 1024:.0f} KiB")
+    for name, value in entry["phases"].items():
+        print(f"    {name:<16} {value['median']*1000:10.1f} ms  (min {value['min']*1000:.1f})")
+
+
+def _size_key(entry: dict) -> tuple:
+    c = entry["corpus"]
+    return (c["automations"], c["knx"], c["template_depth"], c["knx_depth"], c["seed"])
+
+
+def compare(old_path: str, new_path: str, threshold: float) -> int:
+    with open(old_path, "r", encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, "r", encoding="utf-8") as f:
+        new = json.load(f)
+    print(f"\n  {old.get('commit') or old_path} -> {new.get('commit') or new_path}")
+    old_sizes = {_size_key(e): e for e in old["sizes"]}
+    regressions = 0
+    for entry in new["sizes"]:
+        before = old_sizes.get(_size_key(entry))
+        if before is None:
+            continue
+        print(f"\n  {entry['corpus']['automations']} Automationen, "
+              f"{entry['corpus']['knx']} KNX-Entities:")
+        for name, value in entry["phases"].items():
+            if name not in before["phases"]:
+                continue
+            a, b = before["phases"][name]["median"], value["median"]
+            delta = (b - a) / a * 100 if a else 0.0
+            flag = ""
+            if delta > threshold and max(a, b) >= MIN_COMPARABLE_SECONDS:
+                flag = "  REGRESSION"
+                regressions += 1
+            elif delta < -threshold and max(a, b) >= MIN_COMPARABLE_SECONDS:
+                flag = "  schneller"
+            print(f"    {name:<16} {a*1000:10.1f} -> {b*1000:10.1f} ms  {delta:+7.1f}%{flag}")
+    if regressions:
+        print(f"\n  {regressions} Regression(en) ueber {threshold:g}%.")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark der HA-Validatoren")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("run", help="Benchmark ausfuehren und als JSON speichern")
+    p.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                   help="Anzahl Automationen je Lauf, kommagetrennt (Default: 100,1000)")
+    p.add_argument("--knx", type=int, default=None,
+                   help="KNX-Entities je Lauf (Default: halb so viele wie Automationen)")
+    p.add_argument("--template-depth", type=int, default=3)
+    p.add_argument("--knx-depth", type=int, default=3)
+    p.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    p.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    p.add_argument("--jobs", "-j", type=int, default=None,
+                   help="Parallele Parse-Prozesse (Default: alle Kerne, 1 = seriell)")
+    p.add_argument("--label", default="", help="Freitext, z.B. Name des Experiments")
+    p.add_argument("--output", "-o", help="Ergebnisdatei (Default: .cache/benchmarks/)")
+
+    p = sub.add_parser("compare", help="Zwei Ergebnisdateien vergleichen")
+    p.add_argument("old")
+    p.add_argument("new")
+    p.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                   help="Regression ab dieser Abweichung in Prozent (Default: 10)")
+
+    sub.add_parser("list", help="Gespeicherte Ergebnisse anzeigen")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        return run(args)
+    if args.command == "compare":
+        return compare(args.old, args.new, args.threshold)
+    paths = sorted(DEFAULT_RESULTS_DIR.glob("*.json")) if DEFAULT_RESULTS_DIR.is_dir() else []
+    if not paths:
+        print("Keine Ergebnisse.")
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        sizes = ", ".join(str(e["corpus"]["automations"]) for e in data["sizes"])
+        print(f"  {path.name:<36} {data.get('label') or '':<20} Groessen {sizes}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""Changed-Set-Validierung: nur geaenderte Packages neu pruefen.
+
+Fuer Hooks und `bash ha push`: statt des ganzen Baums werden nur die Dateien
+geladen und geprueft, die sich laut git seit HEAD (oder seit dem letzten
+Deploy) geaendert haben. Die Ergebnisse aller anderen Dateien kommen aus
+einem Index in .cache/validation_index.json:
+
+  pro Datei: (mtime, Groesse), Fehler/Warnungen aus Syntax und Struktur,
+             Automation-IDs, KNX-Adressen, Abhaengigkeits-Kanten
+
+Dateiuebergreifende Pruefungen (doppelte Automation-IDs, KNX-Kollisionen,
+Rueckkopplungen zwischen Automationen)
+laufen danach ueber den vollstaendigen Index. Zusaetzlich zu git wird jede
+Datei neu geprueft, deren (mtime, Groesse) nicht zum Index passt; geaenderte
+Regeln (Quelltext der Validatoren, siehe RULE_SOURCES) verwerfen den Index -- das
+Ergebnis ist damit genauso streng wie ein voller Lauf.
+
+Nutzung:
+  python tools/yaml_validator.py --changed                  # seit HEAD
+  python tools/yaml_validator.py --changed --since deployed # seit letztem Deploy
+  python tools/yaml_validator.py --changed packages/x.yaml  # Hook nach Edit
+  python tools/changed_set.py list [--since REV]
+  python tools/changed_set.py mark-deployed
+"""
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+import time
+import tempfile
+import subprocess
+from pathlib import Path
+
+from ha_yaml import (PROJECT_DIR, TOOL_VERSION, DEFAULT_PACKAGES_DIR, collect_files,
+                     load_document, load_documents, save_documents)
+
+# Windows-Encoding fix: UTF-8 erzwingen
+if sys.stdout.encoding != "utf-8":
+    sys.stdout.reconfigure(encoding="utf-8")
+
+DEFAULT_INDEX_PATH = PROJECT_DIR / ".cache" / "validation_index.json"
+DEPLOY_STATE_PATH = PROJECT_DIR / ".cache" / "last_deploy"
+DEPLOYED = "deployed"
+# Quellen, die die Ergebnisse pro Datei bestimmen: Aenderungen an Regeln
+# (z.B. known_domains) verwerfen den Index auch ohne neue TOOL_VERSION
+RULE_SOURCES = ["yaml_validator.py", "ha_yaml.py", "knx_checker.py", "dependency_graph.py",
+                "entity_reference_checker.py", "template_analyzer.py", "entity_registry.py"]
+
+
+def rules_hash() -> str:
+    """Hash ueber TOOL_VERSION und die Quelltexte in RULE_SOURCES."""
+    digest = hashlib.sha256(TOOL_VERSION.encode())
+    tools_dir = Path(__file__).resolve().parent
+    for name in RULE_SOURCES:
+        try:
+            digest.update((tools_dir / name).read_bytes())
+        except OSError:
+            digest.update(name.encode())
+    return digest.hexdigest()[:16]
+
+
+def _signature(filepath: Path) -> list[int] | None:
+    try:
+        st = filepath.stat()
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _git(root: Path, *args) -> list[str] | None:
+    try:
+        out = subprocess.run(["git", "-C", str(root), *args], capture_output=True,
+                             text=True, timeout=30)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if out.returncode != 0:
+        return None
+    return [line for line in out.stdout.splitlines() if line]
+
+
+def resolve_since(since: str) -> str | None:
+    """'deployed' -> Commit aus .cache/last_deploy, sonst die Revision selbst."""
+    if since != DEPLOYED:
+        return since
+    try:
+        return DEPLOY_STATE_PATH.read_text(encoding="utf-8").strip() or None
+    except OSError:
+        return None
+
+
+def git_changed(root: Path, since: str = "HEAD") -> set[str] | None:
+    """Geaenderte/neue .yaml unter root (relativ zu root); None ohne git/Revision."""
+    revision = resolve_since(since)
+    if revision is None:
+        return None
+    changed = _git(root, "diff", "--name-only", "--relative", revision, "--", ".")
+    untracked = _git(root, "ls-files", "--others", "--exclude-standard", "--", ".")
+    if changed is None or untracked is None:
+        return None
+    return {path for path in changed + untracked if path.endswith(".yaml")}
+
+
+def mark_deployed() -> str | None:
+    """Merkt den aktuellen Commit als zuletzt deployt."""
+    head = _git(PROJECT_DIR, "rev-parse", "HEAD")
+    if not head:
+        return None
+    DEPLOY_STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    DEPLOY_STATE_PATH.write_text(head[0] + "\n", encoding="utf-8")
+    return head[0]
+
+
+class ValidationIndex:
+    """Pro-Datei-Ergebnisse fuer die dateiuebergreifenden Pruefungen."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root).resolve()
+        # rel. Pfad -> {"sig", "name", "entries", "automation_ids", "knx", "dependencies"}
+        self.files = {}
+
+    @classmethod
+    def load(cls, root: Path, index_path: Path = DEFAULT_INDEX_PATH) -> "ValidationIndex":
+        index = cls(root)
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return index
+        if data.get("rules") == rules_hash() and data.get("root") == str(index.root):
+            index.files = data.get("files", {})
+        return index
+
+    def save(self, index_path: Path = DEFAULT_INDEX_PATH):
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        data = {"rules": rules_hash(), "root": str(self.root), "files": self.files}
+        fd, tmp = tempfile.mkstemp(dir=index_path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp, index_path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+    def rel(self, filepath: Path) -> str:
+        return filepath.resolve().relative_to(self.root).as_posix()
+
+
+def _check_file(index: "ValidationIndex", rel: str, filepath: Path, doc):
+    """Syntax/Struktur einer Datei pruefen und ihren Index-Eintrag erneuern."""
+    import yaml_validator
+    from knx_checker import extract_knx
+    from dependency_graph import extract_dependencies
+
+    result = yaml_validator.ValidationResult()
+    yaml_validator.syntax_pass([doc], result)
+    yaml_validator.structure_pass([doc], result)
+    usable = doc.ok and doc.content is not None
+    index.files[rel] = {
+        "sig": _signature(filepath),
+        "name": doc.name,
+        "entries": [list(entry) for entry in result.entries],
+        "automation_ids": doc.memo("automation_ids",
+                                   lambda: yaml_validator._automation_id_pairs(doc))
+        if usable else [],
+        "knx": doc.memo("knx", lambda: extract_knx(doc.content)) if usable else [[], []],
+        "dependencies": doc.memo("dependencies",
+                                 lambda: extract_dependencies(doc.content, doc.path.stem))
+        if usable else [],
+    }
+    return result
+
+
+def _replay(entries: list, result):
+    """Gespeicherte Meldungen (level, datei, text) in result uebernehmen."""
+    for level, file, msg in entries:
+        if level == "error":
+            result.error(file, msg)
+        else:
+            result.warn(file, msg)
+
+
+def validate_changed(root: Path, explicit: list[str], since: str = "HEAD", cache=None,
+                     jobs: int | None = None, output: str = "text",
+                     fail_fast: bool = False) -> int:
+    """Changed-Set-Lauf von yaml_validator.py --changed; liefert den Exit-Code.
+
+    output/fail_fast wie in result_stream: mit ndjson oder --fail-fast wird
+    jede neu gepruefte Datei einzeln geladen und sofort gemeldet (zuletzt
+    geaenderte zuerst), die uebrigen folgen aus dem Index ("cached": true).
+    """
+    import yaml_validator
+    from knx_checker import KnxReport, add_file, find_collisions, report_findings
+    from dependency_graph import DependencyGraph, report_loops
+    from result_stream import _Emitter, newest_first
+
+    root = Path(root)
+    files = collect_files(packages_dir=str(root))
+    index = ValidationIndex.load(root)
+    by_rel = {index.rel(f): f for f in files}
+
+    changed = git_changed(root, since)
+    source = f"git seit {since}"
+    if changed is None:
+        changed = set(by_rel)
+        source = "ohne git-Basis: alle"
+    for path in explicit:
+        filepath = Path(path)
+        try:
+            changed.add(index.rel(filepath))
+        except ValueError:
+            print(f"{path} liegt nicht unter {root}.")
+            return 1
+    # Eintraege ohne Kanten/Meldungen stammen aus einem aelteren Index
+    stale = {rel for rel, f in by_rel.items()
+             if index.files.get(rel, {}).get("sig") != _signature(f)
+             or "dependencies" not in index.files[rel] or "entries" not in index.files[rel]}
+    todo = sorted((changed | stale) & set(by_rel))
+
+    # Geloeschte Dateien fallen aus dem Index
+    for rel in [r for r in index.files if r not in by_rel]:
+        del index.files[rel]
+
+    emitter = _Emitter(output)
+    stopped = False
+    emitted = set()
+    if output == "ndjson" or fail_fast:
+        rels = {f: rel for rel, f in by_rel.items()}
+        documents = []
+        for filepath in newest_first([by_rel[rel] for rel in todo]):
+            start = time.perf_counter()
+            doc = load_document(filepath, cache)
+            documents.append(doc)
+            emitted.add(rels[filepath])
+            result = _check_file(index, rels[filepath], filepath, doc)
+            emitter.emit({"type": "file", "file": doc.name, "path": str(filepath),
+                          "ms": round((time.perf_counter() - start) * 1000, 3)}, result)
+            if fail_fast and not result.ok:
+                stopped = True
+                break
+    else:
+        documents = load_documents([by_rel[rel] for rel in todo], cache, jobs)
+        for rel, doc in zip(todo, documents):
+            _check_file(index, rel, by_rel[rel], doc)
+    save_documents(documents, cache)
+    index.save()
+
+    # Uebrige Dateien (im Text-Modus alle, in Dateireihenfolge) aus dem Index
+    if not stopped:
+        for rel in sorted(set(by_rel) - emitted):
+            result = yaml_validator.ValidationResult()
+            _replay(index.files[rel]["entries"], result)
+            emitter.emit({"type": "file", "file": index.files[rel]["name"],
+                          "path": str(by_rel[rel]), "cached": rel not in todo}, result)
+            if fail_fast and not result.ok:
+                stopped = True
+                break
+
+    # Dateiuebergreifend ueber den vollstaendigen Index
+    if not stopped:
+        result = yaml_validator.ValidationResult()
+        all_ids = []
+        for rel in sorted(by_rel):
+            entry = index.files[rel]
+            all_ids.extend((entry["name"], aid, alias) for aid, alias in entry["automation_ids"])
+        yaml_validator._check_duplicate_ids(all_ids, result)
+        emitter.emit({"type": "global", "check": "Doppelte IDs"}, result)
+        stopped = fail_fast and not result.ok
+
+    if not stopped:
+        result = yaml_validator.ValidationResult()
+        knx = KnxReport()
+        graph = DependencyGraph()
+        for rel in sorted(by_rel):
+            entry = index.files[rel]
+            add_file(knx, entry["name"], entry["knx"])
+            graph.add_file(entry["name"], [tuple(record) for record in entry["dependencies"]])
+        find_collisions(knx)
+        report_findings(knx, result)
+        emitter.emit({"type": "global", "check": "KNX"}, result)
+        result = yaml_validator.ValidationResult()
+        report_loops(graph, result)
+        emitter.emit({"type": "global", "check": "Abhaengigkeiten"}, result)
+
+    total = emitter.total
+    if output == "ndjson":
+        summary = {"type": "summary", "files": len(by_rel), "checked": len(documents),
+                   "errors": len(total.errors), "warnings": len(total.warnings),
+                   "stopped": stopped, "ok": total.ok}
+        emitter.out.write(json.dumps(summary, ensure_ascii=False) + "\n")
+        emitter.out.flush()
+        return 0 if total.ok else 1
+
+    print(f"\n  Changed-Set ({source}): {len(documents)} von {len(by_rel)} Datei(en) neu geprueft"
+          f"{', ' + str(len(stale - changed)) + ' per Signatur' if stale - changed else ''}")
+    if stopped:
+        print(f"  Abbruch nach dem ersten Fehler (--fail-fast)")
+    return yaml_validator.print_report(len(by_rel), total)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Changed-Set der Packages (git)")
+    parser.add_argument("--packages-dir", "-d", default=str(DEFAULT_PACKAGES_DIR),
+                        help="Packages-Verzeichnis (Default: packages/)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("list", help="Geaenderte Packages anzeigen")
+    p.add_argument("--since", default="HEAD",
+                   help="Git-Revision oder 'deployed' (Default: HEAD)")
+    sub.add_parser("mark-deployed", help="Aktuellen Commit als deployt merken")
+    args = parser.parse_args()
+
+    if args.command == "mark-deployed":
+        head = mark_deployed()
+        if head is None:
+            print("Kein git-Repository -- nichts gemerkt.")
+            return 1
+        print(f"Deploy-Stand: {head[:12]}")
+        return 0
+
+    changed = git_changed(Path(args.packages_dir), args.since)
+    if changed is None:
+        print(f"Keine git-Basis fuer '{args.since}' -- es wuerde alles geprueft.")
+        return 1
+    for path in sorted(changed):
+        print(path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""Synthetischer Package-Baum fuer Benchmarks (deterministisch per Seed).
+
+Erzeugt einen realistisch aufgebauten packages/-Baum:
+
+  <ziel>/<bereich>.yaml                 Automationen, Scripts, Helper
+  <ziel>/knx/<etage>/<raum>/...yaml      KNX-Entities (verschachtelt, --knx-depth)
+
+Die Automationen nutzen alle gaengigen Trigger, Bedingungen, choose-Bloecke
+und verschachtelte Jinja-Templates (--template-depth). Ein kleiner Anteil
+doppelter Automation-IDs und falsch ersetzter Umlaute sorgt dafuer, dass
+auch Duplikat-Suche und Report-Ausgabe etwas zu tun haben.
+
+Gleicher Seed + gleiche Parameter = byte-identischer Baum.
+
+Nutzung:
+  python tools/corpus_generator.py /tmp/corpus --automations 1000
+  python tools/corpus_generator.py /tmp/corpus --automations 10000 --knx 5000 --seed 7
+"""
+
+import sys
+import random
+import argparse
+from pathlib import Path
+
+import yaml
+
+# Windows-Encoding fix: UTF-8 erzwingen
+if sys.stdout.encoding != "utf-8":
+    sys.stdout.reconfigure(encoding="utf-8")
+
+DEFAULT_SEED = 1
+AUTOMATIONS_PER_FILE = 40
+KNX_ENTITIES_PER_FILE = 60
+DUPLICATE_RATE = 0.005
+UMLAUT_RATE = 0.01
+
+FLOORS = ["eg", "og", "dg", "kg"]
+ROOMS = ["kuche", "wohnzimmer", "esszimmer", "bad", "flur", "schlafzimmer", "buro",
+         "kinderzimmer", "gastezimmer", "garage", "keller", "garten", "terrasse",
+         "hauswirtschaft", "ankleide"]
+AREAS = ["beleuchtung", "beschattung", "heizung", "sicherheit", "energie", "praesenz",
+         "bewaesserung", "lueftung", "multimedia", "benachrichtigung"]
+SENSORS = ["temperatur", "luftfeuchte", "helligkeit", "co2", "leistung", "energie"]
+# Umlaut-Fehler wie sie in echten Packages vorkommen (HA bildet aus "ü" ein "u", nicht "ue")
+UMLAUT_IDS = ["sensor.kuehlschrank_temperatur", "binary_sensor.tuer_kuche",
+              "light.kueche_decke", "sensor.hoehe_rollladen"]
+
+
+def _entity(rng: random.Random, domain: str) -> str:
+    room = rng.choice(ROOMS)
+    if domain == "sensor":
+        return f"sensor.{room}_{rng.choice(SENSORS)}"
+    if domain == "binary_sensor":
+        return f"binary_sensor.{room}_{rng.choice(['prasenz', 'fenster', 'tur', 'bewegung'])}"
+    return f"{domain}.{room}_{rng.choice(['decke', 'wand', 'spot', 'stehlampe', 'rollladen'])}"
+
+
+def jinja_template(rng: random.Random, depth: int) -> str:
+    """Verschachteltes if/else-Template mit states()/is_state()-Aufrufen."""
+    if depth <= 0:
+        return f"{{{{ states('{_entity(rng, 'sensor')}') | float(0) | round(1) }}}}"
+    inner = jinja_template(rng, depth - 1)
+    other = jinja_template(rng, depth - 1) if rng.random() < 0.3 else "aus"
+    return (f"{{% if is_state('{_entity(rng, 'binary_sensor')}', 'on') "
+            f"and states('{_entity(rng, 'sensor')}') | float(0) > {rng.randint(1, 40)} %}}"
+            f"{inner}{{% else %}}{other}{{% endif %}}")
+
+
+def _trigger(rng: random.Random, template_depth: int) -> dict:
+    kind = rng.choice(["state", "numeric_state", "time", "time_pattern", "template"])
+    if kind == "state":
+        return {"trigger": "state", "entity_id": _entity(rng, "binary_sensor"),
+                "to": "on", "for": {"minutes": rng.randint(1, 30)}}
+    if kind == "numeric_state":
+        return {"trigger": "numeric_state", "entity_id": _entity(rng, "sensor"),
+                "below": rng.randint(5, 500)}
+    if kind == "time":
+        return {"trigger": "time", "at": f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00"}
+    if kind == "time_pattern":
+        return {"trigger": "time_pattern", "minutes": f"/{rng.choice([5, 10, 15, 30])}"}
+    return {"trigger": "template",
+            "value_template": "{{ " + f"states('{_entity(rng, 'sensor')}') | float(0) > "
+                              f"{rng.randint(1, 100)}" + " }}"}
+
+
+def _action(rng: random.Random, template_depth: int) -> dict:
+    domain = rng.choice(["light", "switch", "cover"])
+    service = {"light": "turn_on", "switch": "turn_off", "cover": "close_cover"}[domain]
+    targets = sorted({_entity(rng, domain) for _ in range(rng.randint(1, 4))})
+    action = {"action": f"{domain}.{service}", "target": {"entity_id": targets}}
+    if rng.random() < 0.4:
+        return {"choose": [{
+            "conditions": [{"condition": "template",
+                            "value_template": jinja_template(rng, template_depth)}],
+            "sequence": [action]}],
+            "default": [{"action": "notify.notify",
+                         "data": {"message": jinja_template(rng, template_depth)}}]}
+    return action
+
+
+def automation(rng: random.Random, area: str, number: int, template_depth: int) -> dict:
+    room = rng.choice(ROOMS)
+    conditions = [{"condition": "state", "entity_id": _entity(rng, "binary_sensor"),
+                   "state": "on"} for _ in range(rng.randint(0, 2))]
+    actions = [_action(rng, template_depth) for _ in range(rng.randint(1, 3))]
+    if rng.random() < UMLAUT_RATE:
+        actions.append({"action": "homeassistant.turn_off",
+                        "target": {"entity_id": rng.choice(UMLAUT_IDS)}})
+    return {
+        "id": f"{area}_{room}_{number:05d}",
+        "alias": f"{area.capitalize()}: {room.capitalize()} #{number}",
+        "triggers": [_trigger(rng, template_depth) for _ in range(rng.randint(1, 2))],
+        "conditions": conditions,
+        "actions": actions,
+        "mode": rng.choice(["single", "restart", "queued"]),
+    }
+
+
+def knx_entity(rng: random.Random, platform: str, name: str, ga: int) -> dict:
+    main, middle, sub = (ga >> 11) & 0x1F, (ga >> 8) & 0x7, ga & 0xFF
+    address = f"{main}/{middle}/{sub}"
+    state = f"{main}/{middle}/{(sub + 1) & 0xFF}"
+    if platform == "light":
+        return {"name": name, "address": address, "state_address": state}
+    if platform == "cover":
+        return {"name": name, "move_long_address": address, "stop_address": state,
+                "position_state_address": f"{main}/{middle}/{(sub + 2) & 0xFF}"}
+    if platform == "sensor":
+        return {"name": name, "state_address": address,
+                "type": rng.choice(["temperature", "humidity", "illuminance", "power"]),
+                "sync_state": rng.choice(["every 5", "every 30", "expire 60", "init"])}
+    return {"name": name, "state_address": address,
+            "sync_state": rng.choice([True, "every 15", "init"])}
+
+
+def _dump(path: Path, header: str, content: dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    text = yaml.dump(content, Dumper=getattr(yaml, "CSafeDumper", yaml.SafeDumper),
+                     allow_unicode=True, sort_keys=False, width=100)
+    path.write_text(f"# {header}\n# Synthetischer Benchmark-Korpus (corpus_generator.py)\n\n"
+                    + text, encoding="utf-8")
+
+
+def generate_corpus(target: Path, automations: int = 1000, knx: int | None = None,
+                    template_depth: int = 3, knx_depth: int = 3,
+                    seed: int = DEFAULT_SEED) -> dict:
+    """Schreibt den Baum nach target und liefert Kennzahlen."""
+    rng = random.Random(seed)
+    knx = automations // 2 if knx is None else knx
+    target = Path(target)
+    files = 0
+
+    # Automationen, Scripts und Helper nach Bereich
+    number = 0
+    chunk = 0
+    while number < automations:
+        area = AREAS[chunk % len(AREAS)]
+        count = min(AUTOMATIONS_PER_FILE, automations - number)
+        items = []
+        for _ in range(count):
+            item = automation(rng, area, number, template_depth)
+            if number and rng.random() < DUPLICATE_RATE:
+                item["id"] = items[-1]["id"] if items else item["id"]
+            items.append(item)
+            number += 1
+        content = {
+            "input_boolean": {f"{area}_{chunk}_sperre": {"name": f"{area} Sperre {chunk}"}},
+            "script": {f"{area}_{chunk}_szene": {
+                "alias": f"{area} Szene {chunk}",
+                "sequence": [_action(rng, template_depth)]}},
+            "automation": items,
+        }
+        _dump(target / f"{area}_{chunk:04d}.yaml", f"{area} (Teil {chunk})", content)
+        files += 1
+        chunk += 1
+
+    # KNX: knx/<etage>/<raum>/.../<plattform>_<n>.yaml
+    platforms = ["light", "cover", "sensor", "binary_sensor"]
+    ga = 1 << 11
+    made = 0
+    part = 0
+    while made < knx:
+        count = min(KNX_ENTITIES_PER_FILE, knx - made)
+        platform = platforms[part % len(platforms)]
+        floor, room = FLOORS[part % len(FLOORS)], ROOMS[(part // len(FLOORS)) % len(ROOMS)]
+        parts = [floor, room] + [f"ebene{d}" for d in range(2, knx_depth)]
+        directory = target.joinpath("knx", *parts[:max(1, knx_depth)])
+        entities = []
+        for _ in range(count):
+            entities.append(knx_entity(rng, platform, f"{floor.upper()} {room} {made}", ga))
+            ga = (ga + 4) & 0xFFFF or 1 << 11
+            made += 1
+        _dump(directory / f"{platform}_{part:04d}.yaml", f"KNX {floor}/{room} {platform}",
+              {"knx": {platform: entities}})
+        files += 1
+        part += 1
+
+    return {"automations": automations, "knx": knx, "template_depth": template_depth,
+            "knx_depth": knx_depth, "seed": seed, "files": files,
+            "bytes": sum(p.stat().st_size for p in target.glob("**/*.yaml"))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetischer Package-Baum fuer Benchmarks")
+    parser.add_argument("target", help="Zielverzeichnis (wird angelegt)")
+    parser.add_argument("--automations", type=int, default=1000,
+                        help="Anzahl Automationen (Default: 1000)")
+    parser.add_argument("--knx", type=int, default=None,
+                        help="Anzahl KNX-Entities (Default: halb so viele wie Automationen)")
+    parser.add_argument("--template-depth", type=int, default=3,
+                        help="Verschachtelungstiefe der Jinja-Templates (Default: 3)")
+    parser.add_argument("--knx-depth", type=int, default=3,
+                        help="Verzeichnistiefe unter packages/knx/ (Default: 3)")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    args = parser.parse_args()
+
+    target = Path(args.target)
+    if target.exists() and any(target.iterdir()):
+        print(f"{target} ist nicht leer -- bitte ein leeres Verzeichnis angeben.")
+        return 1
+    stats = generate_corpus(target, args.automations, args.knx, args.template_depth,
+                            args.knx_depth, args.seed)
+    print(f"{stats['files']} Datei(en), {stats['bytes'] / 1024:.0f} KiB: "
+          f"{stats['automations']} Automationen, {stats['knx']} KNX-Entities -> {target}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,544 @@
+#!/usr/bin/env python3
+"""Abhaengigkeitsgraph: Automationen, Scripts und Entities ueber alle Packages.
+
+Knoten sind Automationen (automation.<alias als object_id>), Scripts
+(script.<key>), Entities und Events (event:<event_type>). Kanten:
+
+  triggert   Entity/Event -> Automation   (triggers: -- loest aus)
+  liest      Entity -> Automation/Script  (conditions:, Templates in Actions)
+  schreibt   Automation/Script -> Entity  (target/entity_id eines Service-Calls,
+                                            event: feuert ein Event)
+  ruft       Automation/Script -> Script  (script.x, script.turn_on)
+             Automation -> Automation     (automation.trigger)
+  schaltet   automation.turn_on/off, script.turn_off -- aendert nur den
+             Zustand, fuehrt nichts aus
+
+Gelesen wird dieselbe Struktur, die _validate_automation_list() prueft;
+Entities in Triggern, Bedingungen und Actions werden wie bei
+extract_entity_ids() gefunden (inkl. Templates), jeder Teilbaum und jeder
+String einer Datei nur einmal. Die Extraktion ist pro Datei im Parse-Cache
+gememot.
+
+Rueckkopplungen: Eine Automation schreibt eine Entity, die sie selbst (oder
+eine andere Automation, die zurueckschreibt) triggert. Gesucht wird ueber die
+starken Zusammenhangskomponenten (Tarjan) des Graphen "wer loest wen aus".
+Offensichtlich harmlose Paare fallen weg: ein State-Trigger mit to: 'on'
+feuert nicht durch turn_off. Bedingungen werden nicht ausgewertet -- eine
+gemeldete Schleife kann durch eine Condition entschaerft sein.
+
+Nutzung:
+  python tools/dependency_graph.py loops                 # Rueckkopplungen
+  python tools/dependency_graph.py fanout --top 20       # Entities mit den meisten Abhaengigen
+  python tools/dependency_graph.py show light.flur       # Kanten eines Knotens
+"""
+
+import sys
+import argparse
+from collections import defaultdict, deque
+from typing import NamedTuple
+
+from ha_yaml import (add_loader_arguments, collect_files, load_documents, open_cache,
+                     save_documents, DEFAULT_PACKAGES_DIR, PackageDocument)
+from entity_reference_checker import _string_entities
+from entity_registry import slugify
+
+# Windows-Encoding fix: UTF-8 erzwingen
+if sys.stdout.encoding != "utf-8":
+    sys.stdout.reconfigure(encoding="utf-8")
+
+TRIGGER, READ, WRITE, CALL, SWITCH = "triggert", "liest", "schreibt", "ruft", "schaltet"
+
+# Kanten, ueber die eine Automation eine andere (oder sich selbst) ausloesen kann
+ACTIVATING = {WRITE, CALL}
+
+# Zustand nach dem Service -- fuer den Abgleich mit "to:" eines State-Triggers
+SERVICE_STATES = {
+    "turn_on": "on", "turn_off": "off", "open_cover": "open", "close_cover": "closed",
+    "lock": "locked", "unlock": "unlocked", "open_valve": "open", "close_valve": "closed",
+}
+# Script-Services, die das Script nicht ausfuehren
+SCRIPT_SERVICES = {"turn_on", "turn_off", "toggle", "reload"}
+ENTITY_KEYS = ("entity_id",)
+NESTED_ACTIONS = ("sequence", "then", "else", "default", "parallel")
+
+
+class Edge(NamedTuple):
+    source: str
+    target: str
+    kind: str
+    detail: object      # TRIGGER: tuple der "to"-Zustaende oder None, WRITE: Service
+    file: str
+
+
+class Loop(NamedTuple):
+    members: tuple      # Automationen/Scripts der Komponente
+    path: tuple         # Beispiel-Zyklus: (knoten, via, knoten, via, ..., knoten)
+    file: str
+
+
+# ---------------------------------------------------------------------------
+# Extraktion pro Datei (gememot, daher nur Listen/Tupel/Strings)
+# ---------------------------------------------------------------------------
+class _EntityIndex:
+    """Entities je Teilbaum einer Datei, wie extract_entity_ids() sie findet.
+
+    Trigger, Bedingungen, Service-Targets und Templates ueberlappen sich; jeder
+    Teilbaum (ueber id(), der Inhalt lebt waehrend der Extraktion) und jeder
+    String wird nur einmal ausgewertet -- Strings auf Wunsch ueber alle Dateien
+    eines Laufs (strings).
+    """
+
+    def __init__(self, strings: dict | None = None):
+        self.strings = {} if strings is None else strings
+        self.subtrees = {}
+
+    def of(self, obj) -> frozenset:
+        if isinstance(obj, str):
+            found = self.strings.get(obj)
+            if found is None:
+                found = self.strings[obj] = frozenset(e for e, _ in _string_entities(obj))
+            return found
+        if not isinstance(obj, (list, dict)):
+            return frozenset()
+        found = self.subtrees.get(id(obj))
+        if found is None:
+            found = self.subtrees[id(obj)] = self.items(
+                obj.items() if isinstance(obj, dict) else enumerate(obj))
+        return found
+
+    def items(self, pairs) -> frozenset:
+        """Vereinigung ueber (key, value)-Paare, ohne sie zu cachen (temporaere Dicts)."""
+        found = set()
+        for key, value in pairs:
+            # 'action:' Keys enthalten Service-Calls, keine Entity-IDs
+            if key == "action" and isinstance(value, str):
+                continue
+            found |= self.of(value)
+        return frozenset(found)
+
+
+def _as_list(value) -> list:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def automation_node(auto: dict, index: int, stem: str) -> str:
+    """Entity-ID der Automation, wie HA sie aus alias (sonst id) bildet."""
+    for key in ("alias", "id"):
+        value = auto.get(key)
+        if isinstance(value, (str, int)) and slugify(str(value)):
+            return f"automation.{slugify(str(value))}"
+    return f"automation.{slugify(stem)}_{index + 1}"
+
+
+def _trigger_edges(node: str, triggers, edges: list, index: _EntityIndex):
+    for trigger in _as_list(triggers):
+        if not isinstance(trigger, dict):
+            continue
+        platform = trigger.get("trigger", trigger.get("platform"))
+        if platform == "event":
+            for event_type in _as_list(trigger.get("event_type")):
+                if isinstance(event_type, str):
+                    edges.append((f"event:{event_type}", node, TRIGGER, None))
+            continue
+        detail = None
+        if platform == "state" and "attribute" not in trigger:
+            to = _as_list(trigger.get("to"))
+            if to and all(isinstance(s, str) and "{" not in s for s in to):
+                detail = tuple(to)
+        for entity in sorted(index.of(trigger)):
+            edges.append((entity, node, TRIGGER, detail))
+
+
+def _read_edges(node: str, entities: frozenset, edges: list):
+    for entity in sorted(entities):
+        edges.append((entity, node, READ, None))
+
+
+def _service_edges(node: str, step: dict, service: str, edges: list, index: _EntityIndex):
+    domain, _, name = service.partition(".")
+    targets = []
+    for container in (step, step.get("target"), step.get("data")):
+        if isinstance(container, dict):
+            for key in ENTITY_KEYS:
+                if key in container:
+                    targets.extend(sorted(index.of(container[key])))
+    targets = list(dict.fromkeys(targets))
+
+    if domain == "script" and name not in SCRIPT_SERVICES:
+        edges.append((node, service, CALL, service))
+    elif service in ("script.turn_on", "script.toggle", "automation.trigger"):
+        for target in targets:
+            edges.append((node, target, CALL, service))
+    elif service in ("automation.turn_on", "automation.turn_off", "automation.toggle",
+                     "script.turn_off"):
+        for target in targets:
+            edges.append((node, target, SWITCH, service))
+    else:
+        for target in targets:
+            edges.append((node, target, WRITE, service))
+
+    # Uebrige Felder (Templates in data:, ...) werden nur gelesen
+    rest = [(k, v) for k, v in step.items() if k not in ("action", "service", "target", "data")
+            and k not in ENTITY_KEYS]
+    data = step.get("data")
+    if isinstance(data, dict):
+        rest.extend((k, v) for k, v in data.items() if k not in ENTITY_KEYS)
+    elif "data" in step:
+        rest.append(("data", data))
+    _read_edges(node, index.items(rest), edges)
+
+
+def _action_edges(node: str, steps, edges: list, index: _EntityIndex):
+    """Actions rekursiv: choose/if/then/else/sequence/parallel/repeat."""
+    for step in _as_list(steps):
+        if not isinstance(step, dict):
+            continue
+        service = step.get("action", step.get("service"))
+        if isinstance(service, str) and "." in service:
+            _service_edges(node, step, service, edges, index)
+            continue
+        if isinstance(step.get("event"), str):
+            edges.append((node, f"event:{step['event']}", WRITE, "event"))
+            _read_edges(node, index.of(step.get("event_data")), edges)
+            continue
+        for key, value in step.items():
+            if key in NESTED_ACTIONS:
+                _action_edges(node, value, edges, index)
+            elif key == "choose":
+                for option in _as_list(value):
+                    if isinstance(option, dict):
+                        _read_edges(node, index.of(option.get("conditions")), edges)
+                        _action_edges(node, option.get("sequence"), edges, index)
+            elif key == "repeat" and isinstance(value, dict):
+                _action_edges(node, value.get("sequence"), edges, index)
+                _read_edges(node, index.items((k, v) for k, v in value.items()
+                                              if k != "sequence"), edges)
+            else:
+                # if:, condition:, wait_template:, wait_for_trigger:, delay:, variables:
+                _read_edges(node, index.of(value), edges)
+
+
+def extract_dependencies(content, stem: str, strings: dict | None = None) -> list[tuple]:
+    """Definierte Knoten und Kanten einer Datei.
+
+    Liefert [("node", name, art), ..., ("edge", quelle, ziel, art, detail), ...].
+    strings: gemeinsamer String-Cache mehrerer Dateien (siehe _EntityIndex).
+    """
+    records = []
+    if isinstance(content, list):
+        automations, scripts = content, {}
+    elif isinstance(content, dict):
+        automations = content.get("automation")
+        scripts = content.get("script")
+    else:
+        return records
+
+    index = _EntityIndex(strings)
+    for i, auto in enumerate(_as_list(automations) if isinstance(automations, list) else []):
+        if not isinstance(auto, dict):
+            continue
+        node = automation_node(auto, i, stem)
+        records.append(("node", node, "automation"))
+        edges = []
+        _trigger_edges(node, auto.get("triggers", auto.get("trigger")), edges, index)
+        _read_edges(node, index.of(auto.get("conditions", auto.get("condition"))), edges)
+        _action_edges(node, auto.get("actions", auto.get("action")), edges, index)
+        records.extend(("edge", *edge) for edge in dict.fromkeys(edges))
+
+    for key, script in (scripts.items() if isinstance(scripts, dict) else ()):
+        if not isinstance(script, dict):
+            continue
+        node = f"script.{key}"
+        records.append(("node", node, "script"))
+        edges = []
+        _action_edges(node, script.get("sequence"), edges, index)
+        records.extend(("edge", *edge) for edge in dict.fromkeys(edges))
+    return records
+
+
+# ---------------------------------------------------------------------------
+# Graph
+# ---------------------------------------------------------------------------
+def _may_trigger(write: Edge, trigger: Edge) -> bool:
+    """Kann dieser Schreibzugriff diesen Trigger ausloesen?"""
+    if trigger.detail is None:
+        return True
+    if write.kind == CALL:
+        # Laufendes Script: Zustand "on"
+        return "on" in trigger.detail
+    state = SERVICE_STATES.get(str(write.detail).rpartition(".")[2])
+    return state is None or state in trigger.detail
+
+
+class DependencyGraph:
+    """Knoten und Kanten aller Dateien; Abfragen fuer Schleifen und Fan-out."""
+
+    def __init__(self):
+        self.kinds = {}                     # Knoten -> automation/script (nur definierte)
+        self.files = {}                     # Knoten -> Datei der Definition
+        self.outgoing = defaultdict(list)   # Knoten -> [Edge]
+        self.incoming = defaultdict(list)
+
+    def add_file(self, fname: str, records: list):
+        for record in records:
+            if record[0] == "node":
+                _, node, kind = record
+                self.kinds[node] = kind
+                self.files.setdefault(node, fname)
+            else:
+                _, source, target, kind, detail = record
+                edge = Edge(source, target, kind, detail, fname)
+                self.outgoing[source].append(edge)
+                self.incoming[target].append(edge)
+
+    def runnable(self, node: str) -> bool:
+        return node in self.kinds
+
+    def activations(self) -> dict[str, list[tuple[str, str | None]]]:
+        """Wer loest wen aus: Automation/Script -> [(Automation/Script, via)]."""
+        result = defaultdict(list)
+        for node in self.kinds:
+            seen = set()
+            for out in self.outgoing.get(node, ()):
+                if out.kind not in ACTIVATING:
+                    continue
+                if out.kind == CALL and self.runnable(out.target) \
+                        and (out.target, None) not in seen:
+                    seen.add((out.target, None))
+                    result[node].append((out.target, None))
+                # Geschriebene Entity (auch der Zustand eines gerufenen Scripts)
+                for trigger in self.outgoing.get(out.target, ()):
+                    if trigger.kind != TRIGGER or not _may_trigger(out, trigger):
+                        continue
+                    if (trigger.target, out.target) not in seen:
+                        seen.add((trigger.target, out.target))
+                        result[node].append((trigger.target, out.target))
+        return result
+
+    def loops(self) -> list[Loop]:
+        """Rueckkopplungen: je starke Zusammenhangskomponente ein Beispiel-Zyklus."""
+        graph = self.activations()
+        loops = []
+        for component in _strongly_connected(sorted(self.kinds), graph):
+            members = set(component)
+            start = min(members)
+            if len(members) == 1 and not any(t == start for t, _ in graph.get(start, ())):
+                continue
+            path = _shortest_cycle(start, graph, members)
+            loops.append(Loop(tuple(sorted(members)), path, self.files.get(start, "")))
+        return sorted(loops, key=lambda loop: (loop.file, loop.members))
+
+    def fanout(self, top: int = 20) -> list[tuple[str, set, set]]:
+        """Entities mit den meisten Abhaengigen: (entity, triggert, liest nur)."""
+        rows = []
+        for node, edges in self.outgoing.items():
+            if self.runnable(node):
+                continue
+            triggered = {e.target for e in edges if e.kind == TRIGGER}
+            readers = {e.target for e in edges if e.kind == READ} - triggered
+            if triggered or readers:
+                rows.append((node, triggered, readers))
+        rows.sort(key=lambda row: (-len(row[1]) - len(row[2]), -len(row[1]), row[0]))
+        return rows[:top] if top else rows
+
+
+def _strongly_connected(nodes: list[str], graph: dict) -> list[list[str]]:
+    """Tarjan, iterativ (tiefe Ketten sprengen sonst das Rekursionslimit)."""
+    index = {}
+    lowlink = {}
+    on_stack = set()
+    stack = []
+    components = []
+    counter = 0
+    for root in nodes:
+        if root in index:
+            continue
+        work = [(root, iter(graph.get(root, ())))]
+        index[root] = lowlink[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, successors = work[-1]
+            advanced = False
+            for target, _ in successors:
+                if target not in index:
+                    index[target] = lowlink[target] = counter
+                    counter += 1
+                    stack.append(target)
+                    on_stack.add(target)
+                    work.append((target, iter(graph.get(target, ()))))
+                    advanced = True
+                    break
+                if target in on_stack:
+                    lowlink[node] = min(lowlink[node], index[target])
+            if advanced:
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[node])
+            if lowlink[node] == index[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(component)
+    return components
+
+
+def _shortest_cycle(start: str, graph: dict, members: set) -> tuple:
+    """Kuerzester Zyklus start -> ... -> start innerhalb der Komponente (BFS)."""
+    previous = {}
+    queue = deque([start])
+    seen = set()
+    while queue:
+        node = queue.popleft()
+        for target, via in graph.get(node, ()):
+            if target not in members:
+                continue
+            if target == start:
+                path = [target]
+                step = (node, via)
+                while True:
+                    source, through = step
+                    if through is not None:
+                        path.append(through)
+                    path.append(source)
+                    if source == start:
+                        return tuple(reversed(path))
+                    step = previous[source]
+            if target not in seen:
+                seen.add(target)
+                previous[target] = (node, via)
+                queue.append(target)
+    return (start,)
+
+
+def format_path(path: tuple) -> str:
+    return " -> ".join(path)
+
+
+# ---------------------------------------------------------------------------
+# Passes
+# ---------------------------------------------------------------------------
+def graph_pass(documents: list[PackageDocument]) -> DependencyGraph:
+    """Graph aus allen geladenen Dokumenten (Extraktion aus dem Cache)."""
+    graph = DependencyGraph()
+    strings = {}
+    for doc in documents:
+        if not doc.ok or doc.content is None:
+            continue
+        graph.add_file(doc.name, doc.memo("dependencies",
+                                          lambda: extract_dependencies(doc.content,
+                                                                       doc.path.stem, strings)))
+    return graph
+
+
+def dependency_pass(documents: list[PackageDocument], result) -> DependencyGraph:
+    """Rueckkopplungen als Warnungen fuer yaml_validator/run_tests (result: ValidationResult)."""
+    graph = graph_pass(documents)
+    report_loops(graph, result)
+    return graph
+
+
+def report_loops(graph: DependencyGraph, result):
+    """Rueckkopplungen eines fertigen Graphen als Warnungen in result eintragen."""
+    for loop in graph.loops():
+        result.warn(loop.file, f"Moegliche Endlosschleife: {format_path(loop.path)}")
+
+
+# ---------------------------------------------------------------------------
+# Ausgabe
+# ---------------------------------------------------------------------------
+def _describe(node: str, graph: DependencyGraph) -> str:
+    fname = graph.files.get(node)
+    return f"{node} ({fname})" if fname else node
+
+
+def print_loops(graph: DependencyGraph) -> int:
+    loops = graph.loops()
+    print(f"\n  {len(graph.kinds)} Automationen/Scripts, "
+          f"{sum(len(e) for e in graph.outgoing.values())} Kanten")
+    if not loops:
+        print(f"\n  Keine Rueckkopplungen gefunden.")
+        return 0
+    print(f"\n  WARNUNG: Moegliche Endlosschleifen ({len(loops)}):")
+    for loop in loops:
+        print(f"\n    {format_path(loop.path)}")
+        if len(loop.members) > 1:
+            print(f"      Beteiligt: " + ", ".join(_describe(m, graph) for m in loop.members))
+        else:
+            print(f"      In: {_describe(loop.members[0], graph)}")
+    print(f"\n  Bedingungen werden nicht ausgewertet -- pruefen, ob eine Condition "
+          f"oder 'mode:' die Schleife stoppt.")
+    return 1
+
+
+def print_fanout(graph: DependencyGraph, top: int) -> int:
+    rows = graph.fanout(top)
+    print(f"\n  Entities mit den meisten Abhaengigen (triggert / liest):")
+    for entity, triggered, readers in rows:
+        print(f"    {len(triggered):4d} / {len(readers):<4d} {entity}")
+    if not rows:
+        print(f"    (keine)")
+    return 0
+
+
+def print_node(graph: DependencyGraph, node: str) -> int:
+    outgoing = graph.outgoing.get(node, [])
+    incoming = graph.incoming.get(node, [])
+    if not outgoing and not incoming and node not in graph.kinds:
+        print(f"  '{node}' kommt im Graphen nicht vor.")
+        return 1
+    print(f"\n  {_describe(node, graph)}")
+    for title, edges, other in (("Eingehend", incoming, "source"),
+                                ("Ausgehend", outgoing, "target")):
+        print(f"\n  {title} ({len(edges)}):")
+        for edge in sorted(edges, key=lambda e: (e.kind, getattr(e, other))):
+            detail = ""
+            if edge.kind == TRIGGER and edge.detail:
+                detail = f"  [to: {', '.join(edge.detail)}]"
+            elif edge.kind in (WRITE, CALL, SWITCH) and edge.detail:
+                detail = f"  [{edge.detail}]"
+            arrow = f"<- {edge.kind}" if other == "source" else f"{edge.kind} ->"
+            print(f"    {arrow:<12} {getattr(edge, other)}{detail}  ({edge.file})")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Abhaengigkeitsgraph: Schleifen und Fan-out")
+    parser.add_argument("--packages-dir", "-d", default=str(DEFAULT_PACKAGES_DIR),
+                        help="Packages-Verzeichnis (Default: packages/)")
+    add_loader_arguments(parser)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("loops", help="Rueckkopplungen (Automation triggert sich selbst/gegenseitig)")
+    p = sub.add_parser("fanout", help="Entities mit den meisten abhaengigen Automationen")
+    p.add_argument("--top", type=int, default=20, help="Anzahl (Default: 20, 0 = alle)")
+    p = sub.add_parser("show", help="Ein- und ausgehende Kanten eines Knotens")
+    p.add_argument("node", help="Entity-ID, automation.x, script.x oder event:typ")
+    args = parser.parse_args()
+
+    files = collect_files(packages_dir=args.packages_dir)
+    if not files:
+        print("Keine YAML-Dateien gefunden.")
+        return 0
+    cache = open_cache(not args.no_cache)
+    documents = load_documents(files, cache, args.jobs)
+    graph = graph_pass(documents)
+    save_documents(documents, cache)
+
+    if args.command == "loops":
+        return print_loops(graph)
+    if args.command == "fanout":
+        return print_fanout(graph, args.top)
+    return print_node(graph, args.node)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
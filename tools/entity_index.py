@@ -0,0 +1,142 @@
+"""Persistenter invertierter Entity-Index fuer Home Assistant Packages.
+
+Bildet entity_id -> Fundstellen (Datei, Zeile, Automation/Script, YAML-Pfad)
+ab. Der Index wird in .cache/entity_index.json gespeichert und pro Datei
+ueber (mtime, Groesse) aktualisiert -- bei einer Abfrage werden nur
+geaenderte Dateien neu eingelesen, der Rest kommt aus dem Index.
+
+Die Fundstellen selbst liefert entity_reference_checker.locate_file().
+"""
+
+import os
+import json
+import tempfile
+from bisect import bisect_left
+from collections import defaultdict
+from pathlib import Path
+from typing import NamedTuple
+
+from ha_yaml import PROJECT_DIR, TOOL_VERSION
+
+DEFAULT_INDEX_PATH = PROJECT_DIR / ".cache" / "entity_index.json"
+
+
+class Occurrence(NamedTuple):
+    """Eine Fundstelle einer Entity-ID."""
+    file: str
+    line: int
+    owner: str
+    path: str
+
+
+def _signature(filepath: Path) -> list[int] | None:
+    try:
+        st = filepath.stat()
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+class EntityIndex:
+    """Fundstellen pro Datei, daraus abgeleitet der invertierte Index."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root).resolve()
+        # rel. Pfad -> {"sig": [mtime_ns, size], "entries": [[entity, line, owner, path], ...]}
+        self.files = {}
+        self._by_entity = None
+        self._sorted_ids = None
+
+    # -- Persistenz ---------------------------------------------------------
+    @classmethod
+    def load(cls, root: Path, index_path: Path = DEFAULT_INDEX_PATH) -> "EntityIndex":
+        """Laedt den Index; bei fehlender/inkompatibler Datei leer."""
+        index = cls(root)
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return index
+        if data.get("version") == TOOL_VERSION and data.get("root") == str(index.root):
+            index.files = data.get("files", {})
+        return index
+
+    def save(self, index_path: Path = DEFAULT_INDEX_PATH):
+        """Schreibt den Index atomar."""
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        data = {"version": TOOL_VERSION, "root": str(self.root), "files": self.files}
+        fd, tmp = tempfile.mkstemp(dir=index_path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp, index_path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+    # -- Aktualisierung -----------------------------------------------------
+    def _rel(self, filepath: Path) -> str:
+        path = filepath.resolve()
+        try:
+            return path.relative_to(self.root).as_posix()
+        except ValueError:
+            return str(path)
+
+    def refresh(self, files: list[Path], locate) -> int:
+        """Gleicht den Index mit der Dateiliste ab.
+
+        locate(filepath) liefert [(entity, line, owner, path), ...]. Es werden
+        nur neue oder geaenderte Dateien eingelesen. Gibt die Anzahl der
+        neu indizierten Dateien zurueck (0 = Index war aktuell).
+        """
+        changed = 0
+        seen = set()
+        for filepath in files:
+            rel = self._rel(filepath)
+            seen.add(rel)
+            sig = _signature(filepath)
+            entry = self.files.get(rel)
+            if entry is not None and entry["sig"] == sig:
+                continue
+            self.files[rel] = {
+                "sig": sig,
+                "entries": [list(e) for e in locate(filepath)],
+            }
+            changed += 1
+        for rel in set(self.files) - seen:
+            del self.files[rel]
+            changed += 1
+        if changed:
+            self._by_entity = None
+            self._sorted_ids = None
+        return changed
+
+    # -- Abfragen -----------------------------------------------------------
+    def _inverted(self) -> dict[str, list[Occurrence]]:
+        if self._by_entity is None:
+            by_entity = defaultdict(list)
+            for rel in sorted(self.files):
+                for entity, line, owner, path in self.files[rel]["entries"]:
+                    by_entity[entity].append(Occurrence(rel, line, owner, path))
+            self._by_entity = dict(by_entity)
+            self._sorted_ids = sorted(self._by_entity)
+        return self._by_entity
+
+    def who_uses(self, entity_id: str) -> list[Occurrence]:
+        """Alle Fundstellen einer Entity-ID."""
+        return self._inverted().get(entity_id, [])
+
+    def with_prefix(self, prefix: str) -> dict[str, list[Occurrence]]:
+        """Alle Entity-IDs mit diesem Praefix und ihre Fundstellen."""
+        by_entity = self._inverted()
+        ids = self._sorted_ids
+        result = {}
+        for i in range(bisect_left(ids, prefix), len(ids)):
+            if not ids[i].startswith(prefix):
+                break
+            result[ids[i]] = by_entity[ids[i]]
+        return result
+
+    def entity_ids(self) -> list[str]:
+        self._inverted()
+        return list(self._sorted_ids)
@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+"""Batch-Umbenennung: Entity-IDs, Actions und Automation-IDs in allen Packages.
+
+Eine Mapping-Datei alt -> neu wird in einem Durchgang auf alle Packages
+angewendet. Geaendert wird der Quelltext, nicht der geladene YAML-Baum --
+Kommentare (# TODO ...), Einrueckung, Quotes und Zeilenenden bleiben exakt
+erhalten. Ersetzt wird genau dort, wo die Entity-Extraktion
+(extract_entity_ids, inkl. Jinja-Templates) eine Referenz findet:
+
+  entity_id: light.alt, Listen, target:, data:, Templates ({{ states('light.alt') }},
+  states.light.alt, 'light.alt' | is_state('on') ...)
+  action: notify.altes_handy       Action/Service mit genau diesem Namen
+  input_boolean: {alt: ...}        Definition (Key) bei gleicher Domain
+  id: alte_automation_id           Automation-IDs (Abschnitt automations:)
+
+Fundstellen, die sich nicht als Text ersetzen lassen (states.light['alt'],
+Definitionen ueber knx name:, Domain-Wechsel einer Definition), werden
+gemeldet statt geraten.
+
+Kosten: jede Datei wird einmal gelesen und hoechstens einmal geschrieben.
+Dateien ohne Treffer werden mit einem Regex-Lauf und Set-Lookups
+uebersprungen (unabhaengig von der Groesse des Mappings); nur betroffene
+Dateien werden geparst. Ohne --apply gibt es nur den Diff. Mit --apply
+werden erst alle neuen Inhalte als Temp-Dateien geschrieben und geprueft
+(YAML gueltig, Datei seit dem Lesen unveraendert), dann per os.replace()
+eingesetzt -- bei einem Fehler bleibt keine Datei halb geaendert.
+
+Mapping (YAML):
+  entities:
+    notify.altes_handy: notify.mobile_app_neues_handy
+    light.flur_alt: light.flur_decke
+  automations:
+    alarm_kueche_alt: alarm_kueche_wassermelder
+oder flach (nur Entities) als YAML-Dict bzw. CSV mit zwei Spalten alt,neu.
+
+Nutzung:
+  python tools/entity_refactor.py mapping.yaml            # Diff anzeigen
+  python tools/entity_refactor.py mapping.yaml --apply    # Schreiben
+"""
+
+import io
+import os
+import re
+import csv
+import sys
+import difflib
+import argparse
+import tempfile
+from pathlib import Path
+from typing import NamedTuple
+
+import yaml
+
+from ha_yaml import FAST_LOADER, DEFAULT_PACKAGES_DIR, collect_files
+from entity_reference_checker import (ENTITY_PATTERN, VALID_DOMAINS, _mapping_items,
+                                      _node_string, _string_entities)
+from entity_registry import KEYED_DOMAINS
+
+# Windows-Encoding fix: UTF-8 erzwingen
+if sys.stdout.encoding != "utf-8":
+    sys.stdout.reconfigure(encoding="utf-8")
+
+# Punkt-Ketten wie states.light.flur.state -- jedes benachbarte Paar ist ein Kandidat
+CHAIN_PATTERN = re.compile(r"(?<![A-Za-z0-9_])[a-z_][a-z0-9_]*(?:\.[a-z0-9_]+)+(?![A-Za-z0-9_])")
+WORD_PATTERN = re.compile(r"[^\s'\"\[\]{},:#]+")
+SERVICE_KEYS = ("action", "service")
+
+
+class Edit(NamedTuple):
+    start: int
+    end: int
+    new: str
+    old: str        # Mapping-Key (Statistik)
+
+
+class Mapping:
+    """Entities (inkl. Actions) und Automation-IDs, alt -> neu."""
+
+    def __init__(self, entities: dict | None = None, automations: dict | None = None):
+        self.entities = dict(entities or {})
+        self.automations = dict(automations or {})
+
+    @classmethod
+    def from_file(cls, path: Path) -> "Mapping":
+        if path.suffix.lower() in (".csv", ".tsv", ".txt"):
+            with open(path, "r", encoding="utf-8-sig", newline="") as f:
+                sample = f.read(4096)
+                f.seek(0)
+                dialect = csv.Sniffer().sniff(sample, delimiters=",;\t") if sample else csv.excel
+                rows = [r for r in csv.reader(f, dialect) if r and not r[0].startswith("#")]
+            return cls({r[0].strip(): r[1].strip() for r in rows if len(r) >= 2})
+        with open(path, "r", encoding="utf-8") as f:
+            data = yaml.safe_load(f) or {}
+        if not isinstance(data, dict):
+            raise ValueError(f"{path}: Mapping muss ein Dict sein")
+        if set(data) <= {"entities", "automations"}:
+            return cls(data.get("entities"), data.get("automations"))
+        return cls(data)
+
+    def validate(self) -> list[str]:
+        """Fehler im Mapping (leere Liste: alles gut)."""
+        errors = []
+        for old, new in self.entities.items():
+            for value in (old, new):
+                if not isinstance(value, str) or not ENTITY_PATTERN.fullmatch(value):
+                    errors.append(f"'{value}' ist keine Entity-ID")
+            if isinstance(new, str) and new.split(".")[0] not in VALID_DOMAINS:
+                errors.append(f"'{new}': unbekannte Domain")
+        for old, new in self.automations.items():
+            if not isinstance(old, (str, int)) or not isinstance(new, (str, int)) or not str(new):
+                errors.append(f"Automation-ID '{old}' -> '{new}' ungueltig")
+        targets = list(self.automations.values())
+        for new in {t for t in targets if targets.count(t) > 1}:
+            errors.append(f"Automation-ID '{new}' ist mehrfach Ziel")
+        self.automations = {str(k): str(v) for k, v in self.automations.items()}
+        return errors
+
+
+class FileResult(NamedTuple):
+    path: Path
+    text: str
+    new_text: str
+    edits: list
+    unresolved: list        # (zeile, meldung)
+    automation_ids: list    # vorhandene Automation-IDs (nach der Umbenennung)
+
+
+# ---------------------------------------------------------------------------
+# Fundstellen im Node-Baum
+# ---------------------------------------------------------------------------
+class _Rewriter:
+    def __init__(self, text: str, mapping: Mapping):
+        self.text = text
+        self.mapping = mapping
+        self.edits = []
+        self.unresolved = []
+        self.automation_ids = []
+
+    def scalar(self, node):
+        """Entity-Referenzen in einem Scalar, so wie extract_entity_ids() sie findet."""
+        value = _node_string(node)
+        if value is None or "." not in value:
+            return
+        hits = {}
+        for entity, _ in _string_entities(value):
+            if entity in self.mapping.entities:
+                hits[entity] = hits.get(entity, 0) + 1
+        if not hits:
+            return
+        start, end = node.start_mark.index, node.end_mark.index
+        found = dict.fromkeys(hits, 0)
+        for m in CHAIN_PATTERN.finditer(self.text, start, end):
+            parts = m.group().split(".")
+            offset = m.start()
+            for i in range(len(parts) - 1):
+                pair = f"{parts[i]}.{parts[i + 1]}"
+                if pair in hits:
+                    pair_end = offset + len(pair)
+                    self.edits.append(Edit(offset, pair_end, self.mapping.entities[pair], pair))
+                    found[pair] += 1
+                offset += len(parts[i]) + 1
+        # Mehr Fundstellen als Ersetzungen: z.B. states.light['alt']
+        for entity in sorted(e for e in hits if found[e] < hits[e]):
+            self.unresolved.append((node.start_mark.line + 1,
+                                    f"{entity}: nicht als Text ersetzbar "
+                                    f"('{value.strip()[:60]}')"))
+
+    def exact(self, node, table: dict, old: str | None = None):
+        """Ganzer Scalar-Wert (Action, Automation-ID) -- Quotes bleiben stehen."""
+        value = _node_string(node)
+        if value is None and isinstance(node, yaml.ScalarNode):
+            value = node.value      # id: 12345 (int-Tag)
+        if value is None or value not in table:
+            return False
+        start, end = node.start_mark.index, node.end_mark.index
+        source = self.text[start:end]
+        inner = source.find(value)
+        if inner < 0:
+            self.unresolved.append((node.start_mark.line + 1, f"{value}: nicht als Text ersetzbar"))
+            return True
+        self.edits.append(Edit(start + inner, start + inner + len(value), table[value],
+                               old or value))
+        return True
+
+    def walk(self, node):
+        """Wie locate_entity_ids(): action:-Werte sind Services, keine Entities."""
+        if isinstance(node, yaml.ScalarNode):
+            self.scalar(node)
+        elif isinstance(node, yaml.SequenceNode):
+            for item in node.value:
+                self.walk(item)
+        elif isinstance(node, yaml.MappingNode):
+            for key, value in _mapping_items(node):
+                if key in SERVICE_KEYS and _node_string(value) is not None:
+                    self.exact(value, self.mapping.entities)
+                    continue
+                self.walk(value)
+
+    def automations(self, node):
+        if not isinstance(node, yaml.SequenceNode):
+            self.walk(node)
+            return
+        for item in node.value:
+            if isinstance(item, yaml.MappingNode):
+                for key, value in _mapping_items(item):
+                    if key == "id" and isinstance(value, yaml.ScalarNode):
+                        renamed = self.mapping.automations.get(value.value)
+                        self.automation_ids.append(renamed or value.value)
+                        if renamed:
+                            self.exact(value, self.mapping.automations)
+                        continue
+                    if key in SERVICE_KEYS and _node_string(value) is not None:
+                        self.exact(value, self.mapping.entities)
+                        continue
+                    self.walk(value)
+            else:
+                self.walk(item)
+
+    def definitions(self, domain: str, node):
+        """Keys wie input_boolean: {alt: ...} -> {neu: ...}"""
+        for key_node, value in node.value:
+            if isinstance(key_node, yaml.ScalarNode):
+                entity = f"{domain}.{key_node.value}"
+                new = self.mapping.entities.get(entity)
+                if new is not None:
+                    new_domain, _, new_key = new.partition(".")
+                    if new_domain != domain:
+                        self.unresolved.append((key_node.start_mark.line + 1,
+                                                f"{entity}: Definition kann die Domain nicht "
+                                                f"wechseln ({new})"))
+                    else:
+                        self.exact(key_node, {key_node.value: new_key}, entity)
+            self.walk(value)
+
+    def knx(self, node):
+        """KNX-Entities entstehen aus name: -- nur melden."""
+        from entity_registry import KNX_PLATFORMS, slugify
+        for platform, items in _mapping_items(node):
+            if platform in KNX_PLATFORMS and isinstance(items, yaml.SequenceNode):
+                for item in items.value:
+                    if not isinstance(item, yaml.MappingNode):
+                        continue
+                    fields = dict(_mapping_items(item))
+                    name = _node_string(fields.get("name")) if "name" in fields else None
+                    entity = f"{platform}.{slugify(name)}" if name else None
+                    if entity in self.mapping.entities:
+                        self.unresolved.append((item.start_mark.line + 1,
+                                                f"{entity}: Definition ueber knx name: "
+                                                f"'{name}' -- Namen von Hand anpassen"))
+        self.walk(node)
+
+    def document(self, root):
+        if isinstance(root, yaml.SequenceNode):
+            self.automations(root)
+            return
+        if not isinstance(root, yaml.MappingNode):
+            return
+        for key, value in _mapping_items(root):
+            if key == "automation":
+                self.automations(value)
+            elif key in KEYED_DOMAINS and isinstance(value, yaml.MappingNode):
+                self.definitions(key, value)
+            elif key == "knx" and isinstance(value, yaml.MappingNode):
+                self.knx(value)
+            else:
+                self.walk(value)
+
+
+def _apply_edits(text: str, edits: list[Edit]) -> str:
+    parts = []
+    pos = 0
+    for edit in sorted(set(edits)):
+        if edit.start < pos:
+            continue
+        parts.append(text[pos:edit.start])
+        parts.append(edit.new)
+        pos = edit.end
+    parts.append(text[pos:])
+    return "".join(parts)
+
+
+def might_match(text: str, mapping: Mapping, automation_words: set) -> bool:
+    """Vorfilter ohne Parsen: ein Regex-Lauf + Set-Lookups pro Datei."""
+    entities = mapping.entities
+    if entities:
+        for m in CHAIN_PATTERN.finditer(text):
+            parts = m.group().split(".")
+            if any(f"{a}.{b}" in entities for a, b in zip(parts, parts[1:])):
+                return True
+    if automation_words:
+        return any(w in automation_words for w in WORD_PATTERN.findall(text))
+    return False
+
+
+def rewrite_text(path: Path, text: str, mapping: Mapping) -> FileResult:
+    """Neuer Inhalt einer Datei (text unveraendert, falls nichts zu tun ist)."""
+    stream = io.StringIO(text)
+    stream.name = str(path)
+    root = yaml.compose(stream, Loader=FAST_LOADER)
+    rewriter = _Rewriter(text, mapping)
+    if root is not None:
+        rewriter.document(root)
+    new_text = _apply_edits(text, rewriter.edits) if rewriter.edits else text
+    return FileResult(path, text, new_text, rewriter.edits, rewriter.unresolved,
+                      rewriter.automation_ids)
+
+
+# ---------------------------------------------------------------------------
+# Lauf
+# ---------------------------------------------------------------------------
+def _read(path: Path) -> tuple[str, tuple]:
+    """Text exakt wie auf der Platte (CRLF bleibt CRLF) + Signatur."""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        text = f.read()
+    st = path.stat()
+    return text, (st.st_mtime_ns, st.st_size)
+
+
+def plan(files: list[Path], mapping: Mapping) -> tuple[list[FileResult], list[str], dict]:
+    """Alle Dateien einmal lesen, betroffene umschreiben.
+
+    Liefert (Ergebnisse mit Aenderungen oder offenen Fundstellen, Fehler, Signaturen).
+    """
+    automation_words = set(mapping.automations) | set(mapping.automations.values())
+    results = []
+    errors = []
+    signatures = {}
+    all_ids = {}
+    for path in files:
+        try:
+            text, signatures[path] = _read(path)
+        except (OSError, UnicodeDecodeError) as e:
+            errors.append(f"{path}: nicht lesbar ({type(e).__name__})")
+            continue
+        if not might_match(text, mapping, automation_words):
+            continue
+        try:
+            result = rewrite_text(path, text, mapping)
+        except yaml.YAMLError as e:
+            errors.append(f"{path}: YAML-Fehler, nicht umgeschrieben ({e.__class__.__name__})")
+            continue
+        for aid in result.automation_ids:
+            all_ids.setdefault(aid, []).append(path.name)
+        if result.edits or result.unresolved:
+            results.append(result)
+    for aid, names in sorted(all_ids.items()):
+        if aid in mapping.automations.values() and len(names) > 1:
+            errors.append(f"Automation-ID '{aid}' waere doppelt: {', '.join(names)}")
+    return results, errors, signatures
+
+
+def print_diff(results: list[FileResult], root: Path):
+    for result in results:
+        if result.new_text == result.text:
+            continue
+        name = result.path.resolve().relative_to(root.resolve()).as_posix() \
+            if root.resolve() in result.path.resolve().parents else str(result.path)
+        diff = difflib.unified_diff(result.text.splitlines(keepends=True),
+                                    result.new_text.splitlines(keepends=True),
+                                    f"a/{name}", f"b/{name}")
+        sys.stdout.writelines(line if line.endswith("\n") else line + "\n" for line in diff)
+
+
+def apply(results: list[FileResult], signatures: dict) -> list[Path]:
+    """Alle Dateien oder keine: Temp-Dateien schreiben und pruefen, dann ersetzen."""
+    pending = []
+    try:
+        for result in results:
+            if result.new_text == result.text:
+                continue
+            yaml.compose(io.StringIO(result.new_text), Loader=FAST_LOADER)
+            st = result.path.stat()
+            if (st.st_mtime_ns, st.st_size) != signatures[result.path]:
+                raise RuntimeError(f"{result.path} wurde seit dem Lesen geaendert")
+            fd, tmp = tempfile.mkstemp(dir=result.path.parent, suffix=".tmp")
+            pending.append((tmp, result.path))
+            with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+                f.write(result.new_text)
+            os.chmod(tmp, st.st_mode & 0o777)
+    except BaseException:
+        for tmp, _ in pending:
+            Path(tmp).unlink(missing_ok=True)
+        raise
+    for tmp, path in pending:
+        os.replace(tmp, path)
+    return [path for _, path in pending]
+
+
+def print_summary(results: list[FileResult], mapping: Mapping, scanned: int):
+    counts = {}
+    for result in results:
+        for edit in set(result.edits):
+            counts[edit.old] = counts.get(edit.old, 0) + 1
+    changed = sum(1 for r in results if r.new_text != r.text)
+    print(f"\n  {scanned} Datei(en) gelesen, {changed} betroffen, "
+          f"{sum(counts.values())} Ersetzung(en)")
+    for old, new in list(mapping.entities.items()) + list(mapping.automations.items()):
+        print(f"    {counts.get(old, 0):5d}  {old} -> {new}")
+    unresolved = [(r.path.name, line, msg) for r in results for line, msg in r.unresolved]
+    if unresolved:
+        print(f"\n  Von Hand ({len(unresolved)}):")
+        for fname, line, msg in unresolved:
+            print(f"    {fname}:{line}  {msg}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entity-IDs/Automation-IDs in allen Packages umbenennen")
+    parser.add_argument("mapping", help="Mapping-Datei (YAML oder CSV alt,neu)")
+    parser.add_argument("files", nargs="*", help="Nur diese YAML-Dateien (Default: alle Packages)")
+    parser.add_argument("--packages-dir", "-d", default=str(DEFAULT_PACKAGES_DIR),
+                        help="Packages-Verzeichnis (Default: packages/)")
+    parser.add_argument("--apply", action="store_true",
+                        help="Aenderungen schreiben (ohne: nur Diff)")
+    args = parser.parse_args()
+
+    try:
+        mapping = Mapping.from_file(Path(args.mapping))
+    except (OSError, ValueError, yaml.YAMLError, csv.Error) as e:
+        print(f"Mapping nicht lesbar: {e}")
+        return 1
+    errors = mapping.validate()
+    if errors:
+        for msg in errors:
+            print(f"  FEHLER  {msg}")
+        return 1
+
+    files = collect_files(args.files, args.packages_dir)
+    if not files:
+        print("Keine YAML-Dateien gefunden.")
+        return 0
+    results, errors, signatures = plan(files, mapping)
+    print_diff(results, Path(args.packages_dir))
+    print_summary(results, mapping, len(files))
+    if errors:
+        print()
+        for msg in errors:
+            print(f"  FEHLER  {msg}")
+        return 1
+    if not args.apply:
+        if any(r.new_text != r.text for r in results):
+            print(f"\n  Nur Diff -- mit --apply schreiben.")
+        return 0
+    try:
+        written = apply(results, signatures)
+    except (OSError, RuntimeError, yaml.YAMLError) as e:
+        print(f"\n  FEHLER  Nichts geschrieben: {e}")
+        return 1
+    print(f"\n  {len(written)} Datei(en) geschrieben.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
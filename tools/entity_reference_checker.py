@@ -5,15 +5,41 @@ Extrahiert alle Entity-Referenzen aus YAML-Packages und prueft auf:
   1. Umlaut-Fehler (praesenz statt prasenz, etc.)
   2. Doppelte Automation-IDs
   3. Uebersicht aller referenzierten Entities nach Domain
+
+Jinja-Templates werden mit template_analyzer.py zerlegt (states.x.y,
+expand(), is_state_attr() ...); Referenzen aus Variablen werden als
+dynamisch aufgelistet.
+
+Ungecachte Dateien werden per Event-Stream gelesen (stream_extract), ohne
+den dict/list-Baum aufzubauen; --tree laedt sie stattdessen komplett.
+
+Liegt ein Registry-Snapshot vor (.cache/entity_registry.json, siehe
+entity_registry.py), werden unbekannte Entities mit Vorschlaegen gemeldet.
+
+Mit --resolve werden !include-Dateien mitgelesen (siehe include_graph.py).
+
+Abfrage-Modus (aus dem persistenten Index, siehe entity_index.py):
+  --who-uses light.gartenbeleuchtung   Alle Fundstellen einer Entity
+  --prefix sensor.pv_                  Alle Entities mit diesem Praefix
 """
 
+import io
 import sys
-import os
 import re
 import yaml
 import argparse
-from pathlib import Path
 from collections import defaultdict
+from pathlib import Path
+
+from entity_index import EntityIndex
+from entity_registry import EntityRegistry, defined_entity_ids, load_registry
+from naming_rules import DEFAULT_RULES, NamingRules, load_rules
+from profiling import Timings, add_profiling_arguments
+from template_analyzer import analyze_template
+from include_graph import add_resolve_arguments, open_resolver
+from ha_yaml import (FAST_LOADER, HA_TAGS, PackageDocument, add_loader_arguments,
+                     collect_files, lookup_document, open_cache,
+                     save_documents, DEFAULT_PACKAGES_DIR)
 
 # Windows-Encoding fix: UTF-8 erzwingen
 if sys.stdout.encoding != "utf-8":
@@ -21,68 +47,12 @@ if sys.stdout.encoding != "utf-8":
 if sys.stderr.encoding != "utf-8":
     sys.stderr.reconfigure(encoding="utf-8")
 
-# HA YAML Loader (gleich wie in yaml_validator.py)
-class HAYamlLoader(yaml.SafeLoader):
-    pass
-
-def _ha_tag_constructor(loader, tag_suffix, node):
-    if isinstance(node, yaml.ScalarNode):
-        return f"!{tag_suffix} {loader.construct_scalar(node)}"
-    if isinstance(node, yaml.SequenceNode):
-        return loader.construct_sequence(node)
-    if isinstance(node, yaml.MappingNode):
-        return loader.construct_mapping(node)
-    return None
-
-for tag in ("include", "include_dir_list", "include_dir_named",
-            "include_dir_merge_list", "include_dir_merge_named",
-            "secret", "input", "env_var"):
-    HAYamlLoader.add_constructor(
-        f"!{tag}",
-        lambda loader, node, t=tag: _ha_tag_constructor(loader, t, node),
-    )
-
-
 # ---------------------------------------------------------------------------
-# Umlaut-Pruefregeln
+# Umlaut- und Namensregeln (kompiliert, siehe naming_rules.py)
 # ---------------------------------------------------------------------------
-UMLAUT_MISTAKES = [
-    ("ae", "a", "ae->a", ["praesenz", "waerme", "kaelte", "laenge", "naehe"]),
-    ("oe", "o", "oe->o", ["oeffn", "hoehe", "groesse"]),
-    ("ue", "u", "ue->u", ["kuech", "tuere", "lueft", "gruess", "schluessel"]),
-]
-
-# Woerter wo ae/oe/ue natuerlich vorkommt (kein Umlaut-Fehler)
-UMLAUT_FALSE_POSITIVES = {
-    "ae": ["aero", "israel"],
-    "oe": ["does", "poet", "goes"],
-    "ue": ["feuer", "steuer", "neuer", "teuer", "quer", "queue", "blue", "true",
-           "muell", "blaue", "graue", "value", "aktuelle"],
-}
-
-
 def check_umlaut_errors(entity_id: str) -> list[str]:
     """Prueft ob eine Entity-ID falsche Umlaut-Ersetzungen enthaelt."""
-    warnings = []
-    lower = entity_id.lower()
-    for wrong, correct, rule, examples in UMLAUT_MISTAKES:
-        if wrong in lower:
-            # False-Positive-Check: ist der Treffer Teil eines normalen Worts?
-            is_fp = False
-            for fp_word in UMLAUT_FALSE_POSITIVES.get(wrong, []):
-                if fp_word in lower:
-                    is_fp = True
-                    break
-            if is_fp:
-                continue
-
-            idx = lower.find(wrong)
-            context = lower[max(0, idx-3):idx+len(wrong)+3]
-            warnings.append(
-                f"Umlaut-Verdacht ({rule}): '{entity_id}' enthaelt '{wrong}' "
-                f"(Kontext: ...{context}...) -- sollte '{correct}' sein?"
-            )
-    return warnings
+    return DEFAULT_RULES.check(entity_id)[0]
 
 
 # ---------------------------------------------------------------------------
@@ -140,23 +110,42 @@ def is_service_call(entity_like: str) -> bool:
     return object_id in SERVICE_ACTIONS
 
 
+def _string_entities(text: str) -> list[tuple[str, int]]:
+    """Alle Entity-IDs in einem String als (entity_id, offset)."""
+    # Vorfilter: jede Entity-ID enthaelt einen Punkt
+    if "." not in text:
+        return []
+    hits = []
+    # Direkte entity_id Werte
+    if not text.startswith("!"):
+        for m in ENTITY_PATTERN.finditer(text):
+            entity = m.group(1)
+            domain = entity.split(".")[0]
+            if domain in VALID_DOMAINS and not is_service_call(entity):
+                hits.append((entity, m.start(1)))
+    # Jinja-Templates: states.x.y, expand(), is_state_attr() ... (siehe template_analyzer.py)
+    if "{" in text:
+        for entity, offset in analyze_template(text).entities:
+            domain = entity.split(".")[0]
+            if domain in VALID_DOMAINS and not is_service_call(entity):
+                hits.append((entity, offset))
+        # Literale in Templates findet auch ENTITY_PATTERN -- nur einmal zaehlen
+        hits = list(dict.fromkeys(hits))
+    return hits
+
+
+def _string_dynamic(text: str) -> tuple:
+    """Dynamische Template-Referenzen eines Strings (Ausdruecke)."""
+    if "{" not in text or text.startswith("!"):
+        return ()
+    return analyze_template(text).dynamic
+
+
 def extract_entity_ids(obj, found: set, path: str = ""):
     """Rekursiv alle Entity-IDs aus einem YAML-Objekt extrahieren."""
     if isinstance(obj, str):
-        # Direkte entity_id Werte
-        if "." in obj and not obj.startswith("!"):
-            matches = ENTITY_PATTERN.findall(obj)
-            for m in matches:
-                domain = m.split(".")[0]
-                if domain in VALID_DOMAINS and not is_service_call(m):
-                    found.add(m)
-        # Jinja2 Templates: states('sensor.xyz'), is_state('sensor.xyz', ...)
-        for tmpl_match in re.finditer(r"(?:states|is_state|state_attr)\s*\(\s*['\"]([^'\"]+)['\"]", obj):
-            entity = tmpl_match.group(1)
-            if "." in entity:
-                domain = entity.split(".")[0]
-                if domain in VALID_DOMAINS and not is_service_call(entity):
-                    found.add(entity)
+        for entity, _ in _string_entities(obj):
+            found.add(entity)
 
     elif isinstance(obj, list):
         for item in obj:
@@ -170,6 +159,22 @@ def extract_entity_ids(obj, found: set, path: str = ""):
             extract_entity_ids(value, found, f"{path}.{key}")
 
 
+def extract_dynamic_refs(obj, found: set):
+    """Rekursiv alle dynamischen Template-Referenzen sammeln (wie extract_entity_ids)."""
+    if isinstance(obj, str):
+        found.update(_string_dynamic(obj))
+
+    elif isinstance(obj, list):
+        for item in obj:
+            extract_dynamic_refs(item, found)
+
+    elif isinstance(obj, dict):
+        for key, value in obj.items():
+            if key == "action" and isinstance(value, str):
+                continue
+            extract_dynamic_refs(value, found)
+
+
 def extract_automation_ids(content) -> list[tuple[str, str]]:
     """Extrahiert alle Automation-IDs und Aliase."""
     ids = []
@@ -193,78 +198,465 @@ def extract_automation_ids(content) -> list[tuple[str, str]]:
 
 
 # ---------------------------------------------------------------------------
-# Main
+# Streaming-Extraktion direkt aus dem Event-Stream (ohne Objekt-Baum)
 # ---------------------------------------------------------------------------
-def main():
-    parser = argparse.ArgumentParser(description="HA Entity Reference Checker")
-    parser.add_argument("files", nargs="*", help="YAML-Dateien zum Pruefen")
-    parser.add_argument("--packages-dir", "-d",
-                        help="Packages-Verzeichnis (prueft alle .yaml darin)")
-    args = parser.parse_args()
+STR_TAG = "tag:yaml.org,2002:str"
+HA_TAG_NAMES = {f"!{t}": t for t in HA_TAGS}
+_RESOLVER = yaml.resolver.Resolver()
+_CONSTRUCTOR = yaml.constructor.SafeConstructor()
+MERGE_TAG = "tag:yaml.org,2002:merge"
+KNOWN_TAGS = set(yaml.constructor.SafeConstructor.yaml_constructors) | set(HA_TAG_NAMES)
+
+
+class _Frame:
+    """Offene Sequenz/Mapping im Event-Stream."""
+    __slots__ = ("is_map", "hits", "key", "expect_key", "skip_str",
+                 "anchor", "role", "fields")
+
+    def __init__(self, is_map: bool, anchor, role):
+        self.is_map = is_map
+        # Sequenz: Liste der Treffer; Mapping: Key -> Treffer (letzter Key gewinnt)
+        self.hits = {} if is_map else []
+        self.key = None
+        self.expect_key = True
+        self.skip_str = False
+        self.anchor = anchor
+        self.role = role
+        self.fields = {}
+
+
+# Platzhalter-Wert fuer Listen/Dicts im Anchor-Verzeichnis
+COLLECTION = object()
+
+
+def _unhashable_key(event):
+    """Listen/Dicts als Mapping-Key scheitern auch beim Konstruieren."""
+    raise yaml.constructor.ConstructorError(
+        "while constructing a mapping", None, "found unhashable key", event.start_mark)
+
+
+def _check_tag(event):
+    """Unbekannte Tags scheitern beim HA-Loader -- hier ebenso."""
+    tag = event.tag
+    if tag is not None and tag != "!" and tag not in KNOWN_TAGS:
+        raise yaml.constructor.ConstructorError(
+            None, None, f"could not determine a constructor for the tag {tag!r}",
+            event.start_mark)
+
+
+def _scalar_tag(event) -> str:
+    tag = event.tag
+    if tag is None or tag == "!":
+        return _RESOLVER.resolve(yaml.ScalarNode, event.value, event.implicit)
+    return tag
+
+
+def _scalar_value(tag: str, value: str):
+    """Konstruierter Wert eines Scalars (fuer Automation-ID/Alias)."""
+    if tag in HA_TAG_NAMES:
+        return f"!{HA_TAG_NAMES[tag]} {value}"
+    ctor = _CONSTRUCTOR.yaml_constructors.get(tag)
+    return ctor(_CONSTRUCTOR, yaml.ScalarNode(tag, value)) if ctor else value
+
+
+def stream_extract(stream, dynamic: set | None = None) -> tuple[list[tuple[str, int]], list[tuple]]:
+    """Entity-IDs (mit Zeile) und Automation-IDs aus dem YAML-Event-Stream.
+
+    Liefert dieselben Ergebnisse wie extract_entity_ids() und
+    extract_automation_ids(), baut aber keinen dict/list-Baum auf. Ist
+    dynamic gesetzt, landen dort die Ausdruecke aus extract_dynamic_refs(). Verfolgt
+    wird nur der aktuelle Key (fuer den 'action:'-Ausschluss) und die
+    Position unterhalb von 'automation:'. Scalars ohne '.' werden ohne
+    Regex und ohne Tag-Aufloesung verworfen.
+    """
+    stack = []
+    anchors = {}        # anchor -> (treffer, ist_string, wert), wert COLLECTION bei Listen/Dicts
+    result = []
+    auto_ids = []
+    documents = 0
+
+    def deliver(hits, is_str, value, anchor):
+        nonlocal result
+        if anchor is not None:
+            anchors[anchor] = (hits, is_str, value)
+        if not stack:
+            result = hits
+            return
+        parent = stack[-1]
+        if not parent.is_map:
+            parent.hits.extend(hits)
+            return
+        if parent.expect_key:
+            # Key: Treffer in Keys zaehlen nicht; Key-Identitaet wie beim Konstruieren
+            parent.key = value
+            parent.skip_str = value == (STR_TAG, "action")
+            parent.expect_key = False
+            return
+        if parent.skip_str and is_str:
+            hits = []
+        key = parent.key
+        if isinstance(key, tuple) and key[0] == MERGE_TAG:
+            key = object()
+        parent.hits[key] = hits
+        if parent.role == "auto" and isinstance(parent.key, tuple) and parent.key[0] == STR_TAG:
+            parent.fields[parent.key[1]] = None if value is COLLECTION else value
+        parent.expect_key = True
+
+    for event in yaml.parse(stream, Loader=FAST_LOADER):
+        if isinstance(event, yaml.ScalarEvent):
+            _check_tag(event)
+            parent = stack[-1] if stack else None
+            as_key = parent is not None and parent.is_map and parent.expect_key
+            need_value = as_key or (parent is not None and parent.role == "auto"
+                                    and not parent.expect_key)
+            text = event.value
+            if not as_key and "." in text or need_value or event.anchor is not None:
+                tag = _scalar_tag(event)
+            else:
+                tag = None
+            hits = []
+            is_str = tag == STR_TAG or tag in HA_TAG_NAMES
+            if is_str and not as_key and "." in text:
+                if tag != STR_TAG:
+                    text = f"!{HA_TAG_NAMES[tag]} {text}"
+                line = event.start_mark.line + 1
+                for entity, offset in _string_entities(text):
+                    entity_line = line
+                    if event.style == "|":
+                        entity_line += 1 + text.count("\n", 0, offset)
+                    hits.append((entity, entity_line))
+                if dynamic is not None and not (parent is not None and parent.is_map
+                                                and parent.skip_str):
+                    dynamic.update(_string_dynamic(text))
+            if tag is None:
+                # Ohne '.' kann kein Treffer entstehen -- Typ ist egal
+                value = None
+            elif as_key:
+                value = (tag, text)
+            elif need_value or event.anchor is not None:
+                value = _scalar_value(tag, event.value)
+            else:
+                value = None
+            deliver(hits, is_str, value, event.anchor)
+
+        elif isinstance(event, (yaml.MappingStartEvent, yaml.SequenceStartEvent)):
+            _check_tag(event)
+            parent = stack[-1] if stack else None
+            is_map = isinstance(event, yaml.MappingStartEvent)
+            if parent is not None and parent.is_map and parent.expect_key:
+                _unhashable_key(event)
+            role = None
+            if parent is None:
+                role = "root" if is_map else "autolist"
+            elif parent.role == "root" and not parent.expect_key \
+                    and parent.key == (STR_TAG, "automation") and not is_map:
+                role = "autolist"
+            elif parent.role == "autolist" and is_map:
+                role = "auto"
+            stack.append(_Frame(is_map, event.anchor, role))
+
+        elif isinstance(event, (yaml.MappingEndEvent, yaml.SequenceEndEvent)):
+            frame = stack.pop()
+            if frame.is_map:
+                hits = [hit for key_hits in frame.hits.values() for hit in key_hits]
+            else:
+                hits = frame.hits
+            if frame.role == "auto":
+                aid = frame.fields.get("id", "")
+                if aid:
+                    auto_ids.append((aid, frame.fields.get("alias", "(kein alias)")))
+            deliver(hits, False, COLLECTION, frame.anchor)
+
+        elif isinstance(event, yaml.AliasEvent):
+            if event.anchor not in anchors:
+                raise yaml.composer.ComposerError(
+                    None, None, f"found undefined alias {event.anchor!r}", event.start_mark)
+            hits, is_str, value = anchors[event.anchor]
+            parent = stack[-1] if stack else None
+            if parent is not None and parent.is_map and parent.expect_key:
+                if value is COLLECTION:
+                    _unhashable_key(event)
+                value = (STR_TAG if is_str else None, value)
+            deliver(list(hits), is_str, value, None)
+
+        elif isinstance(event, yaml.DocumentStartEvent):
+            documents += 1
+            if documents > 1:
+                raise yaml.composer.ComposerError(
+                    "expected a single document in the stream", None,
+                    "but found another document", event.start_mark)
+
+    return result, auto_ids
+
+
+def stream_file(filepath: Path, data: bytes | None = None,
+                dynamic: set | None = None) -> tuple[list[tuple[str, int]], list[tuple]]:
+    """stream_extract() fuer eine Datei (Fehler wie beim normalen Laden)."""
+    if data is None:
+        data = filepath.read_bytes()
+    stream = io.StringIO(data.decode("utf-8"))
+    stream.name = str(filepath)
+    return stream_extract(stream, dynamic)
 
-    # Dateien sammeln
-    files = []
-    if args.files:
-        files = [Path(f) for f in args.files]
-    elif args.packages_dir:
-        pkg_dir = Path(args.packages_dir)
-        if pkg_dir.is_dir():
-            files = sorted(pkg_dir.glob("**/*.yaml"))
-    else:
-        project_dir = Path(__file__).resolve().parent.parent
-        pkg_dir = project_dir / "packages"
-        if pkg_dir.is_dir():
-            files = sorted(pkg_dir.glob("**/*.yaml"))
 
-    if not files:
-        print("Keine YAML-Dateien gefunden.")
-        return 0
+# ---------------------------------------------------------------------------
+# Fundstellen mit Zeilennummern (fuer den Entity-Index)
+# ---------------------------------------------------------------------------
+def _node_string(node) -> str | None:
+    """String-Wert eines Scalar-Nodes wie ihn der HA-Loader konstruiert."""
+    if not isinstance(node, yaml.ScalarNode):
+        return None
+    if node.tag == STR_TAG:
+        return node.value
+    if node.tag in HA_TAG_NAMES:
+        return f"!{HA_TAG_NAMES[node.tag]} {node.value}"
+    return None
+
+
+def _mapping_items(node):
+    """Key/Value-Paare; doppelte Keys wie beim Konstruieren: letzter gewinnt."""
+    items = {}
+    for key_node, value_node in node.value:
+        key = key_node.value if isinstance(key_node, yaml.ScalarNode) else id(key_node)
+        items[key] = value_node
+    return items.items()
 
-    all_entities = set()
-    all_auto_ids = []
-    entities_by_file = {}
-    umlaut_warnings = []
-    errors = []
 
+def _owner_of(node, fallback: str) -> str:
+    """Automation-ID bzw. Alias eines Automation-Nodes."""
+    if isinstance(node, yaml.MappingNode):
+        items = dict(_mapping_items(node))
+        for field in ("id", "alias"):
+            value = _node_string(items.get(field)) if field in items else None
+            if value:
+                return value
+    return fallback
+
+
+def locate_entity_ids(node, out: list, owner: str = "", path: str = ""):
+    """Wie extract_entity_ids(), aber auf dem Node-Baum mit Zeilennummern.
+
+    Haengt (entity_id, zeile, owner, yaml_pfad) an out an.
+    """
+    if isinstance(node, yaml.ScalarNode):
+        text = _node_string(node)
+        if text is None:
+            return
+        hits = _string_entities(text)
+        if not hits:
+            return
+        line = node.start_mark.line + 1
+        for entity, offset in hits:
+            entity_line = line
+            if node.style == "|":
+                # Block-Literal: Inhalt beginnt eine Zeile nach dem Indikator
+                entity_line += 1 + text.count("\n", 0, offset)
+            out.append((entity, entity_line, owner, path))
+
+    elif isinstance(node, yaml.SequenceNode):
+        for i, item in enumerate(node.value):
+            locate_entity_ids(item, out, owner, f"{path}[{i}]")
+
+    elif isinstance(node, yaml.MappingNode):
+        for key, value in _mapping_items(node):
+            # Skip: 'action:' Keys enthalten Service-Calls, keine Entity-IDs
+            if key == "action" and _node_string(value) is not None:
+                continue
+            child = f"{path}.{key}" if path else str(key)
+            locate_entity_ids(value, out, owner, child)
+
+
+def locate_document(root) -> list[tuple[str, int, str, str]]:
+    """Fundstellen eines ganzen Package-Dokuments inkl. Automation/Script."""
+    out = []
+    if isinstance(root, yaml.SequenceNode):
+        # Flache automations.yaml
+        for i, item in enumerate(root.value):
+            locate_entity_ids(item, out, _owner_of(item, f"automation[{i}]"), f"[{i}]")
+    elif isinstance(root, yaml.MappingNode):
+        for key, value in _mapping_items(root):
+            if key == "automation" and isinstance(value, yaml.SequenceNode):
+                for i, item in enumerate(value.value):
+                    locate_entity_ids(item, out, _owner_of(item, f"automation[{i}]"),
+                                      f"automation[{i}]")
+            elif key == "script" and isinstance(value, yaml.MappingNode):
+                for name, script in _mapping_items(value):
+                    locate_entity_ids(script, out, f"script.{name}", f"script.{name}")
+            else:
+                locate_entity_ids(value, out, "", str(key))
+    return out
+
+
+def locate_file(filepath: Path) -> list[tuple[str, int, str, str]]:
+    """Fundstellen einer Datei; nicht ladbare Dateien liefern []."""
+    try:
+        stream = io.StringIO(filepath.read_text(encoding="utf-8"))
+        stream.name = str(filepath)
+        root = yaml.compose(stream, Loader=FAST_LOADER)
+    except (OSError, UnicodeDecodeError, yaml.YAMLError):
+        return []
+    if root is None:
+        return []
+    return locate_document(root)
+
+
+# ---------------------------------------------------------------------------
+# Passes ueber das gemeinsame Dokument-Modell
+# ---------------------------------------------------------------------------
+class ReferenceReport:
+    """Gesammelte Ergebnisse der Entity-Passes."""
+
+    def __init__(self):
+        self.all_entities = set()
+        self.all_auto_ids = []
+        self.entities_by_file = {}
+        # Invertiert: entity_id -> Dateinamen (in Lade-Reihenfolge)
+        self.files_by_entity = defaultdict(list)
+        self.umlaut_warnings = []
+        self.naming_warnings = []
+        self.duplicate_ids = {}
+        # (entity_id, [dateien], [vorschlaege]) -- nur mit Registry-Snapshot
+        self.unknown_entities = []
+        # Datei -> Template-Ausdruecke, deren Entity erst zur Laufzeit feststeht
+        self.dynamic_refs = {}
+
+
+def extraction_pass(documents: list[PackageDocument], report: ReferenceReport):
+    """Extrahiert Entity- und Automation-IDs aus allen geladenen Dateien."""
+    for doc in documents:
+        if not doc.ok or doc.content is None:
+            continue
+
+        # Entity-IDs extrahieren (aus dem Cache, falls vorhanden)
+        file_entities = set(doc.memo("entity_ids", lambda: _sorted_entity_ids(doc.content)))
+        if doc.name not in report.entities_by_file:
+            for entity in file_entities:
+                report.files_by_entity[entity].append(doc.name)
+        report.entities_by_file[doc.name] = file_entities
+        report.all_entities.update(file_entities)
+        dynamic = doc.memo("dynamic_refs", lambda: _sorted_dynamic_refs(doc.content))
+        if dynamic:
+            report.dynamic_refs[doc.name] = dynamic
+
+        # Automation-IDs sammeln
+        for aid, alias in doc.memo("named_automation_ids",
+                                   lambda: extract_automation_ids(doc.content)):
+            report.all_auto_ids.append((doc.name, aid, alias))
+
+
+def stream_pass(files: list[Path], report: ReferenceReport, cache=None) -> list[PackageDocument]:
+    """Wie extraction_pass(), aber fuer ungecachte Dateien per stream_extract().
+
+    Gecachte Dateien liefern ihre Entity-/Automation-IDs aus dem Cache.
+    Alle anderen werden nur als Event-Stream gelesen -- ohne Objekt-Baum --
+    und bekommen einen Cache-Eintrag nur mit den abgeleiteten Daten
+    ("partial"), damit der naechste Lauf sie nicht erneut liest.
+    Gibt die gecachten Dokumente zurueck (fuer save_documents()).
+    """
+    cached_docs = []
     for filepath in files:
-        if not filepath.exists():
+        doc, pending = lookup_document(filepath, cache, partial=True)
+        if doc is not None:
+            if not doc.ok:
+                continue
+            if doc.content is None and STREAM_MEMOS <= doc.derived.keys():
+                _add_extracted(report, doc.name, doc.derived["entity_ids"],
+                               doc.derived["dynamic_refs"], doc.derived["named_automation_ids"])
+            else:
+                cached_docs.append(doc)
+                extraction_pass([doc], report)
             continue
+        dynamic = set()
         try:
-            with open(filepath, "r", encoding="utf-8") as f:
-                content = yaml.load(f, Loader=HAYamlLoader)
-        except (yaml.YAMLError, UnicodeDecodeError):
+            hits, auto_ids = stream_file(filepath, pending[1], dynamic)
+        except (UnicodeDecodeError, yaml.YAMLError):
             continue
+        derived = {"entity_ids": sorted({entity for entity, _ in hits}),
+                   "dynamic_refs": sorted(dynamic),
+                   "named_automation_ids": [tuple(pair) for pair in auto_ids]}
+        _add_extracted(report, filepath.name, derived["entity_ids"], derived["dynamic_refs"],
+                       derived["named_automation_ids"])
+        if cache is not None and pending[0] is not None:
+            cache.put(pending[0], {"content": None, "derived": derived, "partial": True})
+    return cached_docs
 
-        if content is None:
-            continue
 
-        # Entity-IDs extrahieren
-        file_entities = set()
-        extract_entity_ids(content, file_entities)
-        entities_by_file[filepath.name] = file_entities
-        all_entities.update(file_entities)
+# Abgeleitete Daten, die ein Stream-Eintrag im Cache mitbringt
+STREAM_MEMOS = {"entity_ids", "dynamic_refs", "named_automation_ids"}
 
-        # Automation-IDs sammeln
-        auto_ids = extract_automation_ids(content)
-        for aid, alias in auto_ids:
-            all_auto_ids.append((filepath.name, aid, alias))
 
-        # Umlaut-Check auf alle gefundenen Entities
+def _add_extracted(report: ReferenceReport, fname: str, entities, dynamic, auto_ids):
+    file_entities = set(entities)
+    if dynamic:
+        report.dynamic_refs[fname] = list(dynamic)
+    if fname not in report.entities_by_file:
         for entity in file_entities:
-            warnings = check_umlaut_errors(entity)
-            for w in warnings:
-                umlaut_warnings.append((filepath.name, w))
+            report.files_by_entity[entity].append(fname)
+    report.entities_by_file[fname] = file_entities
+    report.all_entities.update(file_entities)
+    for aid, alias in auto_ids:
+        report.all_auto_ids.append((fname, aid, alias))
+
+
+def _sorted_entity_ids(content) -> list[str]:
+    found = set()
+    extract_entity_ids(content, found)
+    return sorted(found)
+
+
+def _sorted_dynamic_refs(content) -> list[str]:
+    found = set()
+    extract_dynamic_refs(content, found)
+    return sorted(found)
+
+
+def naming_pass(report: ReferenceReport, rules: NamingRules = DEFAULT_RULES,
+                fnames: list[str] | None = None):
+    """Umlaut- und Namensregeln auf alle gefundenen Entities (oder nur fnames)."""
+    for fname in (report.entities_by_file if fnames is None else fnames):
+        for entity in report.entities_by_file.get(fname, ()):
+            umlaut, naming = rules.check(entity)
+            for w in umlaut:
+                report.umlaut_warnings.append((fname, w))
+            for w in naming:
+                report.naming_warnings.append((fname, w))
+
+
+def registry_pass(documents: list[PackageDocument], report: ReferenceReport,
+                  registry: EntityRegistry):
+    """Gleicht Referenzen mit dem Registry-Snapshot ab.
+
+    In den Packages selbst definierte Entities (Helper, Scripts, KNX) gelten
+    als bekannt, auch wenn sie noch nicht deployt sind.
+    """
+    defined = set()
+    for doc in documents:
+        if doc.ok and doc.content is not None:
+            defined.update(doc.memo("defined_entities",
+                                    lambda: sorted(defined_entity_ids(doc.content))))
+    for entity in sorted(report.all_entities):
+        if entity in registry or entity in defined:
+            continue
+        report.unknown_entities.append(
+            (entity, report.files_by_entity[entity], registry.suggest(entity)))
 
-    # --- Doppelte Automation-IDs ---
+
+def duplicate_id_pass(report: ReferenceReport):
+    """Sucht doppelte Automation-IDs."""
     id_counts = defaultdict(list)
-    for fname, aid, alias in all_auto_ids:
+    for fname, aid, alias in report.all_auto_ids:
         id_counts[aid].append((fname, alias))
 
-    duplicate_ids = {aid: locs for aid, locs in id_counts.items() if len(locs) > 1}
+    report.duplicate_ids = {aid: locs for aid, locs in id_counts.items() if len(locs) > 1}
+
+
+def print_report(total: int, report: ReferenceReport) -> int:
+    """Gibt den Report aus und liefert den Exit-Code."""
+    errors = []
+    all_entities = report.all_entities
 
-    # --- Ausgabe ---
     print(f"\n{'='*60}")
-    print(f"  HA Entity Reference Checker -- {len(files)} Datei(en)")
+    print(f"  HA Entity Reference Checker -- {total} Datei(en)")
     print(f"{'='*60}")
 
     # Entities nach Domain gruppiert
@@ -279,34 +671,58 @@ def main():
         print(f"\n  [{domain}] ({len(entities)})")
         for e in entities:
             # Zeige in welchen Dateien
-            in_files = [fn for fn, ents in entities_by_file.items() if e in ents]
-            print(f"    {e}  ({', '.join(in_files)})")
+            print(f"    {e}  ({', '.join(report.files_by_entity[e])})")
 
     # Automation-IDs
-    print(f"\n  Automation-IDs: {len(all_auto_ids)}")
+    print(f"\n  Automation-IDs: {len(report.all_auto_ids)}")
+
+    # Dynamische Template-Referenzen (Info, nicht pruefbar)
+    if report.dynamic_refs:
+        count = sum(len(refs) for refs in report.dynamic_refs.values())
+        print(f"\n  Dynamische Template-Referenzen (erst zur Laufzeit bekannt): {count}")
+        for fname, refs in report.dynamic_refs.items():
+            for expr in refs:
+                print(f"    {fname}: {expr}")
 
     # Duplikate
-    if duplicate_ids:
-        errors.append(f"{len(duplicate_ids)} doppelte Automation-ID(s)")
+    if report.duplicate_ids:
+        errors.append(f"{len(report.duplicate_ids)} doppelte Automation-ID(s)")
         print(f"\n  FEHLER: Doppelte Automation-IDs:")
-        for aid, locs in duplicate_ids.items():
+        for aid, locs in report.duplicate_ids.items():
             print(f"    '{aid}' in:")
             for fname, alias in locs:
                 print(f"      - {fname}: {alias}")
 
     # Umlaut-Warnungen
+    umlaut_warnings = report.umlaut_warnings
     if umlaut_warnings:
         print(f"\n  WARNUNG: Moegliche Umlaut-Fehler ({len(umlaut_warnings)}):")
         for fname, warning in umlaut_warnings:
             print(f"    {fname}: {warning}")
 
+    # Namensregeln aus naming_rules.yaml
+    naming_warnings = report.naming_warnings
+    if naming_warnings:
+        print(f"\n  WARNUNG: Namenskonvention ({len(naming_warnings)}):")
+        for fname, warning in naming_warnings:
+            print(f"    {fname}: {warning}")
+
+    # Abgleich mit dem Registry-Snapshot
+    unknown = report.unknown_entities
+    if unknown:
+        print(f"\n  WARNUNG: Unbekannte Entities (nicht im Registry-Snapshot) ({len(unknown)}):")
+        for entity, files, suggestions in unknown:
+            hint = f" -- meintest du {' / '.join(suggestions)}?" if suggestions else ""
+            print(f"    {', '.join(files)}: {entity}{hint}")
+
     # Ergebnis
+    warning_count = len(umlaut_warnings) + len(naming_warnings) + len(unknown)
     if errors:
         print(f"\n  ERGEBNIS: {len(errors)} FEHLER gefunden")
         print(f"{'='*60}\n")
         return 1
-    elif umlaut_warnings:
-        print(f"\n  ERGEBNIS: BESTANDEN mit {len(umlaut_warnings)} Warnung(en)")
+    elif warning_count:
+        print(f"\n  ERGEBNIS: BESTANDEN mit {warning_count} Warnung(en)")
         print(f"{'='*60}\n")
         return 0
     else:
@@ -315,5 +731,113 @@ def main():
         return 0
 
 
+# ---------------------------------------------------------------------------
+# Abfrage-Modus
+# ---------------------------------------------------------------------------
+def _print_occurrences(entity: str, occurrences: list):
+    print(f"\n  {entity} ({len(occurrences)} Fundstelle(n))")
+    for occ in occurrences:
+        owner = occ.owner or "-"
+        print(f"    {occ.file}:{occ.line}  {owner}  {occ.path}")
+
+
+def run_query(files: list[Path], root: Path, who_uses: list[str], prefixes: list[str]) -> int:
+    """Beantwortet --who-uses/--prefix aus dem persistenten Index."""
+    index = EntityIndex.load(root)
+    if index.refresh(files, locate_file):
+        index.save()
+
+    found = 0
+    for entity in who_uses:
+        occurrences = index.who_uses(entity)
+        if occurrences:
+            found += 1
+            _print_occurrences(entity, occurrences)
+        else:
+            print(f"\n  {entity}: nicht referenziert")
+    for prefix in prefixes:
+        matches = index.with_prefix(prefix)
+        if not matches:
+            print(f"\n  Keine Entities mit Praefix '{prefix}'")
+        for entity, occurrences in matches.items():
+            found += 1
+            _print_occurrences(entity, occurrences)
+    print()
+    return 0 if found else 1
+
+
+# ---------------------------------------------------------------------------
+# Main
+# ---------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="HA Entity Reference Checker")
+    parser.add_argument("files", nargs="*", help="YAML-Dateien zum Pruefen")
+    parser.add_argument("--packages-dir", "-d",
+                        help="Packages-Verzeichnis (prueft alle .yaml darin)")
+    parser.add_argument("--who-uses", action="append", default=[], metavar="ENTITY",
+                        help="Fundstellen einer Entity aus dem Index anzeigen (mehrfach moeglich)")
+    parser.add_argument("--prefix", action="append", default=[],
+                        help="Fundstellen aller Entities mit diesem Praefix anzeigen")
+    parser.add_argument("--rules",
+                        help="Namensregeln (YAML, Default: naming_rules.yaml falls vorhanden)")
+    parser.add_argument("--tree", action="store_true",
+                        help="Dateien komplett laden statt Event-Stream (parallel, fuellt den Cache)")
+    parser.add_argument("--registry",
+                        help="Registry-Snapshot (Default: .cache/entity_registry.json falls vorhanden)")
+    parser.add_argument("--no-registry", action="store_true",
+                        help="Keinen Abgleich mit dem Registry-Snapshot")
+    add_loader_arguments(parser)
+    add_resolve_arguments(parser)
+    add_profiling_arguments(parser)
+    args = parser.parse_args()
+
+    files = collect_files(args.files, args.packages_dir)
+    if not files:
+        print("Keine YAML-Dateien gefunden.")
+        return 0
+
+    if args.who_uses or args.prefix:
+        root = Path(args.packages_dir) if args.packages_dir else DEFAULT_PACKAGES_DIR
+        return run_query(files, root, args.who_uses, args.prefix)
+
+    cache = open_cache(not args.no_cache)
+    registry = None if args.no_registry else load_registry(args.registry)
+    rules = load_rules(args.rules)
+    report = ReferenceReport()
+    timings = Timings.from_args(args, "entity_reference_checker")
+    with timings.session():
+        # Registry-Abgleich und Includes brauchen komplette Dokumente
+        resolver = open_resolver(args, args.packages_dir or DEFAULT_PACKAGES_DIR, cache)
+        if args.tree or registry is not None or resolver is not None:
+            documents = timings.load(files, cache, args.jobs)
+            loaded = documents
+            if resolver is not None:
+                with timings.phase("Includes"):
+                    documents = resolver.resolve(documents)
+                loaded = resolver.all_documents()
+            timings.each("Entity-Extraktion", documents,
+                         lambda docs: extraction_pass(docs, report))
+        else:
+            documents = [doc for docs in timings.each(
+                "Extraktion (Stream)", files,
+                lambda paths: stream_pass(paths, report, cache), key=str) for doc in docs]
+            loaded = documents
+        # Report-Eintraege sind nach Dateiname gefuehrt -> fuer die Messung auf den Pfad
+        paths = {filepath.name: str(filepath) for filepath in files}
+        timings.each("Namensregeln", list(report.entities_by_file),
+                     lambda fnames: naming_pass(report, rules, fnames),
+                     key=lambda fname: paths.get(fname, fname))
+        with timings.phase("Doppelte IDs"):
+            duplicate_id_pass(report)
+        if registry is not None:
+            with timings.phase("Registry-Abgleich"):
+                registry_pass(documents, report, registry)
+        with timings.phase("Cache schreiben"):
+            save_documents(loaded, cache)
+        with timings.phase("Ausgabe"):
+            returncode = print_report(len(files), report)
+    return returncode
+
+
 if __name__ == "__main__":
     sys.exit(main())
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""Offline-Abgleich referenzierter Entities mit einem Registry-Snapshot.
+
+Der Snapshot ist eine lokale Kopie von /config/.storage/core.entity_registry
+(oder eine States-Liste aus /api/states) in .cache/entity_registry.json.
+Geholt wird er mit `bash ha registry` -- nur wenn er aelter als
+--max-age Stunden ist.
+
+Geladen wird er in:
+  - ein Set aller Entity-IDs (Existenz-Pruefung in O(1))
+  - einen Trigramm-Index pro Domain (object_id -> Trigramme)
+
+Fuer eine unbekannte ID werden ueber die Trigramm-Postings nur Kandidaten
+mit gemeinsamen Trigrammen gezaehlt; die besten davon werden mit difflib
+bewertet ("Meintest du ...?"). Ein linearer Edit-Distanz-Scan ueber alle
+Entities entfaellt.
+
+Nutzung:
+  python tools/entity_registry.py stale [--max-age 24]   # Exit 0 = neu holen
+  python tools/entity_registry.py check light.kueche_deke
+  python tools/entity_registry.py stats
+"""
+
+import re
+import sys
+import json
+import time
+import argparse
+import unicodedata
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from pathlib import Path
+
+from ha_yaml import PROJECT_DIR
+
+# Windows-Encoding fix: UTF-8 erzwingen
+if sys.stdout.encoding != "utf-8":
+    sys.stdout.reconfigure(encoding="utf-8")
+
+DEFAULT_REGISTRY_PATH = PROJECT_DIR / ".cache" / "entity_registry.json"
+DEFAULT_MAX_AGE_HOURS = 24
+CANDIDATES = 20
+MIN_SIMILARITY = 0.75
+
+# Top-Level-Keys, deren Unter-Keys direkt Entities definieren (domain.key)
+KEYED_DOMAINS = {
+    "input_boolean", "input_button", "input_datetime", "input_number",
+    "input_select", "input_text", "counter", "timer", "script", "group",
+    "scene", "zone",
+}
+# KNX-Plattformen in packages/knx/ (Entity-ID aus dem Namen)
+KNX_PLATFORMS = {
+    "binary_sensor", "button", "climate", "cover", "fan", "light", "number",
+    "scene", "select", "sensor", "switch", "text", "weather",
+}
+
+
+def trigrams(text: str) -> set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def slugify(name: str) -> str:
+    """Wie HA aus einem Namen die object_id bildet (vereinfacht)."""
+    text = name.replace("ß", "ss")
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]+", "_", text.lower()).strip("_")
+
+
+def defined_entity_ids(content) -> set[str]:
+    """Entities, die ein Package selbst anlegt (Helper, Scripts, KNX)."""
+    defined = set()
+    if not isinstance(content, dict):
+        return defined
+    for domain, value in content.items():
+        if domain in KEYED_DOMAINS and isinstance(value, dict):
+            defined.update(f"{domain}.{key}" for key in value)
+    knx = content.get("knx")
+    if isinstance(knx, dict):
+        for platform, items in knx.items():
+            if platform in KNX_PLATFORMS and isinstance(items, list):
+                for item in items:
+                    if isinstance(item, dict) and isinstance(item.get("name"), str):
+                        defined.add(f"{platform}.{slugify(item['name'])}")
+    return defined
+
+
+class EntityRegistry:
+    """Set + Trigramm-Index ueber alle bekannten Entity-IDs."""
+
+    def __init__(self, entity_ids):
+        self.ids = set(entity_ids)
+        self._objects = defaultdict(list)          # domain -> [object_id, ...]
+        self._sizes = defaultdict(list)            # domain -> [anzahl trigramme, ...]
+        self._postings = defaultdict(lambda: defaultdict(list))  # domain -> tri -> [idx]
+        self._by_object_id = defaultdict(list)     # object_id -> [entity_id, ...]
+        for entity in sorted(self.ids):
+            domain, _, object_id = entity.partition(".")
+            idx = len(self._objects[domain])
+            self._objects[domain].append(object_id)
+            grams = trigrams(object_id)
+            self._sizes[domain].append(len(grams))
+            for tri in grams:
+                self._postings[domain][tri].append(idx)
+            self._by_object_id[object_id].append(entity)
+
+    @classmethod
+    def from_file(cls, path: Path) -> "EntityRegistry":
+        """Liest core.entity_registry, eine States-Liste oder eine ID-Liste."""
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            data = (data.get("data") or data).get("entities", [])
+        ids = []
+        for item in data:
+            entity = item.get("entity_id") if isinstance(item, dict) else item
+            if isinstance(entity, str) and "." in entity:
+                ids.append(entity)
+        return cls(ids)
+
+    def __contains__(self, entity_id: str) -> bool:
+        return entity_id in self.ids
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, entity_ids):
+        """Zusaetzlich bekannte IDs (z.B. lokal definiert, noch nicht deployt)."""
+        self.ids.update(entity_ids)
+
+    def suggest(self, entity_id: str, limit: int = 3) -> list[str]:
+        """Aehnlichste bekannte IDs derselben Domain, sonst gleiche object_id."""
+        domain, _, object_id = entity_id.partition(".")
+        objects = self._objects.get(domain, [])
+        sizes = self._sizes.get(domain, [])
+        postings = self._postings.get(domain, {})
+        query = trigrams(object_id)
+        shared = Counter()
+        for tri in query:
+            shared.update(postings.get(tri, ()))
+        # Dice-Koeffizient als Vorauswahl, difflib nur fuer die besten
+        ranked = sorted(shared.items(),
+                        key=lambda kv: -2 * kv[1] / (len(query) + sizes[kv[0]]))[:CANDIDATES]
+        scored = []
+        for idx, _ in ranked:
+            ratio = SequenceMatcher(None, object_id, objects[idx]).ratio()
+            if ratio >= MIN_SIMILARITY:
+                scored.append((ratio, f"{domain}.{objects[idx]}"))
+        suggestions = [e for _, e in sorted(scored, key=lambda se: (-se[0], se[1]))]
+        for other in self._by_object_id.get(object_id, ()):
+            if other not in suggestions:
+                suggestions.append(other)
+        return suggestions[:limit]
+
+
+def is_stale(path: Path = DEFAULT_REGISTRY_PATH,
+             max_age_hours: float = DEFAULT_MAX_AGE_HOURS) -> bool:
+    try:
+        age = time.time() - path.stat().st_mtime
+    except OSError:
+        return True
+    return age > max_age_hours * 3600
+
+
+def load_registry(path: str | None = None) -> EntityRegistry | None:
+    """Snapshot aus --registry, sonst .cache/entity_registry.json, sonst None."""
+    if path:
+        return EntityRegistry.from_file(Path(path))
+    if DEFAULT_REGISTRY_PATH.is_file():
+        return EntityRegistry.from_file(DEFAULT_REGISTRY_PATH)
+    return None
+
+
+# ---------------------------------------------------------------------------
+# Main
+# ---------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="HA Entity-Registry-Snapshot")
+    parser.add_argument("--registry", default=str(DEFAULT_REGISTRY_PATH),
+                        help="Snapshot (Default: .cache/entity_registry.json)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("stale", help="Exit 0 wenn der Snapshot fehlt oder veraltet ist")
+    p.add_argument("--max-age", type=float, default=DEFAULT_MAX_AGE_HOURS,
+                   help="Maximales Alter in Stunden (Default: 24)")
+    p = sub.add_parser("check", help="Entity-IDs nachschlagen")
+    p.add_argument("entity_ids", nargs="+")
+    p = sub.add_parser("stats", help="Groesse des Snapshots")
+    p.add_argument("--brief", action="store_true", help="Nur die Summenzeile")
+    args = parser.parse_args()
+
+    path = Path(args.registry)
+    if args.command == "stale":
+        return 0 if is_stale(path, args.max_age) else 1
+
+    if not path.is_file():
+        print(f"Kein Snapshot unter {path} -- erst 'bash ha registry' ausfuehren.")
+        return 1
+    registry = EntityRegistry.from_file(path)
+    if args.command == "stats":
+        age = (time.time() - path.stat().st_mtime) / 3600
+        domains = Counter(e.partition(".")[0] for e in registry.ids)
+        print(f"{len(registry)} Entities in {len(domains)} Domains, Snapshot {age:.1f} h alt.")
+        if args.brief:
+            return 0
+        for domain, count in domains.most_common():
+            print(f"  {domain:<20} {count:5d}")
+        return 0
+
+    missing = 0
+    for entity in args.entity_ids:
+        if entity in registry:
+            print(f"  OK         {entity}")
+            continue
+        missing += 1
+        suggestions = registry.suggest(entity)
+        hint = f" -- meintest du {' / '.join(suggestions)}?" if suggestions else ""
+        print(f"  UNBEKANNT  {entity}{hint}")
+    return 1 if missing else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+"""ETS Gruppenadressen-Import: erzeugt KNX-Packages aus einem GA-CSV-Export.
+
+Liest den CSV-Export aus ETS (Format 3/1 "Group name;Address;...;DatapointType"
+oder 1/1 "Main;Middle;Sub;Address;...") zeilenweise, klassifiziert die GAs
+nach DPT und Namensmuster und fasst Befehls- und Status-GA einer Funktion zu
+einer Entity zusammen:
+
+  light          Schalten + Status, optional Helligkeit (+ Status)
+  switch         Schalten + Status (kein Licht-Name / keine Licht-Hauptgruppe)
+  cover          Auf/Ab, Stopp, Position (+ Status)
+  binary_sensor  DPT 1 nur mit Status-GA
+  sensor         Messwerte (DPT 5/7/9/12/13/14 ...) mit passendem type
+
+Pro Hauptgruppe entsteht ein Package (packages/knx/ets/<nr>_<name>.yaml).
+Dateien werden nur geschrieben, wenn sich der erzeugte Inhalt geaendert hat.
+
+Speicher: Die Zeilen werden waehrend des Lesens pro Hauptgruppe in temporaere
+Dateien verteilt und danach Hauptgruppe fuer Hauptgruppe verarbeitet -- auch
+bei zehntausenden GAs liegt immer nur eine Hauptgruppe im Speicher.
+
+Nutzung:
+  python tools/ets_import.py export.csv
+  python tools/ets_import.py export.csv --dry-run
+  python tools/ets_import.py export.csv --out packages/knx/ets --prune
+"""
+
+import os
+import re
+import csv
+import sys
+import codecs
+import json
+import argparse
+import tempfile
+from pathlib import Path
+from typing import NamedTuple
+
+from ha_yaml import DEFAULT_PACKAGES_DIR
+from entity_registry import slugify
+
+# Windows-Encoding fix: UTF-8 erzwingen
+if sys.stdout.encoding != "utf-8":
+    sys.stdout.reconfigure(encoding="utf-8")
+
+DEFAULT_OUT_DIR = DEFAULT_PACKAGES_DIR / "knx" / "ets"
+GENERATED_MARKER = "# Automatisch erzeugt von tools/ets_import.py"
+# So viele nicht zugeordnete GAs werden als Beispiel gemerkt (der Rest nur gezaehlt)
+UNASSIGNED_SAMPLE = 10
+
+GA_PATTERN = re.compile(r"^(\d+)/(\d+)/(\d+)$")
+GROUP_PATTERN = re.compile(r"^(\d+)/(?:(\d+)|-)/-$")
+DPT_PATTERN = re.compile(r"DPS?T-(\d+)(?:-(\d+))?", re.IGNORECASE)
+
+# Funktions-Suffix im GA-Namen -> Rolle. Alle Muster stehen in einer
+# Alternation; der kuerzeste Basisname (= laengste Endung) gewinnt.
+_STATUS = r"(?:status|rm|r(?:ue|\u00fc)ckmeldung|zustand)"
+_BRIGHTNESS = r"(?:helligkeit|helligkeitswert|dimmwert|wert)"
+_POSITION = r"(?:position|h(?:oe|\u00f6)he)"
+ROLE_PATTERNS = {
+    "brightness_state": rf"{_BRIGHTNESS}\s+{_STATUS}|{_STATUS}\s+{_BRIGHTNESS}",
+    "position_state": rf"{_POSITION}\s+{_STATUS}|{_STATUS}\s+{_POSITION}",
+    "state": rf"(?:ein/aus\s+)?{_STATUS}",
+    "switch": r"schalten|ein/aus|an/aus|ein|aus",
+    "brightness": r"helligkeit|helligkeitswert|dimmwert",
+    "dim_relative": r"dimmen(?:\s+relativ)?",
+    "move_long": r"auf/ab|fahren|langzeit",
+    "stop": r"stopp?|kurzzeit|lamelle|schritt|step",
+    "position": _POSITION,
+}
+ROLE_PATTERN = re.compile(
+    r"^(?P<base>.*?)[\s_-]+(?:"
+    + "|".join(f"(?P<{role}>{pattern})" for role, pattern in ROLE_PATTERNS.items())
+    + r")$", re.IGNORECASE)
+
+LIGHT_WORDS = re.compile(r"licht|lampe|leuchte|beleuchtung|spot|downlight|led", re.IGNORECASE)
+COVER_WORDS = re.compile(r"jalousie|rollladen|rolllaeden|rollo|beschattung|markise|raffstore",
+                         re.IGNORECASE)
+
+# DPT -> HA-KNX sensor type
+SENSOR_TYPES = {
+    "5.001": "percent", "5.010": "1byte_unsigned",
+    "7.001": "pulse_2byte", "7.013": "brightness",
+    "9.001": "temperature", "9.004": "illuminance", "9.005": "wind_speed_ms",
+    "9.006": "pressure_2byte", "9.007": "humidity", "9.008": "ppm",
+    "9.020": "voltage", "9.021": "curr",
+    "12.001": "pulse_4_ucount", "13.010": "active_energy", "13.013": "active_energy_kwh",
+    "14.019": "electric_current", "14.027": "electric_potential", "14.056": "power",
+}
+SENSOR_MAIN_TYPES = {"5": "1byte_unsigned", "7": "2byte_unsigned", "8": "2byte_signed",
+                     "9": "2byte_float", "12": "4byte_unsigned", "13": "4byte_signed",
+                     "14": "4byte_float"}
+
+
+class GroupAddress(NamedTuple):
+    address: str
+    main: int
+    middle: int
+    sub: int
+    name: str
+    dpt: str          # "9.001", "1" oder ""
+
+
+# ---------------------------------------------------------------------------
+# CSV lesen
+# ---------------------------------------------------------------------------
+def normalize_dpt(raw: str) -> str:
+    m = DPT_PATTERN.search(raw or "")
+    if m:
+        main, sub = m.groups()
+        return f"{int(main)}.{int(sub):03d}" if sub else str(int(main))
+    raw = (raw or "").strip()
+    return raw if re.match(r"^\d+(\.\d{3})?$", raw) else ""
+
+
+def detect_encoding(path: Path) -> str:
+    """UTF-8 (mit BOM), wenn die ganze Datei gueltiges UTF-8 ist, sonst Windows-1252.
+
+    Geprueft wird blockweise bis zum Ende -- ein einzelnes cp1252-Byte weit
+    hinter dem Kopf darf den Import nicht mittendrin abbrechen.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                decoder.decode(block)
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        return "cp1252"
+    return "utf-8-sig"
+
+
+def _open_csv(path: Path, encoding: str):
+    """Oeffnet den Export; 'auto' = UTF-8 (mit BOM), sonst Windows-1252."""
+    if encoding == "auto":
+        encoding = detect_encoding(path)
+    f = open(path, "r", encoding=encoding, newline="")
+    sample = f.read(4096)
+    f.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=";,\t")
+    except csv.Error:
+        dialect = csv.excel
+    return f, dialect
+
+
+def read_group_addresses(path: Path, encoding: str = "auto"):
+    """Liefert (GroupAddress | None, gruppen_namen) zeilenweise.
+
+    gruppen_namen ist ein Dict (main, middle|None) -> Name, das waehrend des
+    Lesens gefuellt wird (Haupt-/Mittelgruppen-Zeilen).
+    """
+    names = {}
+    f, dialect = _open_csv(path, encoding)
+    with f:
+        reader = csv.reader(f, dialect)
+        header = next(reader, None)
+        if header is None:
+            return
+        lower = [h.strip().lower() for h in header]
+        one_by_one = "main" in lower and "sub" in lower
+        if "address" in lower:
+            col_addr = lower.index("address")
+            col_name = lower.index("group name") if "group name" in lower else 0
+        else:
+            # Export ohne Kopfzeile: 3/1-Reihenfolge
+            col_addr, col_name = 1, 0
+            lower = ["group name", "address", "central", "unfiltered", "description",
+                     "datapointtype"]
+            reader = _chain([header], reader)
+        col_dpt = lower.index("datapointtype") if "datapointtype" in lower else None
+        col_main = lower.index("main") if one_by_one else None
+        col_middle = lower.index("middle") if one_by_one else None
+        col_sub = lower.index("sub") if one_by_one else None
+
+        for row in reader:
+            if len(row) <= col_addr:
+                continue
+            address = row[col_addr].strip()
+            if one_by_one:
+                name = (row[col_sub] or row[col_middle] or row[col_main]).strip()
+            else:
+                name = row[col_name].strip() if len(row) > col_name else ""
+            m = GA_PATTERN.match(address)
+            if m is None:
+                g = GROUP_PATTERN.match(address)
+                if g is not None:
+                    main, middle = g.groups()
+                    names[(int(main), int(middle) if middle is not None else None)] = name
+                continue
+            dpt = normalize_dpt(row[col_dpt]) if col_dpt is not None and len(row) > col_dpt else ""
+            main, middle, sub = (int(x) for x in m.groups())
+            yield GroupAddress(address, main, middle, sub, name, dpt), names
+
+
+def _chain(first, rest):
+    yield from first
+    yield from rest
+
+
+# ---------------------------------------------------------------------------
+# Klassifizierung
+# ---------------------------------------------------------------------------
+def split_role(name: str) -> tuple[str, str | None]:
+    """'Deckenlampe Status' -> ('Deckenlampe', 'state')."""
+    m = ROLE_PATTERN.match(name)
+    if m and m.group("base").strip():
+        return m.group("base").strip(), m.lastgroup
+    return name.strip(), None
+
+
+def entity_name(base: str, middle_name: str) -> str:
+    """Mittelgruppen-Name (meist der Raum) voranstellen, falls nicht enthalten."""
+    if middle_name and not base.lower().startswith(middle_name.lower()):
+        return f"{middle_name} {base}"
+    return base
+
+
+def _sensor_type(dpt: str) -> str | None:
+    if dpt in SENSOR_TYPES:
+        return SENSOR_TYPES[dpt]
+    return SENSOR_MAIN_TYPES.get(dpt.split(".")[0])
+
+
+def classify_group(addresses: list[GroupAddress], names: dict) -> tuple[dict, list]:
+    """GAs einer Hauptgruppe -> {plattform: [entity, ...]}, [nicht zugeordnet]."""
+    main = addresses[0].main
+    main_name = names.get((main, None), "")
+    functions = {}          # (middle, base) -> {role: GroupAddress}
+    order = []
+    unassigned = []
+    for ga in addresses:
+        base, role = split_role(ga.name)
+        if role is None:
+            dpt_main = ga.dpt.split(".")[0]
+            if dpt_main in SENSOR_MAIN_TYPES or ga.dpt in SENSOR_TYPES:
+                role = "value"
+            elif dpt_main == "1":
+                role = "switch"
+            else:
+                unassigned.append(ga)
+                continue
+        key = (ga.middle, base.lower())
+        if key not in functions:
+            functions[key] = {"_base": base}
+            order.append(key)
+        if role in functions[key]:
+            # Rolle doppelt belegt -> als eigene Funktion fuehren
+            key = (ga.middle, f"{base.lower()}#{ga.address}")
+            functions[key] = {"_base": base}
+            order.append(key)
+        functions[key][role] = ga
+
+    platforms = {}
+    for key in order:
+        roles = functions[key]
+        middle = key[0]
+        name = entity_name(roles["_base"], names.get((main, middle), ""))
+        entity = _build_entity(name, roles, main_name)
+        if entity is None:
+            unassigned.extend(ga for r, ga in roles.items() if r != "_base")
+            continue
+        platform, fields = entity
+        platforms.setdefault(platform, []).append(fields)
+    return platforms, unassigned
+
+
+def _build_entity(name: str, roles: dict, main_name: str):
+    addr = lambda role: roles[role].address if role in roles else None
+    context = f"{main_name} {name}"
+
+    if "move_long" in roles or "position" in roles or COVER_WORDS.search(context):
+        if not ("move_long" in roles or "position" in roles):
+            return None
+        return "cover", _fields(name, [
+            ("move_long_address", addr("move_long")),
+            ("stop_address", addr("stop")),
+            ("position_address", addr("position")),
+            ("position_state_address", addr("position_state")),
+        ])
+
+    if "value" in roles and len(roles) == 2:
+        ga = roles["value"]
+        sensor_type = _sensor_type(ga.dpt)
+        if sensor_type is None:
+            return None
+        return "sensor", _fields(name, [("state_address", ga.address), ("type", sensor_type)])
+
+    if "brightness" in roles or ("switch" in roles and LIGHT_WORDS.search(context)):
+        return "light", _fields(name, [
+            ("address", addr("switch")),
+            ("state_address", addr("state")),
+            ("brightness_address", addr("brightness")),
+            ("brightness_state_address", addr("brightness_state")),
+        ])
+
+    if "switch" in roles:
+        return "switch", _fields(name, [("address", addr("switch")),
+                                        ("state_address", addr("state"))])
+
+    if "state" in roles and roles["state"].dpt.split(".")[0] in ("1", ""):
+        return "binary_sensor", _fields(name, [("state_address", addr("state"))])
+
+    if "state" in roles:
+        sensor_type = _sensor_type(roles["state"].dpt)
+        if sensor_type:
+            return "sensor", _fields(name, [("state_address", addr("state")),
+                                            ("type", sensor_type)])
+    return None
+
+
+def _fields(name: str, items: list[tuple[str, str | None]]) -> list[tuple[str, str]]:
+    return [("name", name)] + [(k, v) for k, v in items if v is not None]
+
+
+# ---------------------------------------------------------------------------
+# Ausgabe
+# ---------------------------------------------------------------------------
+PLATFORM_ORDER = ["light", "switch", "cover", "binary_sensor", "sensor"]
+
+
+def _quote(value: str) -> str:
+    return json.dumps(value, ensure_ascii=False)
+
+
+def render_package(main: int, main_name: str, platforms: dict, source: str) -> str:
+    lines = [
+        f"# /config/packages/knx/ets/{package_filename(main, main_name)}",
+        "# " + "=" * 76,
+        f"{GENERATED_MARKER} aus {source}",
+        f"# Hauptgruppe {main}: {main_name or '(ohne Namen)'}",
+        "# Nicht von Hand bearbeiten -- Aenderungen in ETS, dann neu importieren.",
+        "# " + "=" * 76,
+        "",
+        "knx:",
+    ]
+    for platform in PLATFORM_ORDER:
+        entities = platforms.get(platform)
+        if not entities:
+            continue
+        lines.append(f"  {platform}:")
+        for fields in entities:
+            first = True
+            for key, value in fields:
+                prefix = "    - " if first else "      "
+                first = False
+                if key == "type":
+                    lines.append(f"{prefix}{key}: {value}")
+                else:
+                    lines.append(f"{prefix}{key}: {_quote(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def package_filename(main: int, main_name: str) -> str:
+    slug = slugify(main_name) or "hauptgruppe"
+    return f"{main:02d}_{slug}.yaml"
+
+
+def write_if_changed(path: Path, text: str) -> bool:
+    """Schreibt atomar, aber nur wenn sich der Inhalt unterscheidet."""
+    data = text.encode("utf-8")
+    try:
+        if path.read_bytes() == data:
+            return False
+    except OSError:
+        pass
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    return True
+
+
+# ---------------------------------------------------------------------------
+# Import
+# ---------------------------------------------------------------------------
+def spill_by_main_group(csv_path: Path, workdir: Path, encoding: str) -> tuple[dict, dict, int]:
+    """Verteilt die GAs zeilenweise auf eine Datei pro Hauptgruppe."""
+    handles = {}
+    names = {}
+    count = 0
+    try:
+        for ga, names in read_group_addresses(csv_path, encoding):
+            f = handles.get(ga.main)
+            if f is None:
+                f = open(workdir / f"{ga.main}.csv", "w", encoding="utf-8", newline="")
+                handles[ga.main] = (f, csv.writer(f))
+            handles[ga.main][1].writerow(ga)
+            count += 1
+    finally:
+        for f, _ in handles.values():
+            f.close()
+    return {main: workdir / f"{main}.csv" for main in handles}, names, count
+
+
+def import_csv(csv_path: Path, out_dir: Path, dry_run: bool = False, prune: bool = False,
+               encoding: str = "auto") -> dict:
+    stats = {"gas": 0, "entities": 0, "unassigned": 0, "unassigned_sample": [],
+             "written": [], "unchanged": [], "removed": [], "platforms": {}}
+    expected = set()
+    with tempfile.TemporaryDirectory() as tmp:
+        spills, names, stats["gas"] = spill_by_main_group(csv_path, Path(tmp), encoding)
+        for main in sorted(spills):
+            with open(spills[main], "r", encoding="utf-8", newline="") as f:
+                addresses = [GroupAddress(a, int(m), int(mi), int(su), n, d)
+                             for a, m, mi, su, n, d in csv.reader(f)]
+            addresses.sort(key=lambda ga: (ga.middle, ga.sub))
+            platforms, unassigned = classify_group(addresses, names)
+            stats["unassigned"] += len(unassigned)
+            room = UNASSIGNED_SAMPLE - len(stats["unassigned_sample"])
+            stats["unassigned_sample"].extend(unassigned[:room])
+            if not platforms:
+                continue
+            for platform, entities in platforms.items():
+                stats["platforms"][platform] = stats["platforms"].get(platform, 0) + len(entities)
+                stats["entities"] += len(entities)
+            main_name = names.get((main, None), "")
+            filename = package_filename(main, main_name)
+            expected.add(filename)
+            text = render_package(main, main_name, platforms, csv_path.name)
+            path = out_dir / filename
+            if dry_run:
+                changed = not path.is_file() or path.read_text(encoding="utf-8") != text
+            else:
+                changed = write_if_changed(path, text)
+            stats["written" if changed else "unchanged"].append(filename)
+
+    if prune and out_dir.is_dir():
+        for path in sorted(out_dir.glob("*.yaml")):
+            if path.name in expected:
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                head = f.read(512)
+            if GENERATED_MARKER in head:
+                stats["removed"].append(path.name)
+                if not dry_run:
+                    path.unlink()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ETS GA-CSV -> KNX-Packages")
+    parser.add_argument("csv", help="ETS Gruppenadressen-Export (CSV)")
+    parser.add_argument("--out", default=str(DEFAULT_OUT_DIR),
+                        help="Zielverzeichnis (Default: packages/knx/ets)")
+    parser.add_argument("--encoding", default="auto",
+                        help="Encoding des Exports (Default: auto = UTF-8, sonst cp1252)")
+    parser.add_argument("--dry-run", "-n", action="store_true",
+                        help="Nur anzeigen, welche Packages sich aendern wuerden")
+    parser.add_argument("--prune", action="store_true",
+                        help="Erzeugte Packages entfernen, deren Hauptgruppe nicht mehr existiert")
+    args = parser.parse_args()
+
+    stats = import_csv(Path(args.csv), Path(args.out), args.dry_run, args.prune, args.encoding)
+
+    verb = "wuerde schreiben" if args.dry_run else "geschrieben"
+    print(f"\n{'='*60}")
+    print(f"  ETS-Import -- {args.csv}")
+    print(f"{'='*60}")
+    print(f"  {stats['gas']} Gruppenadressen -> {stats['entities']} Entities "
+          f"({', '.join(f'{p} {n}' for p, n in sorted(stats['platforms'].items())) or '-'})")
+    for filename in stats["written"]:
+        print(f"  {verb:<18} {filename}")
+    if stats["unchanged"]:
+        print(f"  {len(stats['unchanged'])} Package(s) unveraendert")
+    for filename in stats["removed"]:
+        print(f"  {'entfernt':<18} {filename}")
+    if stats["unassigned"]:
+        print(f"\n  {stats['unassigned']} GA(s) nicht zugeordnet, z.B.:")
+        for ga in stats["unassigned_sample"]:
+            print(f"    {ga.address:<10} {ga.name}  (DPT {ga.dpt or '?'})")
+    print(f"{'='*60}\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,260 @@
+"""Gemeinsames Dokument-Modell fuer die HA-Validatoren.
+
+Jede Package-Datei wird genau einmal geladen und als PackageDocument an alle
+Pruef-Passes (Struktur, doppelte IDs, Entity-Extraktion) weitergereicht.
+yaml_validator.py, entity_reference_checker.py und run_tests.py nutzen
+denselben Loader und dieselbe Dateiliste.
+
+Optional wird ein ParseCache (parse_cache.py) genutzt: unveraenderte Dateien
+werden dann nicht erneut geparst, abgeleitete Daten (doc.memo) mitgespeichert.
+
+Geparst wird mit libyaml (CSafeLoader), falls PyYAML damit gebaut ist, sonst
+mit dem reinen Python-Loader. Bei vielen Dateien verteilt load_documents()
+das Parsen auf einen Prozess-Pool.
+"""
+
+import io
+import os
+import yaml
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# Bei Aenderungen an Loader oder Extraktion erhoehen -- invalidiert den Cache
+TOOL_VERSION = "2"
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_PACKAGES_DIR = PROJECT_DIR / "packages"
+
+# Ab so vielen ungecachten Dateien lohnt sich der Prozess-Pool
+PARALLEL_MIN_FILES = 16
+
+HA_TAGS = ("include", "include_dir_list", "include_dir_named",
+           "include_dir_merge_list", "include_dir_merge_named",
+           "secret", "input", "env_var")
+
+
+# ---------------------------------------------------------------------------
+# HA-kompatibler YAML-Loader (unterstuetzt !include, !secret, !input, etc.)
+# ---------------------------------------------------------------------------
+class HAYamlLoader(yaml.SafeLoader):
+    """YAML-Loader mit Home Assistant Custom Tags."""
+    pass
+
+
+if getattr(yaml, "__with_libyaml__", False):
+    class HACYamlLoader(yaml.CSafeLoader):
+        """HAYamlLoader auf Basis von libyaml (gleiche Tags, schnellerer Parser)."""
+        pass
+else:
+    HACYamlLoader = None
+
+
+def _ha_tag_constructor(loader, tag_suffix, node):
+    """Generischer Konstruktor fuer HA-Tags -- gibt Platzhalter zurueck."""
+    if isinstance(node, yaml.ScalarNode):
+        return f"!{tag_suffix} {loader.construct_scalar(node)}"
+    if isinstance(node, yaml.SequenceNode):
+        return loader.construct_sequence(node)
+    if isinstance(node, yaml.MappingNode):
+        return loader.construct_mapping(node)
+    return None
+
+
+# Alle HA-spezifischen Tags registrieren (auf beiden Loadern identisch)
+for loader_cls in (HAYamlLoader, HACYamlLoader):
+    if loader_cls is None:
+        continue
+    for tag in HA_TAGS:
+        loader_cls.add_constructor(
+            f"!{tag}",
+            lambda loader, node, t=tag: _ha_tag_constructor(loader, t, node),
+        )
+
+# Standard-Loader fuer alle Tools: libyaml wenn verfuegbar
+FAST_LOADER = HACYamlLoader or HAYamlLoader
+
+
+# ---------------------------------------------------------------------------
+# Dokument-Modell
+# ---------------------------------------------------------------------------
+class PackageDocument:
+    """Eine geladene Package-Datei.
+
+    content ist der geparste YAML-Inhalt (None bei leerer Datei oder Fehler),
+    error die Fehlermeldung falls die Datei nicht geladen werden konnte.
+    key ist der Cache-Schluessel des Inhalts, derived enthaelt abgeleitete
+    Daten der Passes (Entity-IDs, Automation-IDs), die mitgecacht werden.
+    """
+
+    def __init__(self, path: Path, content=None, error: str | None = None,
+                 key: str | None = None, derived: dict | None = None):
+        self.path = path
+        self.content = content
+        self.error = error
+        self.key = key
+        self.derived = derived if derived is not None else {}
+        self.dirty = False
+
+    @property
+    def name(self) -> str:
+        return self.path.name
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def memo(self, name: str, compute):
+        """Abgeleitete Daten einmal berechnen und fuer den Cache merken."""
+        if name not in self.derived:
+            self.derived[name] = compute()
+            self.dirty = True
+        return self.derived[name]
+
+    def __repr__(self):
+        state = "ok" if self.ok else "fehler"
+        return f"<PackageDocument {self.path} ({state})>"
+
+
+def parse_text(text: str, name: str, loader=None):
+    """Parst YAML-Text mit dem HA-Loader; name erscheint in Fehlermeldungen."""
+    stream = io.StringIO(text)
+    stream.name = name
+    return yaml.load(stream, Loader=loader or FAST_LOADER)
+
+
+def _parse_bytes(filepath: Path, data: bytes) -> tuple:
+    """Dekodiert und parst Datei-Inhalt. Liefert (content, error)."""
+    try:
+        return parse_text(data.decode("utf-8"), str(filepath)), None
+    except UnicodeDecodeError as e:
+        return None, f"Encoding-Fehler (kein gueltiges UTF-8): {e}"
+    except yaml.YAMLError as e:
+        return None, f"YAML-Syntax-Fehler: {e}"
+
+
+def lookup_document(filepath: Path, cache=None, partial: bool = False):
+    """Liest eine Datei und schlaegt sie im Cache nach.
+
+    Liefert (doc, data): doc ist fertig bei Cache-Treffer oder fehlender
+    Datei, sonst None -- dann muss data noch geparst werden. Eintraege ohne
+    Objekt-Baum (nur abgeleitete Daten, "partial") zaehlen nur mit
+    partial=True als Treffer; doc.content ist dann None.
+    """
+    try:
+        data = filepath.read_bytes()
+    except FileNotFoundError:
+        return PackageDocument(filepath, error="Datei nicht gefunden"), None
+
+    key = None
+    if cache is not None:
+        key = cache.key_for(data)
+        entry = cache.get(key)
+        if entry is not None and (partial or not entry.get("partial")):
+            doc = PackageDocument(filepath, entry["content"], key=key,
+                                  derived=entry["derived"])
+            return doc, None
+    return None, (key, data)
+
+
+def _make_document(filepath: Path, key: str | None, content, error) -> PackageDocument:
+    if error is not None:
+        return PackageDocument(filepath, error=error)
+    doc = PackageDocument(filepath, content, key=key)
+    # Nur erfolgreich geparste Dateien cachen; Fehlermeldungen enthalten Pfade
+    doc.dirty = key is not None
+    return doc
+
+
+def load_document(filepath: Path, cache=None) -> PackageDocument:
+    """Laedt eine Datei mit dem HA-Loader. Fehler landen in doc.error."""
+    doc, pending = lookup_document(filepath, cache)
+    if doc is not None:
+        return doc
+    key, data = pending
+    return _make_document(filepath, key, *_parse_bytes(filepath, data))
+
+
+def load_documents(files: list[Path], cache=None, jobs: int | None = None) -> list[PackageDocument]:
+    """Laedt alle Dateien genau einmal.
+
+    Cache-Treffer werden direkt uebernommen. Die restlichen Dateien werden
+    ab PARALLEL_MIN_FILES auf jobs Prozesse verteilt (None = alle Kerne,
+    1 = seriell). Kann kein Pool gestartet werden, wird seriell geparst.
+    """
+    documents = [None] * len(files)
+    todo = []
+    for i, filepath in enumerate(files):
+        doc, pending = lookup_document(filepath, cache)
+        if doc is not None:
+            documents[i] = doc
+        else:
+            todo.append((i, filepath, *pending))
+
+    workers = jobs or os.cpu_count() or 1
+    parsed = None
+    if workers > 1 and len(todo) >= PARALLEL_MIN_FILES:
+        parsed = _parse_parallel(todo, min(workers, len(todo)))
+    if parsed is None:
+        parsed = [_parse_bytes(filepath, data) for _, filepath, _, data in todo]
+
+    for (i, filepath, key, _), (content, error) in zip(todo, parsed):
+        documents[i] = _make_document(filepath, key, content, error)
+    return documents
+
+
+def _parse_parallel(todo: list, workers: int) -> list | None:
+    """Parst im Prozess-Pool; None falls kein Pool verfuegbar ist."""
+    paths = [filepath for _, filepath, _, _ in todo]
+    payloads = [data for _, _, _, data in todo]
+    chunksize = max(1, len(todo) // (workers * 4))
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(_parse_bytes, paths, payloads, chunksize=chunksize))
+    except (OSError, ImportError, NotImplementedError, RuntimeError):
+        # z.B. kein fork/sem_open in eingeschraenkten Umgebungen
+        return None
+
+
+def save_documents(documents: list[PackageDocument], cache=None):
+    """Schreibt neue oder ergaenzte Eintraege zurueck in den Cache."""
+    if cache is None:
+        return
+    for doc in documents:
+        if doc.dirty and doc.ok and doc.key is not None:
+            cache.put(doc.key, {"content": doc.content, "derived": doc.derived})
+            doc.dirty = False
+    cache.flush()
+
+
+def add_loader_arguments(parser):
+    """Gemeinsame CLI-Optionen fuer Cache und Parallelitaet."""
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Parse-Cache nicht nutzen (alles neu parsen)")
+    parser.add_argument("--jobs", "-j", type=int, default=None,
+                        help="Parallele Parse-Prozesse (Default: alle Kerne, 1 = seriell)")
+
+
+def open_cache(enabled: bool = True):
+    """ParseCache oder None (bei --no-cache)."""
+    if not enabled:
+        return None
+    from parse_cache import ParseCache
+    return ParseCache()
+
+
+# ---------------------------------------------------------------------------
+# Dateiauswahl (gemeinsam fuer alle CLIs)
+# ---------------------------------------------------------------------------
+def collect_files(files: list[str] | None = None,
+                  packages_dir: str | None = None) -> list[Path]:
+    """Bestimmt die zu pruefenden Dateien wie die CLIs es erwarten.
+
+    Explizite Dateien haben Vorrang, sonst alle .yaml im packages_dir,
+    sonst packages/ im Projektverzeichnis.
+    """
+    if files:
+        return [Path(f) for f in files]
+    pkg_dir = Path(packages_dir) if packages_dir else DEFAULT_PACKAGES_DIR
+    if pkg_dir.is_dir():
+        return sorted(pkg_dir.glob("**/*.yaml"))
+    return []
@@ -0,0 +1,272 @@
+"""!include / !secret aufloesen: Include-Graph fuer die Validatoren (--resolve).
+
+Der normale Loader macht aus !include, !include_dir_* und !secret nur
+Platzhalter-Strings ("!include automationen.yaml") -- was hinter einem Include
+steht, wird nie geprueft. Mit --resolve baut IncludeResolver den Graphen:
+
+  - jede eingebundene Datei wird genau einmal geladen (auch wenn sie von
+    vielen Packages eingebunden wird, Parse-Cache wie ueberall) und genau
+    einmal aufgeloest; alle Einbindungen teilen sich das Ergebnis
+  - !include_dir_list/_named/_merge_list/_merge_named wie in HA
+    (alle .yaml im Verzeichnis, rekursiv, sortiert)
+  - Zyklen (a -> b -> a) werden gemeldet statt endlos zu laden
+  - !secret-Keys werden gegen secrets.yaml geprueft (gesucht wie in HA: im
+    Verzeichnis der Datei, dann aufwaerts bis zum Config-Verzeichnis; jede
+    secrets.yaml wird einmal geparst). Werte werden nie ausgegeben und
+    landen auch nicht im aufgeloesten Inhalt -- dort bleibt "!secret key".
+
+Eine configuration.yaml im Config-Verzeichnis (Default: Elternverzeichnis
+von packages/) wird mit in den Graphen genommen (Zyklen, fehlende Dateien,
+Secrets), aber nicht als Package geprueft. Packages, die von einem anderen
+Package eingebunden werden, sind Fragmente und werden nur als Teil ihres
+Einbinders geprueft.
+"""
+
+from pathlib import Path
+
+import yaml
+
+from ha_yaml import FAST_LOADER, PackageDocument, load_document, PROJECT_DIR
+
+INCLUDE_TAGS = ("include", "include_dir_list", "include_dir_named",
+                "include_dir_merge_list", "include_dir_merge_named")
+_PREFIXES = tuple(f"!{tag} " for tag in INCLUDE_TAGS) + ("!secret ",)
+
+SECRETS_FILE = "secrets.yaml"
+CONFIGURATION_FILE = "configuration.yaml"
+
+# Platzhalter fuer nicht aufloesbare Includes (Zyklus, fehlende Datei)
+UNRESOLVED = None
+
+
+class IncludeResolver:
+    """Laedt und loest jede Datei des Include-Graphen genau einmal auf."""
+
+    def __init__(self, config_dir: Path | None = None, cache=None):
+        self.config_dir = Path(config_dir or PROJECT_DIR).resolve()
+        self.cache = cache
+        self.documents = {}     # Pfad -> PackageDocument (roh, wie geladen)
+        self.resolved = {}      # Pfad -> aufgeloester Inhalt
+        self.edges = {}         # Pfad -> {eingebundene Pfade}
+        self.secrets = {}       # Pfad einer secrets.yaml -> set(keys) oder None
+        self.findings = []      # (level, datei, meldung)
+        self._own = set()       # vom Aufrufer geladen -- Ladefehler meldet dort syntax_pass
+        self._stack = []
+        self._cycles = set()
+        self._secrets_missing = False
+
+    # -- Laden --------------------------------------------------------------
+    def register(self, documents: list[PackageDocument]):
+        """Bereits geladene Dokumente uebernehmen (werden nicht erneut gelesen)."""
+        for doc in documents:
+            path = doc.path.resolve()
+            self.documents[path] = doc
+            self._own.add(path)
+
+    def _document(self, path: Path) -> PackageDocument:
+        doc = self.documents.get(path)
+        if doc is None:
+            doc = load_document(path, self.cache)
+            self.documents[path] = doc
+        return doc
+
+    def _error(self, path: Path, msg: str):
+        self.findings.append(("error", self._name(path), msg))
+
+    def _warn(self, path: Path, msg: str):
+        self.findings.append(("warning", self._name(path), msg))
+
+    def _name(self, path: Path) -> str:
+        try:
+            return path.relative_to(self.config_dir).as_posix()
+        except ValueError:
+            return str(path)
+
+    # -- Secrets ------------------------------------------------------------
+    def _secret_keys(self, path: Path) -> set | None:
+        """Keys der secrets.yaml, die fuer path gilt (None: keine gefunden)."""
+        directory = path.parent
+        while True:
+            candidate = directory / SECRETS_FILE
+            if candidate not in self.secrets:
+                self.secrets[candidate] = self._load_secrets(candidate)
+            if self.secrets[candidate] is not None:
+                return self.secrets[candidate]
+            if directory == self.config_dir or directory.parent == directory \
+                    or self.config_dir not in directory.parents:
+                return None
+            directory = directory.parent
+
+    def _load_secrets(self, path: Path) -> set | None:
+        """Nur die Keys behalten -- Werte bleiben in dieser Funktion."""
+        try:
+            text = path.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+        except (OSError, UnicodeDecodeError) as e:
+            self._error(path, f"nicht lesbar: {type(e).__name__}")
+            return set()
+        try:
+            data = yaml.load(text, Loader=FAST_LOADER)
+        except yaml.YAMLError as e:
+            # Keine Fehlermeldung mit Textausschnitt -- der koennte ein Secret zeigen
+            mark = getattr(e, "problem_mark", None)
+            where = f" (Zeile {mark.line + 1})" if mark is not None else ""
+            self._error(path, f"YAML-Syntax-Fehler{where}")
+            return set()
+        if data is None:
+            return set()
+        if not isinstance(data, dict):
+            self._error(path, "muss ein Dict sein")
+            return set()
+        return {str(key) for key in data}
+
+    # -- Aufloesen ----------------------------------------------------------
+    def resolve_file(self, path: Path):
+        """Aufgeloester Inhalt einer Datei (einmal berechnet, dann geteilt)."""
+        path = path.resolve()
+        if path in self.resolved:
+            return self.resolved[path]
+        if path in self._stack:
+            chain = self._stack[self._stack.index(path):] + [path]
+            cycle = " -> ".join(self._name(p) for p in chain)
+            if cycle not in self._cycles:
+                self._cycles.add(cycle)
+                self._error(self._stack[-1], f"Include-Zyklus: {cycle}")
+            return UNRESOLVED
+        doc = self._document(path)
+        if not doc.ok:
+            if path not in self._own:
+                self._error(path, doc.error)
+            self.resolved[path] = UNRESOLVED
+            return UNRESOLVED
+        self._stack.append(path)
+        try:
+            self.edges.setdefault(path, set())
+            content = self._resolve(doc.content, path)
+        finally:
+            self._stack.pop()
+        self.resolved[path] = content
+        return content
+
+    def _resolve(self, obj, path: Path):
+        """Wie obj, nur mit aufgeloesten Includes; unveraenderte Teile bleiben dieselben Objekte."""
+        if isinstance(obj, str):
+            if obj.startswith(_PREFIXES):
+                return self._tag(obj, path)
+            return obj
+        if isinstance(obj, list):
+            items = [self._resolve(item, path) for item in obj]
+            if all(a is b for a, b in zip(items, obj)):
+                return obj
+            return items
+        if isinstance(obj, dict):
+            changed = False
+            result = {}
+            for key, value in obj.items():
+                new = self._resolve(value, path)
+                changed = changed or new is not value
+                result[key] = new
+            return result if changed else obj
+        return obj
+
+    def _tag(self, placeholder: str, path: Path):
+        tag, _, argument = placeholder[1:].partition(" ")
+        argument = argument.strip()
+        if tag == "secret":
+            keys = self._secret_keys(path)
+            if keys is None:
+                if not self._secrets_missing:
+                    self._secrets_missing = True
+                    self._warn(path, f"keine {SECRETS_FILE} gefunden -- !secret-Keys "
+                                     f"nicht geprueft")
+            elif argument not in keys:
+                self._error(path, f"!secret '{argument}' fehlt in {SECRETS_FILE}")
+            return placeholder
+        target = (path.parent / argument).resolve()
+        if tag == "include":
+            if not target.is_file():
+                self._error(path, f"!include '{argument}' nicht gefunden")
+                return UNRESOLVED
+            self.edges[path].add(target)
+            return self.resolve_file(target)
+        if not target.is_dir():
+            self._error(path, f"!{tag} '{argument}' ist kein Verzeichnis")
+            return UNRESOLVED
+        files = sorted(target.glob("**/*.yaml"))
+        self.edges[path].update(files)
+        contents = [(f, self.resolve_file(f)) for f in files]
+        if tag == "include_dir_list":
+            return [content for _, content in contents]
+        if tag == "include_dir_named":
+            return {f.stem: content for f, content in contents}
+        if tag == "include_dir_merge_list":
+            merged = []
+            for f, content in contents:
+                if isinstance(content, list):
+                    merged.extend(content)
+                elif content is not None:
+                    self._error(f, "muss fuer !include_dir_merge_list eine Liste sein")
+            return merged
+        merged = {}
+        for f, content in contents:
+            if isinstance(content, dict):
+                merged.update(content)
+            elif content is not None:
+                self._error(f, "muss fuer !include_dir_merge_named ein Dict sein")
+        return merged
+
+    # -- Einstieg -----------------------------------------------------------
+    def resolve(self, documents: list[PackageDocument]) -> list[PackageDocument]:
+        """Aufgeloeste Dokumente zu documents (Fragmente entfallen).
+
+        Dokumente ohne Include bleiben dieselben Objekte (inkl. Cache-Memos).
+        """
+        self.register(documents)
+        configuration = self.config_dir / CONFIGURATION_FILE
+        if configuration.is_file():
+            self.resolve_file(configuration)
+        for doc in documents:
+            self.resolve_file(doc.path)
+
+        # Von einem anderen Package eingebundene Dateien sind Fragmente
+        own = {doc.path.resolve() for doc in documents}
+        included = {target for source, targets in self.edges.items()
+                    if source in own for target in targets if target != source}
+        result = []
+        for doc in documents:
+            path = doc.path.resolve()
+            if path in included:
+                continue
+            content = self.resolved.get(path, doc.content)
+            if not doc.ok or content is doc.content:
+                result.append(doc)
+            else:
+                result.append(PackageDocument(doc.path, content))
+        return result
+
+    def report_to(self, result):
+        """Befunde in ein ValidationResult uebernehmen."""
+        for level, fname, msg in self.findings:
+            (result.error if level == "error" else result.warn)(fname, msg)
+
+    def all_documents(self) -> list[PackageDocument]:
+        """Alle geladenen Dokumente, auch die nur eingebundenen (fuer save_documents)."""
+        return list(self.documents.values())
+
+
+def add_resolve_arguments(parser):
+    """Gemeinsame CLI-Optionen fuer die Include-Aufloesung."""
+    parser.add_argument("--resolve", action="store_true",
+                        help="!include/!secret aufloesen und eingebundene Dateien mitpruefen")
+    parser.add_argument("--config-dir",
+                        help="Config-Verzeichnis mit configuration.yaml/secrets.yaml "
+                             "(Default: Elternverzeichnis der Packages)")
+
+
+def open_resolver(args, packages_dir: Path, cache=None) -> IncludeResolver | None:
+    """IncludeResolver fuer --resolve, sonst None."""
+    if not args.resolve:
+        return None
+    config_dir = Path(args.config_dir) if args.config_dir else Path(packages_dir).resolve().parent
+    return IncludeResolver(config_dir, cache)
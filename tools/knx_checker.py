@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+"""KNX-Analyse: Gruppenadressen-Index, Kollisionen und sync_state-Buslast.
+
+Indexiert jede Gruppenadresse (address, state_address, *_address) aller
+`knx:`-Bloecke und prueft:
+
+  - doppelt geschriebene GAs (mehrere Entities senden auf dieselbe GA)
+  - widerspruechliche DPTs (dieselbe GA als 1.001 und 5.001 o.ae.)
+  - ungueltige Adressen und Platzhalter (x/x/x)
+  - Lese-Last durch sync_state auf dem Bus
+
+sync_state wie in der HA-KNX-Integration (Minuten!):
+  true / fehlt   = expire 60      false      = nie lesen
+  init           = nur beim Start  N          = expire N
+  expire N       = lesen, wenn N Minuten kein Telegramm kam (hoechstens 1/N pro Min.)
+  every N        = alle N Minuten lesen (genau 1/N pro Min.)
+
+Die Last wird als Lese-Telegramme pro Minute ueber alle Status-GAs summiert:
+`every` exakt, `expire` als Obergrenze (Bus ruhig), dazu die Init-Lesungen
+beim Start von HA.
+
+Nutzung:
+  python tools/knx_checker.py                       # Report ueber packages/
+  python tools/knx_checker.py --top 20              # groesste Last-Verursacher
+  python tools/knx_checker.py --ga 1/2/3            # Wer nutzt diese GA?
+"""
+
+import re
+import sys
+import argparse
+from collections import defaultdict
+from typing import NamedTuple
+
+from ha_yaml import (add_loader_arguments, collect_files, load_documents, open_cache,
+                     save_documents, DEFAULT_PACKAGES_DIR, PackageDocument)
+
+# Windows-Encoding fix: UTF-8 erzwingen
+if sys.stdout.encoding != "utf-8":
+    sys.stdout.reconfigure(encoding="utf-8")
+
+# Ab dieser Summe (every-Lesungen pro Minute) wird gewarnt
+DEFAULT_MAX_READS_PER_MINUTE = 60.0
+DEFAULT_SYNC_MINUTES = 60
+
+GA_THREE_LEVEL = re.compile(r"^(\d{1,2})/(\d)/(\d{1,3})$")
+GA_TWO_LEVEL = re.compile(r"^(\d{1,2})/(\d{1,4})$")
+GA_FREE = re.compile(r"^\d{1,5}$")
+PLACEHOLDER = re.compile(r"^[x?]+(/[x?]+){0,2}$", re.IGNORECASE)
+SYNC_PATTERN = re.compile(r"^(expire|every)\s+(\d+)$", re.IGNORECASE)
+
+# Adress-Keys, deren GA HA vom Bus liest (Status); alle anderen werden geschrieben
+READ_KEYS = {"state_address", "temperature_address"}
+# Adress-Key -> DPT (unabhaengig von der Plattform)
+KEY_DPT = {
+    "brightness_address": "5.001", "brightness_state_address": "5.001",
+    "move_long_address": "1.008", "move_short_address": "1.007",
+    "stop_address": "1.017",
+    "position_address": "5.001", "position_state_address": "5.001",
+    "angle_address": "5.001", "angle_state_address": "5.001",
+    "temperature_address": "9.001",
+    "target_temperature_address": "9.001", "target_temperature_state_address": "9.001",
+    "on_off_address": "1.001", "on_off_state_address": "1.001",
+    "percentage_address": "5.001", "percentage_state_address": "5.001",
+}
+# Plattformen, deren address/state_address ein Schaltobjekt (DPT 1) ist
+SWITCHING_PLATFORMS = {"light", "switch", "binary_sensor", "fan"}
+# sensor/number/expose: type -> DPT
+TYPE_DPT = {
+    "binary": "1", "percent": "5.001", "scaling": "5.001", "1byte_unsigned": "5.010",
+    "pulse": "5.010", "pulse_2byte": "7.001", "2byte_unsigned": "7",
+    "brightness": "7.013", "2byte_signed": "8", "2byte_float": "9",
+    "temperature": "9.001", "illuminance": "9.004", "wind_speed_ms": "9.005",
+    "pressure_2byte": "9.006", "humidity": "9.007", "ppm": "9.008",
+    "voltage": "9.020", "curr": "9.021", "4byte_unsigned": "12",
+    "pulse_4_ucount": "12.001", "4byte_signed": "13", "active_energy": "13.010",
+    "active_energy_kwh": "13.013", "4byte_float": "14", "electric_current": "14.019",
+    "electric_potential": "14.027", "power": "14.056", "string": "16.000",
+    "scene_number": "17.001",
+}
+
+
+class KnxAddress(NamedTuple):
+    """Eine GA-Verwendung in einem Package."""
+    file: str
+    platform: str
+    name: str
+    key: str
+    address: str
+    dpt: str | None
+    read: bool
+
+
+class KnxEntity(NamedTuple):
+    """Eine KNX-Entity mit ihrer Lese-Konfiguration."""
+    file: str
+    platform: str
+    name: str
+    sync_mode: str          # "expire" | "every" | "init" | "off"
+    sync_minutes: int
+    read_addresses: int
+
+
+# ---------------------------------------------------------------------------
+# Adressen und sync_state
+# ---------------------------------------------------------------------------
+def parse_ga(address) -> int | None:
+    """GA (3-stufig, 2-stufig oder frei) -> 16-Bit-Rohwert; None wenn ungueltig."""
+    text = str(address).strip()
+    m = GA_THREE_LEVEL.match(text)
+    if m:
+        main, middle, sub = (int(x) for x in m.groups())
+        if main <= 31 and middle <= 7 and sub <= 255:
+            return (main << 11) | (middle << 8) | sub
+        return None
+    m = GA_TWO_LEVEL.match(text)
+    if m:
+        main, sub = (int(x) for x in m.groups())
+        if main <= 31 and sub <= 2047:
+            return (main << 11) | sub
+        return None
+    if GA_FREE.match(text) and int(text) <= 0xFFFF:
+        return int(text)
+    return None
+
+
+def format_ga(raw: int) -> str:
+    return f"{raw >> 11}/{(raw >> 8) & 0x7}/{raw & 0xFF}"
+
+
+def is_placeholder(address) -> bool:
+    return isinstance(address, str) and bool(PLACEHOLDER.match(address.strip()))
+
+
+def parse_sync_state(value) -> tuple[str, int]:
+    """sync_state -> (modus, minuten). Unbekannte Werte wie der Default."""
+    if value is None or value is True:
+        return "expire", DEFAULT_SYNC_MINUTES
+    if value is False:
+        return "off", 0
+    if isinstance(value, int):
+        return "expire", value
+    text = str(value).strip().lower()
+    if text == "false":
+        return "off", 0
+    if text == "init":
+        return "init", 0
+    if text.isdigit():
+        return "expire", int(text)
+    m = SYNC_PATTERN.match(text)
+    if m:
+        return m.group(1), int(m.group(2))
+    return "expire", DEFAULT_SYNC_MINUTES
+
+
+def reads_per_minute(entity: KnxEntity) -> float:
+    if entity.sync_mode in ("expire", "every") and entity.sync_minutes > 0:
+        return entity.read_addresses / entity.sync_minutes
+    return 0.0
+
+
+def _dpt_for(platform: str, key: str, item: dict) -> str | None:
+    if key in KEY_DPT:
+        return KEY_DPT[key]
+    if key in ("address", "state_address"):
+        if platform in SWITCHING_PLATFORMS:
+            return "1.001" if platform != "binary_sensor" else "1"
+        if platform == "scene":
+            return "17.001"
+        type_ = item.get("type")
+        if isinstance(type_, str):
+            return TYPE_DPT.get(type_.lower())
+    return None
+
+
+def dpts_conflict(a: str, b: str) -> bool:
+    """Unterschiedliche Hauptgruppe oder (beide genau angegeben) Untertyp.
+
+    Bei DPT 1 zaehlt nur die Hauptgruppe -- der Untertyp ergibt sich dort aus
+    der Plattform und ist nur geschaetzt.
+    """
+    main_a, _, sub_a = a.partition(".")
+    main_b, _, sub_b = b.partition(".")
+    if main_a != main_b:
+        return True
+    return main_a != "1" and bool(sub_a and sub_b and sub_a != sub_b)
+
+
+def extract_knx(content) -> tuple[list[tuple], list[tuple]]:
+    """(adressen, entities) eines Packages als einfache Tupel (cachebar, ohne Datei).
+
+    adressen: (plattform, name, key, adresse, dpt, gelesen)
+    entities: (plattform, name, sync_modus, sync_minuten, status_gas)
+    """
+    addresses, entities = [], []
+    if not isinstance(content, dict) or not isinstance(content.get("knx"), dict):
+        return addresses, entities
+    for platform, items in content["knx"].items():
+        if not isinstance(items, list):
+            continue
+        for i, item in enumerate(items):
+            if not isinstance(item, dict):
+                continue
+            name = item.get("name") or item.get("entity_id") or f"{platform}[{i}]"
+            name = str(name)
+            read_count = 0
+            for key, value in item.items():
+                if not (key == "address" or key.endswith("_address")):
+                    continue
+                read = key in READ_KEYS or key.endswith("_state_address")
+                values = value if isinstance(value, list) else [value]
+                for n, address in enumerate(values):
+                    if address is None:
+                        continue
+                    addresses.append((platform, name, key, str(address),
+                                      _dpt_for(platform, key, item), read))
+                    # Nur die erste GA einer Liste wird gelesen, der Rest ist passiv
+                    if read and n == 0:
+                        read_count += 1
+            if platform == "expose":
+                continue
+            mode, minutes = parse_sync_state(item.get("sync_state"))
+            entities.append((platform, name, mode, minutes, read_count))
+    return addresses, entities
+
+
+# ---------------------------------------------------------------------------
+# Pass ueber das gemeinsame Dokument-Modell
+# ---------------------------------------------------------------------------
+class KnxReport:
+    """GA-Index und Befunde ueber alle Packages."""
+
+    def __init__(self):
+        self.index = defaultdict(list)          # GA-Rohwert -> [KnxAddress, ...]
+        self.entities = []
+        self.placeholders = []                  # [KnxAddress, ...]
+        self.invalid = []                       # [KnxAddress, ...]
+        self.duplicates = {}                    # GA -> [KnxAddress, ...] (geschrieben)
+        self.shared_states = {}                 # GA -> [KnxAddress, ...] (nur gelesen)
+        self.conflicts = {}                     # GA -> [KnxAddress, ...]
+
+    @property
+    def every_load(self) -> float:
+        return sum(reads_per_minute(e) for e in self.entities if e.sync_mode == "every")
+
+    @property
+    def expire_load(self) -> float:
+        return sum(reads_per_minute(e) for e in self.entities if e.sync_mode == "expire")
+
+    @property
+    def init_reads(self) -> int:
+        return sum(e.read_addresses for e in self.entities if e.sync_mode != "off")
+
+
+def index_pass(documents: list[PackageDocument], report: KnxReport):
+    """Baut den GA-Index und sucht Kollisionen."""
+    for doc in documents:
+        if doc.ok and doc.content is not None:
+            add_file(report, doc.name, doc.memo("knx", lambda: extract_knx(doc.content)))
+    find_collisions(report)
+
+
+def add_file(report: KnxReport, fname: str, extracted):
+    """Nimmt das Ergebnis von extract_knx() einer Datei in den Index auf."""
+    addresses, entities = extracted
+    for entry in addresses:
+        use = KnxAddress(fname, *entry)
+        raw = parse_ga(use.address)
+        if raw is not None:
+            report.index[raw].append(use)
+        elif is_placeholder(use.address):
+            report.placeholders.append(use)
+        else:
+            report.invalid.append(use)
+    report.entities.extend(KnxEntity(fname, *entry) for entry in entities)
+
+
+def find_collisions(report: KnxReport):
+    """Doppelt geschriebene GAs, geteilte Status-GAs und DPT-Konflikte."""
+    for raw, uses in report.index.items():
+        owners = {(u.file, u.platform, u.name) for u in uses}
+        if len(owners) > 1:
+            writers = {(u.file, u.platform, u.name) for u in uses if not u.read}
+            if len(writers) > 1:
+                report.duplicates[raw] = uses
+            elif not writers:
+                report.shared_states[raw] = uses
+        if has_dpt_conflict(uses):
+            report.conflicts[raw] = uses
+
+
+def has_dpt_conflict(uses: list[KnxAddress]) -> bool:
+    dpts = [u.dpt for u in uses if u.dpt]
+    return any(dpts_conflict(dpts[0], d) for d in dpts[1:])
+
+
+def _describe(use: KnxAddress) -> str:
+    return f"{use.file}: {use.platform} '{use.name}' {use.key}" + (f" (DPT {use.dpt})"
+                                                                  if use.dpt else "")
+
+
+def invalid_ga_message(use: KnxAddress) -> str:
+    return f"KNX {use.platform} '{use.name}': ungueltige GA {use.key}: '{use.address}'"
+
+
+def conflict_message(raw: int, uses: list[KnxAddress]) -> str:
+    return (f"KNX GA {format_ga(raw)} mit widerspruechlichen DPTs: "
+            + "; ".join(_describe(u) for u in uses))
+
+
+def knx_pass(documents: list[PackageDocument], result,
+             max_reads_per_minute: float = DEFAULT_MAX_READS_PER_MINUTE) -> KnxReport:
+    """KNX-Pruefung fuer yaml_validator/run_tests (result: ValidationResult)."""
+    report = KnxReport()
+    index_pass(documents, report)
+    report_findings(report, result, max_reads_per_minute)
+    return report
+
+
+def report_findings(report: KnxReport, result,
+                    max_reads_per_minute: float = DEFAULT_MAX_READS_PER_MINUTE):
+    """Befunde eines fertigen Index als Fehler/Warnungen in result eintragen."""
+    for use in report.invalid:
+        result.error(use.file, invalid_ga_message(use))
+    for raw, uses in sorted(report.conflicts.items()):
+        result.error(uses[0].file, conflict_message(raw, uses))
+    for raw, uses in sorted(report.duplicates.items()):
+        writers = [u for u in uses if not u.read]
+        result.warn(writers[0].file, f"KNX GA {format_ga(raw)} wird von {len(writers)} "
+                                     f"Entities geschrieben: "
+                                     + "; ".join(_describe(u) for u in writers))
+    per_file = defaultdict(int)
+    for use in report.placeholders:
+        per_file[use.file] += 1
+    for fname, count in per_file.items():
+        result.warn(fname, f"{count} KNX-Platzhalter-GA(s) (x/x/x) -- aus ETS-Export ergaenzen")
+    if report.every_load > max_reads_per_minute:
+        result.warn("knx", f"sync_state 'every' erzeugt {report.every_load:.1f} Lesungen/Min. "
+                           f"(Grenze {max_reads_per_minute:g}) -- 'bash ha knx' fuer Details")
+
+
+# ---------------------------------------------------------------------------
+# Report
+# ---------------------------------------------------------------------------
+def print_report(total: int, report: KnxReport, top: int = 10,
+                 max_reads_per_minute: float = DEFAULT_MAX_READS_PER_MINUTE) -> int:
+    print(f"\n{'='*60}")
+    print(f"  KNX-Analyse -- {total} Datei(en)")
+    print(f"{'='*60}")
+    uses = sum(len(u) for u in report.index.values())
+    print(f"\n  {len(report.entities)} Entities, {len(report.index)} GAs "
+          f"({uses} Verwendungen), {len(report.placeholders)} Platzhalter")
+
+    if report.invalid:
+        print(f"\n  FEHLER: Ungueltige GAs ({len(report.invalid)}):")
+        for use in report.invalid:
+            print(f"    '{use.address}'  {_describe(use)}")
+    if report.conflicts:
+        print(f"\n  FEHLER: Widerspruechliche DPTs ({len(report.conflicts)}):")
+        for raw, group in sorted(report.conflicts.items()):
+            print(f"    {format_ga(raw)}")
+            for use in group:
+                print(f"      {_describe(use)}")
+    if report.duplicates:
+        print(f"\n  WARNUNG: Mehrfach geschriebene GAs ({len(report.duplicates)}):")
+        for raw, group in sorted(report.duplicates.items()):
+            print(f"    {format_ga(raw)}")
+            for use in group:
+                print(f"      {_describe(use)}")
+    if report.shared_states:
+        print(f"\n  Info: Geteilte Status-GAs ({len(report.shared_states)}):")
+        for raw, group in sorted(report.shared_states.items()):
+            names = ", ".join(f"{u.platform} '{u.name}'" for u in group)
+            print(f"    {format_ga(raw):<10} {names}")
+
+    print(f"\n  Buslast durch sync_state (Lesungen pro Minute):")
+    print(f"    every  (periodisch)        {report.every_load:8.2f}")
+    print(f"    expire (max., Bus ruhig)   {report.expire_load:8.2f}")
+    print(f"    Init beim HA-Start         {report.init_reads:8d} Lesungen")
+    modes = defaultdict(int)
+    for e in report.entities:
+        modes[e.sync_mode] += 1
+    print(f"    Entities: " + ", ".join(f"{m} {n}" for m, n in sorted(modes.items())))
+    loaded = sorted((e for e in report.entities if reads_per_minute(e) > 0),
+                    key=lambda e: -reads_per_minute(e))
+    if loaded and top:
+        print(f"\n  Groesste Verursacher:")
+        for e in loaded[:top]:
+            sync = f"{e.sync_mode} {e.sync_minutes}"
+            print(f"    {reads_per_minute(e):6.2f}/Min  {sync:<10} {e.file}: {e.platform} '{e.name}'")
+
+    failed = bool(report.invalid or report.conflicts)
+    if report.every_load > max_reads_per_minute:
+        print(f"\n  WARNUNG: 'every'-Last ueber {max_reads_per_minute:g} Lesungen/Min. -- "
+              f"Intervalle verlaengern oder 'expire' nutzen.")
+    print(f"\n  ERGEBNIS: {'FEHLGESCHLAGEN' if failed else 'BESTANDEN'}")
+    print(f"{'='*60}\n")
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="KNX GA-Index und sync_state-Buslast")
+    parser.add_argument("files", nargs="*", help="YAML-Dateien (Default: alle Packages)")
+    parser.add_argument("--packages-dir", "-d", default=str(DEFAULT_PACKAGES_DIR),
+                        help="Packages-Verzeichnis (Default: packages/)")
+    parser.add_argument("--ga", action="append", default=[],
+                        help="Verwendungen dieser GA anzeigen (mehrfach moeglich)")
+    parser.add_argument("--top", type=int, default=10,
+                        help="Anzahl der groessten Last-Verursacher (Default: 10)")
+    parser.add_argument("--max-reads", type=float, default=DEFAULT_MAX_READS_PER_MINUTE,
+                        help="Warngrenze fuer 'every'-Lesungen pro Minute (Default: 60)")
+    add_loader_arguments(parser)
+    args = parser.parse_args()
+
+    files = collect_files(args.files, args.packages_dir)
+    if not files:
+        print("Keine YAML-Dateien gefunden.")
+        return 0
+    cache = open_cache(not args.no_cache)
+    documents = load_documents(files, cache, args.jobs)
+    report = KnxReport()
+    index_pass(documents, report)
+    save_documents(documents, cache)
+
+    if args.ga:
+        for address in args.ga:
+            raw = parse_ga(address)
+            if raw is None:
+                print(f"  '{address}' ist keine gueltige GA.")
+                continue
+            uses = report.index.get(raw, [])
+            print(f"  {format_ga(raw)}: {len(uses)} Verwendung(en)")
+            for use in uses:
+                print(f"    {'liest' if use.read else 'schreibt':<9} {_describe(use)}")
+        return 0
+    return print_report(len(files), report, args.top, args.max_reads)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""Inkrementeller Analyzer fuer home-assistant.log (bash ha errors).
+
+Liest das Log ab einem gespeicherten Byte-Offset (Checkpoint), also nur neue
+Zeilen, zeilenweise und ohne das Log in den Speicher zu laden. Eine
+Log-Rotation (HA benennt beim Start home-assistant.log in .log.1 um) wird
+ueber einen Fingerprint der ersten Zeile und die Dateigroesse erkannt.
+
+Jeder Record (Kopfzeile + Folgezeilen, z.B. Tracebacks) wird zerlegt in
+Level, Logger, Komponente und erwaehnte Entity-IDs. Rollierende Aggregate
+(Anzahl pro Level, pro Integration, pro Entity, pro Meldung; erstes/letztes
+Auftreten) werden zusammen mit dem Checkpoint in .cache/log_state.json
+gespeichert.
+
+Nutzung:
+  python tools/log_analyzer.py scan home-assistant.log      # Lokale Kopie
+  python tools/log_analyzer.py checkpoint --source remote   # "<offset> <fingerprint>"
+  ... | python tools/log_analyzer.py stream --source remote # Neue Bytes von stdin
+  python tools/log_analyzer.py report [--source ...] [--level WARNING]
+"""
+
+import os
+import re
+import sys
+import json
+import hashlib
+import argparse
+import tempfile
+from pathlib import Path
+
+from ha_yaml import PROJECT_DIR
+from entity_reference_checker import ENTITY_PATTERN, VALID_DOMAINS, is_service_call
+
+# Windows-Encoding fix: UTF-8 erzwingen
+if sys.stdout.encoding != "utf-8":
+    sys.stdout.reconfigure(encoding="utf-8")
+
+DEFAULT_STATE_PATH = PROJECT_DIR / ".cache" / "log_state.json"
+STATE_VERSION = 1
+
+# 2024-01-15 10:23:45.123 ERROR (MainThread) [homeassistant.components.knx] Text
+RECORD_PATTERN = re.compile(
+    rb"^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)(?:\.\d+)? +"
+    rb"(DEBUG|INFO|WARNING|ERROR|CRITICAL|FATAL) +\(([^)]*)\) +\[([^\]]+)\] ?(.*)$"
+)
+LEVELS = ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL", "FATAL"]
+# Zahlen, Hex-IDs und Quoted-Strings aus Meldungen entfernen -> Gruppierung
+_VOLATILE = re.compile(r"0x[0-9a-f]+|\d+(?:\.\d+)?|'[^']*'|\"[^\"]*\"")
+MAX_MESSAGES = 2000
+MAX_GROUP_ENTITIES = 20
+
+
+def fingerprint(first_line: bytes) -> str:
+    """Kennung einer Log-Datei: SHA-256 ueber die erste Zeile inkl. Newline.
+
+    Entspricht `head -n 1 | sha256sum` auf dem Server.
+    """
+    return hashlib.sha256(first_line).hexdigest()
+
+
+def component_of(logger: str) -> str:
+    parts = logger.split(".")
+    if parts[0] == "homeassistant" and len(parts) > 2 and parts[1] == "components":
+        return parts[2]
+    if parts[0] == "custom_components" and len(parts) > 1:
+        return parts[1]
+    return ".".join(parts[:2])
+
+
+def message_signature(message: str) -> str:
+    return _VOLATILE.sub("#", message)[:160]
+
+
+def entities_in(text: str) -> set[str]:
+    if "." not in text:
+        return set()
+    found = set()
+    for m in ENTITY_PATTERN.finditer(text):
+        entity = m.group(1)
+        if entity.split(".")[0] in VALID_DOMAINS and not is_service_call(entity):
+            found.add(entity)
+    return found
+
+
+# ---------------------------------------------------------------------------
+# Aggregate
+# ---------------------------------------------------------------------------
+def _bump(table: dict, key: str, level: str, ts: str):
+    entry = table.setdefault(key, {"levels": {}, "first": ts, "last": ts})
+    entry["levels"][level] = entry["levels"].get(level, 0) + 1
+    entry["last"] = ts
+
+
+class LogSource:
+    """Checkpoint und Aggregate einer Log-Quelle (lokale Datei oder Server)."""
+
+    def __init__(self, data: dict | None = None):
+        data = data or {}
+        self.offset = data.get("offset", 0)
+        self.fingerprint = data.get("fingerprint")
+        self.records = data.get("records", 0)
+        self.levels = data.get("levels", {})
+        self.components = data.get("components", {})
+        self.entities = data.get("entities", {})
+        self.messages = data.get("messages", {})
+        self.rotations = data.get("rotations", 0)
+        # Nur dieser Lauf: Meldungen >= min_level, gruppiert beim Lesen
+        self.min_level = "DEBUG"
+        self.new_records = 0
+        self.new_matching = 0
+        self.new_groups = {}   # (level, component, signatur) -> [anzahl, ts, beispiel, entities]
+        self.orphans = 0       # Folgezeilen ohne Kopfzeile am Anfang eines Laufs
+
+    def to_dict(self) -> dict:
+        return {"offset": self.offset, "fingerprint": self.fingerprint,
+                "records": self.records, "levels": self.levels,
+                "components": self.components, "entities": self.entities,
+                "messages": self.messages, "rotations": self.rotations}
+
+    def rotated(self, new_fingerprint: str):
+        if self.offset and new_fingerprint != self.fingerprint:
+            self.rotations += 1
+        self.fingerprint = new_fingerprint
+        self.offset = 0
+
+    def add(self, ts: str, level: str, logger: str, message: str, extra: list[str]):
+        component = component_of(logger)
+        entities = entities_in(message)
+        for line in extra:
+            entities |= entities_in(line)
+        self.records += 1
+        self.levels[level] = self.levels.get(level, 0) + 1
+        _bump(self.components, component, level, ts)
+        for entity in entities:
+            _bump(self.entities, entity, level, ts)
+        if LEVELS.index(level) >= LEVELS.index("WARNING"):
+            sig = f"{level} [{component}] {message_signature(message)}"
+            entry = self.messages.setdefault(sig, {"count": 0, "first": ts, "last": ts,
+                                                   "level": level, "component": component,
+                                                   "example": message[:300]})
+            entry["count"] += 1
+            entry["last"] = ts
+            if len(self.messages) > MAX_MESSAGES:
+                self._trim_messages()
+        self.new_records += 1
+        if LEVELS.index(level) >= LEVELS.index(self.min_level):
+            self.new_matching += 1
+            key = (level, component, message_signature(message))
+            group = self.new_groups.setdefault(key, [0, ts, message[:300], set()])
+            group[0] += 1
+            group[1] = ts
+            for entity in sorted(entities):
+                if len(group[3]) >= MAX_GROUP_ENTITIES:
+                    break
+                group[3].add(entity)
+
+    def _trim_messages(self):
+        """Seltene, lange nicht gesehene Meldungen verwerfen."""
+        ranked = sorted(self.messages.items(), key=lambda kv: (kv[1]["count"], kv[1]["last"]))
+        for sig, _ in ranked[:len(self.messages) - MAX_MESSAGES * 3 // 4]:
+            del self.messages[sig]
+
+    def consume(self, lines, start: int) -> int:
+        """Verarbeitet vollstaendige Zeilen ab Byte-Offset start.
+
+        Eine unvollstaendige letzte Zeile (noch im Schreiben) wird nicht
+        verbraucht; der Offset bleibt davor stehen. Folgezeilen vor der
+        ersten Kopfzeile gehoeren zu einem Record des letzten Laufs und
+        werden nur gezaehlt.
+        """
+        offset = start
+        current = None
+        for raw in lines:
+            if not raw.endswith(b"\n"):
+                break
+            offset += len(raw)
+            m = RECORD_PATTERN.match(raw.rstrip(b"\r\n"))
+            if m:
+                if current is not None:
+                    self.add(*current)
+                ts, level, _, logger, message = (g.decode("utf-8", "replace") for g in m.groups())
+                current = (ts, level, logger, message, [])
+            elif current is not None:
+                current[4].append(raw.decode("utf-8", "replace"))
+            elif raw.strip():
+                self.orphans += 1
+        if current is not None:
+            self.add(*current)
+        self.offset = offset
+        return offset - start
+
+
+class LogState:
+    """Alle Quellen, persistiert als JSON."""
+
+    def __init__(self, path: Path = DEFAULT_STATE_PATH):
+        self.path = path
+        self.sources = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == STATE_VERSION:
+            self.sources = {k: LogSource(v) for k, v in data.get("sources", {}).items()}
+
+    def source(self, name: str) -> LogSource:
+        return self.sources.setdefault(name, LogSource())
+
+    def reset(self, name: str):
+        self.sources[name] = LogSource()
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {"version": STATE_VERSION,
+                "sources": {k: v.to_dict() for k, v in self.sources.items()}}
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp, self.path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+
+# ---------------------------------------------------------------------------
+# Eingaben
+# ---------------------------------------------------------------------------
+def _first_line(filepath: Path) -> bytes:
+    with open(filepath, "rb") as f:
+        return f.readline()
+
+
+def scan_file(source: LogSource, filepath: Path) -> tuple[int, bool]:
+    """Liest neue Bytes einer lokalen Log-Datei; (bytes, rotiert)."""
+    current = fingerprint(_first_line(filepath))
+    size = filepath.stat().st_size
+    rotated = current != source.fingerprint or size < source.offset
+    if rotated and source.offset:
+        # Rest der alten Datei lesen, falls sie als .1 noch daliegt
+        previous = filepath.with_name(filepath.name + ".1")
+        if previous.is_file() and fingerprint(_first_line(previous)) == source.fingerprint:
+            with open(previous, "rb") as f:
+                f.seek(source.offset)
+                source.consume(f, source.offset)
+    if rotated:
+        known = source.offset > 0
+        source.rotated(current)
+        rotated = known
+    with open(filepath, "rb") as f:
+        f.seek(source.offset)
+        return source.consume(f, source.offset), rotated
+
+
+def scan_stream(source: LogSource, stream) -> tuple[int, bool]:
+    """Liest "<offset> <fingerprint>\\n" gefolgt von den Log-Bytes ab offset.
+
+    offset 0 mit neuem Fingerprint bedeutet: Datei wurde rotiert.
+    """
+    header = stream.readline().decode("ascii").split()
+    offset, current = int(header[0]), header[1]
+    rotated = False
+    if offset != source.offset or current != source.fingerprint:
+        rotated = source.offset > 0
+        source.rotated(current)
+    return source.consume(stream, offset), rotated
+
+
+# ---------------------------------------------------------------------------
+# Ausgabe
+# ---------------------------------------------------------------------------
+def _count(entry: dict, min_level: str) -> int:
+    threshold = LEVELS.index(min_level)
+    return sum(n for lvl, n in entry["levels"].items() if LEVELS.index(lvl) >= threshold)
+
+
+def print_report(source: LogSource, name: str, read: int, rotated: bool,
+                 min_level: str, top: int, new_only: bool):
+    print(f"\n{'='*60}")
+    print(f"  HA Log-Analyse -- {name}")
+    print(f"{'='*60}")
+    if rotated:
+        print("  Log-Rotation erkannt -- neue Datei wird von vorne gelesen.")
+    print(f"  {read/1024:.1f} KiB neu gelesen, {source.new_records} Record(s), "
+          f"davon {source.new_matching} >= {min_level}")
+
+    if source.new_groups or source.orphans:
+        print(f"\n  Neu seit letztem Lauf:")
+        for (level, component, _), (count, ts, message, entities) in sorted(
+                source.new_groups.items(), key=lambda kv: -kv[1][0])[:top]:
+            print(f"    {count:4d}x {level:<8} [{component}] {message[:100]}")
+            print(f"          zuletzt {ts}" + (f", Entities: {', '.join(sorted(entities))}"
+                                              if entities else ""))
+        if source.orphans:
+            print(f"    {source.orphans:4d}x (unzugeordnete Folgezeilen)")
+    else:
+        print(f"\n  Keine neuen Meldungen >= {min_level}.")
+
+    if new_only:
+        return
+
+    components = [(c, e) for c, e in source.components.items() if _count(e, min_level)]
+    if components:
+        print(f"\n  Integrationen (gesamt, >= {min_level}):")
+        for comp, entry in sorted(components, key=lambda ce: -_count(ce[1], min_level))[:top]:
+            print(f"    {_count(entry, min_level):6d}  {comp:<28} "
+                  f"{entry['first']} .. {entry['last']}")
+    entities = [(e, d) for e, d in source.entities.items() if _count(d, min_level)]
+    if entities:
+        print(f"\n  Entities (gesamt, >= {min_level}):")
+        for entity, entry in sorted(entities, key=lambda ed: -_count(ed[1], min_level))[:top]:
+            print(f"    {_count(entry, min_level):6d}  {entity:<40} zuletzt {entry['last']}")
+    levels = ", ".join(f"{lvl} {source.levels[lvl]}" for lvl in LEVELS if lvl in source.levels)
+    print(f"\n  Gesamt: {source.records} Record(s) ({levels or '-'}), "
+          f"{source.rotations} Rotation(en)")
+    print(f"{'='*60}\n")
+
+
+# ---------------------------------------------------------------------------
+# Main
+# ---------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="HA Log-Analyzer (inkrementell)")
+    parser.add_argument("--state", default=str(DEFAULT_STATE_PATH),
+                        help="Checkpoint/Aggregate (Default: .cache/log_state.json)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_report_arguments(p):
+        p.add_argument("--level", default="ERROR", choices=LEVELS,
+                       help="Minimales Level fuer die Ausgabe (Default: ERROR)")
+        p.add_argument("--top", type=int, default=15, help="Eintraege pro Liste")
+        p.add_argument("--new-only", action="store_true",
+                       help="Nur neue Meldungen, keine Gesamt-Aggregate")
+
+    p = sub.add_parser("scan", help="Lokale Log-Datei ab Checkpoint lesen")
+    p.add_argument("logfile")
+    p.add_argument("--reset", action="store_true", help="Checkpoint + Aggregate verwerfen")
+    add_report_arguments(p)
+
+    p = sub.add_parser("stream", help="Neue Log-Bytes von stdin (Header: offset fingerprint)")
+    p.add_argument("--source", default="remote")
+    add_report_arguments(p)
+
+    p = sub.add_parser("checkpoint", help="Checkpoint einer Quelle ausgeben")
+    p.add_argument("--source", default="remote")
+    p.add_argument("--reset", action="store_true")
+
+    p = sub.add_parser("report", help="Nur Aggregate ausgeben")
+    p.add_argument("--source", default="remote")
+    add_report_arguments(p)
+    args = parser.parse_args()
+
+    state = LogState(Path(args.state))
+
+    if args.command == "checkpoint":
+        if args.reset:
+            state.reset(args.source)
+            state.save()
+        source = state.source(args.source)
+        print(f"{source.offset} {source.fingerprint or '-'}")
+        return 0
+
+    if args.command == "scan":
+        name = str(Path(args.logfile).resolve())
+        if args.reset:
+            state.reset(name)
+        source = state.source(name)
+        source.min_level = args.level
+        read, rotated = scan_file(source, Path(args.logfile))
+    elif args.command == "stream":
+        name = args.source
+        source = state.source(name)
+        source.min_level = args.level
+        read, rotated = scan_stream(source, sys.stdin.buffer)
+    else:
+        name = args.source
+        source = state.source(name)
+        read, rotated = 0, False
+
+    state.save()
+    print_report(source, name, read, rotated, args.level, args.top, args.new_only)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""Regel-Engine fuer Entity-Namenskonventionen.
+
+Alle Umlaut-Regeln und ihre False-Positive-Woerter werden zu EINER Regex
+zusammengefasst. Pro Entity-ID reicht damit ein finditer()-Lauf, egal wie
+viele Umlaut-Regeln aktiv sind:
+
+  (?P<fp>feuer|steuer|...) | (?P<r0>ae) | (?P<r1>oe) | ...
+
+False-Positive-Woerter stehen vorne in der Alternation und verbrauchen ihren
+Text -- ein 'ue' in 'feuer' wird so nie als Regel-Treffer gemeldet, ein 'ue'
+an anderer Stelle derselben ID aber schon.
+
+Zusaetzliche Muster laufen jeweils als eigene Regex: in der gemeinsamen
+Alternation wuerden die False-Positive-Woerter (steuer in heizungssteuerung)
+ihren Text verbrauchen und ein ueberlappendes Muster stillschweigend
+verdecken.
+
+Zusaetzliche Regeln (Raum-Praefixe fuer das Schema domain_raum_funktion,
+eigene Muster) kommen aus naming_rules.yaml im Projektverzeichnis oder einer
+per --rules angegebenen Datei. Vorlage: naming_rules.example.yaml.
+"""
+
+import re
+import yaml
+from pathlib import Path
+
+from ha_yaml import PROJECT_DIR
+
+DEFAULT_RULES_FILE = PROJECT_DIR / "naming_rules.yaml"
+
+# ---------------------------------------------------------------------------
+# Umlaut-Pruefregeln (Default, per Config erweiterbar)
+# ---------------------------------------------------------------------------
+UMLAUT_MISTAKES = [
+    ("ae", "a", "ae->a", ["praesenz", "waerme", "kaelte", "laenge", "naehe"]),
+    ("oe", "o", "oe->o", ["oeffn", "hoehe", "groesse"]),
+    ("ue", "u", "ue->u", ["kuech", "tuere", "lueft", "gruess", "schluessel"]),
+]
+
+# Woerter wo ae/oe/ue natuerlich vorkommt (kein Umlaut-Fehler)
+UMLAUT_FALSE_POSITIVES = {
+    "ae": ["aero", "israel"],
+    "oe": ["does", "poet", "goes"],
+    "ue": ["feuer", "steuer", "neuer", "teuer", "quer", "queue", "blue", "true",
+           "muell", "blaue", "graue", "value", "aktuelle"],
+}
+
+
+class NamingRules:
+    """Kompilierte Namensregeln. check() liefert alle Warnungen einer ID."""
+
+    def __init__(self, umlaut_mistakes=UMLAUT_MISTAKES,
+                 false_positives=UMLAUT_FALSE_POSITIVES,
+                 patterns: list[dict] | None = None,
+                 rooms: list[str] | None = None,
+                 scheme_domains: list[str] | None = None):
+        self._umlaut = list(umlaut_mistakes)
+        self._patterns = list(patterns or [])
+
+        fp_words = sorted({w.lower() for words in false_positives.values() for w in words},
+                          key=len, reverse=True)
+        parts = []
+        if fp_words:
+            parts.append("(?P<fp>" + "|".join(map(re.escape, fp_words)) + ")")
+        for i, (wrong, _, _, _) in enumerate(self._umlaut):
+            parts.append(f"(?P<r{i}>{re.escape(wrong.lower())})")
+        self._combined = re.compile("|".join(parts)) if parts else None
+        self._compiled = [(re.compile(rule["pattern"]), rule) for rule in self._patterns]
+
+        # Schema domain_raum_funktion: object_id beginnt mit bekanntem Raum
+        self._scheme_domains = set(scheme_domains or [])
+        self._scheme = None
+        if rooms:
+            alternation = "|".join(map(re.escape, sorted(rooms, key=len, reverse=True)))
+            self._scheme = re.compile(rf"(?:{alternation})_[a-z0-9]")
+
+        self._memo = {}
+
+    @classmethod
+    def from_file(cls, path: Path) -> "NamingRules":
+        """Default-Regeln plus Ergaenzungen aus einer YAML-Config."""
+        with open(path, "r", encoding="utf-8") as f:
+            config = yaml.safe_load(f) or {}
+
+        umlaut_cfg = config.get("umlaut") or {}
+        mistakes = list(UMLAUT_MISTAKES)
+        for rule in umlaut_cfg.get("mistakes") or []:
+            wrong, correct = rule["wrong"], rule["correct"]
+            mistakes.append((wrong, correct, rule.get("rule", f"{wrong}->{correct}"), []))
+        false_positives = {k: list(v) for k, v in UMLAUT_FALSE_POSITIVES.items()}
+        for key, words in (umlaut_cfg.get("false_positives") or {}).items():
+            false_positives.setdefault(key, []).extend(words)
+
+        scheme = config.get("schema") or {}
+        return cls(
+            umlaut_mistakes=mistakes,
+            false_positives=false_positives,
+            patterns=config.get("patterns") or [],
+            rooms=scheme.get("rooms") or [],
+            scheme_domains=scheme.get("domains") or [],
+        )
+
+    def check(self, entity_id: str) -> tuple[list[str], list[str]]:
+        """(umlaut_warnungen, schema_warnungen) fuer eine Entity-ID."""
+        cached = self._memo.get(entity_id)
+        if cached is None:
+            cached = self._memo[entity_id] = self._check(entity_id)
+        return cached
+
+    def _check(self, entity_id: str) -> tuple[list[str], list[str]]:
+        umlaut, naming = [], []
+        lower = entity_id.lower()
+        domain, _, object_id = lower.partition(".")
+
+        if self._combined is not None:
+            for m in self._combined.finditer(lower):
+                group = m.lastgroup
+                if group == "fp":
+                    continue
+                idx = m.start()
+                context = lower[max(0, idx-3):m.end()+3]
+                wrong, correct, rule, _ = self._umlaut[int(group[1:])]
+                umlaut.append(
+                    f"Umlaut-Verdacht ({rule}): '{entity_id}' enthaelt '{wrong}' "
+                    f"(Kontext: ...{context}...) -- sollte '{correct}' sein?"
+                )
+
+        for pattern, rule in self._compiled:
+            domains = rule.get("domains")
+            if domains and domain not in domains:
+                continue
+            for m in pattern.finditer(lower):
+                context = lower[max(0, m.start()-3):m.end()+3]
+                naming.append(
+                    f"Namensregel: '{entity_id}' -- {rule.get('message', rule['pattern'])} "
+                    f"(Kontext: ...{context}...)"
+                )
+
+        if self._scheme is not None and domain in self._scheme_domains:
+            if not self._scheme.match(object_id):
+                naming.append(
+                    f"Namensschema (domain_raum_funktion): '{entity_id}' "
+                    f"beginnt nicht mit einem bekannten Raum"
+                )
+        return umlaut, naming
+
+
+def load_rules(path: str | None = None) -> NamingRules:
+    """Regeln aus --rules, sonst naming_rules.yaml, sonst Defaults."""
+    if path:
+        return NamingRules.from_file(Path(path))
+    if DEFAULT_RULES_FILE.is_file():
+        return NamingRules.from_file(DEFAULT_RULES_FILE)
+    return NamingRules()
+
+
+DEFAULT_RULES = NamingRules()
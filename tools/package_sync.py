@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""Delta-Sync fuer HA-Packages (bash ha push-delta / pull-delta).
+
+Vergleicht ein Manifest der Server-Packages (SHA-256 pro Datei, Format wie
+`sha256sum`) mit den lokalen Packages. Das Server-Manifest kommt mit EINEM
+Aufruf (`find ... -exec sha256sum {} +`), uebertragen werden danach nur
+neue, geaenderte und -- auf Wunsch -- geloeschte Dateien.
+
+Nutzung:
+  python tools/package_sync.py manifest packages/
+  python tools/package_sync.py diff --remote remote.sha256 --local packages/ --direction push
+  python tools/package_sync.py diff ... --name-status     # Maschinenlesbar (A/M/D<TAB>pfad)
+"""
+
+import sys
+import hashlib
+import argparse
+from pathlib import Path
+
+from ha_yaml import load_document, DEFAULT_PACKAGES_DIR
+
+# Windows-Encoding fix: UTF-8 erzwingen
+if sys.stdout.encoding != "utf-8":
+    sys.stdout.reconfigure(encoding="utf-8")
+
+ADDED, MODIFIED, DELETED = "A", "M", "D"
+STATUS_LABELS = {ADDED: "neu", MODIFIED: "geaendert", DELETED: "geloescht"}
+
+
+def file_hash(filepath: Path) -> str:
+    h = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def local_manifest(root: Path) -> dict[str, str]:
+    """Relativer Pfad -> SHA-256 fuer alle .yaml unterhalb von root."""
+    if not root.is_dir():
+        return {}
+    return {p.relative_to(root).as_posix(): file_hash(p)
+            for p in sorted(root.glob("**/*.yaml")) if p.is_file()}
+
+
+def parse_manifest(lines) -> dict[str, str]:
+    """Liest `sha256sum`-Ausgabe ("<hash>  ./pfad"), ignoriert Leerzeilen."""
+    manifest = {}
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if not line.strip():
+            continue
+        digest, _, path = line.partition(" ")
+        path = path.lstrip(" *")
+        if path.startswith("./"):
+            path = path[2:]
+        manifest[path] = digest.lower()
+    return manifest
+
+
+def diff_manifests(source: dict[str, str], target: dict[str, str]) -> list[tuple[str, str]]:
+    """Aenderungen, die target auf den Stand von source bringen: [(status, pfad)]."""
+    changes = []
+    for path in sorted(source.keys() | target.keys()):
+        if path not in target:
+            changes.append((ADDED, path))
+        elif path not in source:
+            changes.append((DELETED, path))
+        elif source[path] != target[path]:
+            changes.append((MODIFIED, path))
+    return changes
+
+
+def reload_domains(root: Path, changes: list[tuple[str, str]]) -> list[str]:
+    """Top-Level-Domains der uebertragenen Packages (was neu geladen werden muss)."""
+    domains = set()
+    for status, path in changes:
+        if status == DELETED:
+            continue
+        doc = load_document(root / path)
+        if doc.ok and isinstance(doc.content, dict):
+            domains.update(str(k) for k in doc.content)
+    return sorted(domains)
+
+
+def print_changes(changes: list[tuple[str, str]], direction: str, domains: list[str] | None):
+    target = "HA-Server" if direction == "push" else "lokal"
+    if not changes:
+        print(f"  Keine Aenderungen ({target} ist aktuell).")
+        return
+    for status, path in changes:
+        print(f"  {STATUS_LABELS[status]:<10} {path}")
+    counts = {s: sum(1 for c, _ in changes if c == s) for s in STATUS_LABELS}
+    print(f"\n  {counts[ADDED]} neu, {counts[MODIFIED]} geaendert, "
+          f"{counts[DELETED]} geloescht -> {target}")
+    if domains:
+        print(f"  Reload noetig fuer: {', '.join(domains)}")
+
+
+# ---------------------------------------------------------------------------
+# Main
+# ---------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="HA Package Delta-Sync")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_manifest = sub.add_parser("manifest", help="SHA-256-Manifest eines Verzeichnisses")
+    p_manifest.add_argument("directory", nargs="?", default=str(DEFAULT_PACKAGES_DIR))
+
+    p_diff = sub.add_parser("diff", help="Lokale Packages mit Server-Manifest vergleichen")
+    p_diff.add_argument("--remote", required=True,
+                        help="Server-Manifest (sha256sum-Format, '-' = stdin)")
+    p_diff.add_argument("--local", default=str(DEFAULT_PACKAGES_DIR),
+                        help="Lokales Packages-Verzeichnis (Default: packages/)")
+    p_diff.add_argument("--direction", choices=("push", "pull"), default="push",
+                        help="push: Server an lokal angleichen, pull: umgekehrt")
+    p_diff.add_argument("--name-status", action="store_true",
+                        help="Ausgabe als A/M/D<TAB>pfad fuer Scripts")
+    args = parser.parse_args()
+
+    if args.command == "manifest":
+        root = Path(args.directory)
+        for path, digest in local_manifest(root).items():
+            print(f"{digest}  ./{path}")
+        return 0
+
+    if args.remote == "-":
+        remote = parse_manifest(sys.stdin)
+    else:
+        with open(args.remote, "r", encoding="utf-8") as f:
+            remote = parse_manifest(f)
+    root = Path(args.local)
+    local = local_manifest(root)
+
+    if args.direction == "push":
+        changes = diff_manifests(local, remote)
+    else:
+        changes = diff_manifests(remote, local)
+
+    if args.name_status:
+        for status, path in changes:
+            print(f"{status}\t{path}")
+        return 0
+
+    domains = reload_domains(root, changes) if args.direction == "push" else None
+    print_changes(changes, args.direction, domains)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
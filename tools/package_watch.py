@@ -0,0 +1,378 @@
+"""Watch-Modus fuer die HA-Validatoren (yaml_validator.py --watch, bash ha watch).
+
+Bleibt resident, beobachtet packages/ und prueft bei jeder Aenderung nur die
+geaenderten Dateien. Dateiuebergreifender Zustand wird inkrementell gepflegt:
+
+  - Automation-ID -> Dateien (Basis der Duplikat-Pruefung)
+  - Entity-ID -> Dateien
+  - KNX-GA -> Verwendungen (ungueltige GAs, DPT-Konflikte wie knx_pass)
+
+Beim Aendern/Loeschen einer Datei werden nur deren Eintraege entfernt und neu
+eingetragen. Ergebnisse werden pro Datei ausgegeben, sobald sie fertig ist.
+
+Auf Linux wird inotify (per ctypes) genutzt, sonst -- oder mit --poll --
+ein Polling ueber mtime/Groesse.
+"""
+
+import os
+import sys
+import time
+import ctypes
+import ctypes.util
+import select
+import struct
+from collections import defaultdict
+from pathlib import Path
+
+import yaml_validator
+import entity_reference_checker
+from ha_yaml import load_document, save_documents
+from knx_checker import (KnxAddress, conflict_message, extract_knx, format_ga,
+                         has_dpt_conflict, invalid_ga_message, is_placeholder, parse_ga)
+from naming_rules import DEFAULT_RULES
+
+# Nach dem ersten Event so lange sammeln bis es ruhig ist (Editor-Saves)
+DEBOUNCE_SECONDS = 0.2
+
+
+# ---------------------------------------------------------------------------
+# Inkrementeller Zustand
+# ---------------------------------------------------------------------------
+class IncrementalState:
+    """Per-Datei-Ergebnisse plus inkrementelle globale Indizes."""
+
+    def __init__(self, root: Path, cache=None, rules=DEFAULT_RULES):
+        self.root = root
+        self.cache = cache
+        self.rules = rules
+        self.results = {}                       # rel -> ValidationResult
+        self.ids_by_file = {}                   # rel -> [(aid, alias), ...]
+        self.id_map = defaultdict(dict)         # aid -> {rel: [alias, ...]}
+        self.entities_by_file = {}              # rel -> set(entity_id)
+        self.files_by_entity = defaultdict(set) # entity_id -> set(rel)
+        self.duplicates = set()
+        self.knx_by_file = {}                   # rel -> [(ga, KnxAddress), ...]
+        self.ga_map = defaultdict(dict)         # ga -> {rel: [KnxAddress, ...]}
+        self.knx_conflicts = set()
+
+    def rel(self, filepath: Path) -> str:
+        try:
+            return filepath.resolve().relative_to(self.root.resolve()).as_posix()
+        except ValueError:
+            return str(filepath)
+
+    def _remove_entries(self, rel: str) -> tuple[set, set]:
+        """Entfernt die globalen Eintraege einer Datei; liefert betroffene IDs und GAs."""
+        touched = set()
+        touched_gas = set()
+        for raw, _ in self.knx_by_file.pop(rel, []):
+            files = self.ga_map.get(raw)
+            if files is not None:
+                files.pop(rel, None)
+                if not files:
+                    del self.ga_map[raw]
+            touched_gas.add(raw)
+        for aid, _ in self.ids_by_file.pop(rel, []):
+            files = self.id_map.get(aid)
+            if files is not None:
+                files.pop(rel, None)
+                if not files:
+                    del self.id_map[aid]
+            touched.add(aid)
+        for entity in self.entities_by_file.pop(rel, set()):
+            files = self.files_by_entity.get(entity)
+            if files is not None:
+                files.discard(rel)
+                if not files:
+                    del self.files_by_entity[entity]
+        self.results.pop(rel, None)
+        return touched, touched_gas
+
+    def _duplicate_changes(self, touched: set) -> list[tuple[str, list[str] | None]]:
+        """Neu entstandene / behobene Duplikate unter den betroffenen IDs."""
+        changes = []
+        for aid in sorted(touched, key=str):
+            files = self.id_map.get(aid, {})
+            count = sum(len(aliases) for aliases in files.values())
+            if count > 1:
+                self.duplicates.add(aid)
+                changes.append((aid, sorted(files)))
+            elif aid in self.duplicates:
+                self.duplicates.discard(aid)
+                changes.append((aid, None))
+        return changes
+
+    def _conflict_changes(self, touched: set) -> list[tuple[int, list[KnxAddress] | None]]:
+        """Neu entstandene / behobene DPT-Konflikte unter den betroffenen GAs."""
+        changes = []
+        for raw in sorted(touched):
+            uses = [use for rel in sorted(self.ga_map.get(raw, {}))
+                    for use in self.ga_map[raw][rel]]
+            if has_dpt_conflict(uses):
+                self.knx_conflicts.add(raw)
+                changes.append((raw, uses))
+            elif raw in self.knx_conflicts:
+                self.knx_conflicts.discard(raw)
+                changes.append((raw, None))
+        return changes
+
+    def update(self, filepath: Path) -> dict:
+        """Prueft eine Datei neu und aktualisiert alle Indizes."""
+        rel = self.rel(filepath)
+        old_entities = self.entities_by_file.get(rel, set())
+        touched, touched_gas = self._remove_entries(rel)
+
+        if not filepath.exists():
+            return {"rel": rel, "deleted": True, "result": None,
+                    "duplicates": self._duplicate_changes(touched),
+                    "knx_conflicts": self._conflict_changes(touched_gas),
+                    "new_entities": set(), "warnings": []}
+
+        doc = load_document(filepath, self.cache)
+        result = yaml_validator.ValidationResult()
+        yaml_validator.syntax_pass([doc], result)
+        yaml_validator.structure_pass([doc], result)
+        self.results[rel] = result
+
+        ids = []
+        entities = set()
+        knx = ([], [])
+        if doc.ok and doc.content is not None:
+            ids = doc.memo("automation_ids", lambda: yaml_validator._automation_id_pairs(doc))
+            entities = set(doc.memo("entity_ids",
+                                    lambda: entity_reference_checker._sorted_entity_ids(doc.content)))
+            knx = doc.memo("knx", lambda: extract_knx(doc.content))
+            save_documents([doc], self.cache)
+
+        gas = []
+        for entry in knx[0]:
+            use = KnxAddress(doc.name, *entry)
+            raw = parse_ga(use.address)
+            if raw is not None:
+                gas.append((raw, use))
+                self.ga_map[raw].setdefault(rel, []).append(use)
+                touched_gas.add(raw)
+            elif not is_placeholder(use.address):
+                result.error(doc.name, invalid_ga_message(use))
+        self.knx_by_file[rel] = gas
+
+        self.ids_by_file[rel] = list(ids)
+        for aid, alias in ids:
+            self.id_map[aid].setdefault(rel, []).append(alias)
+            touched.add(aid)
+        # Neu = vorher weder in dieser noch in einer anderen Datei referenziert
+        new_entities = {e for e in entities - old_entities if e not in self.files_by_entity}
+        self.entities_by_file[rel] = entities
+        for entity in entities:
+            self.files_by_entity[entity].add(rel)
+
+        warnings = []
+        for entity in sorted(entities):
+            umlaut, naming = self.rules.check(entity)
+            warnings.extend(umlaut + naming)
+
+        return {"rel": rel, "deleted": False, "result": result,
+                "duplicates": self._duplicate_changes(touched),
+                "knx_conflicts": self._conflict_changes(touched_gas),
+                "new_entities": new_entities, "warnings": warnings}
+
+    def expand(self, paths: set[Path]) -> set[Path]:
+        """Entfernte Verzeichnisse durch ihre bisher bekannten Dateien ersetzen."""
+        files = set()
+        for path in paths:
+            if path.suffix == ".yaml":
+                files.add(path)
+                continue
+            prefix = self.rel(path).rstrip("/") + "/"
+            files.update(self.root / rel for rel in self.results if rel.startswith(prefix))
+        return files
+
+    @property
+    def error_count(self) -> int:
+        return (sum(len(r.errors) for r in self.results.values()) + len(self.duplicates)
+                + len(self.knx_conflicts))
+
+
+def print_update(update: dict, elapsed: float):
+    """Gibt das Ergebnis einer Datei sofort aus."""
+    stamp = time.strftime("%H:%M:%S")
+    rel = update["rel"]
+    if update["deleted"]:
+        print(f"[{stamp}] {rel}: geloescht")
+    else:
+        result = update["result"]
+        status = "OK" if result.ok else "FEHLER"
+        print(f"[{stamp}] {rel}: {status} ({elapsed*1000:.1f} ms)")
+        for line in result.errors + result.warnings:
+            print(f"    {line.strip()}")
+        for w in update["warnings"]:
+            print(f"    WARNUNG {w}")
+        if update["new_entities"]:
+            print(f"    Neu referenziert: {', '.join(sorted(update['new_entities']))}")
+    for aid, files in update["duplicates"]:
+        if files is None:
+            print(f"[{stamp}] GLOBAL: Doppelte Automation-ID '{aid}' behoben")
+        else:
+            print(f"[{stamp}] GLOBAL: FEHLER Doppelte Automation-ID '{aid}' in: {', '.join(files)}")
+    for raw, uses in update["knx_conflicts"]:
+        if uses is None:
+            print(f"[{stamp}] GLOBAL: DPT-Konflikt auf KNX GA {format_ga(raw)} behoben")
+        else:
+            print(f"[{stamp}] GLOBAL: FEHLER {conflict_message(raw, uses)}")
+    sys.stdout.flush()
+
+
+# ---------------------------------------------------------------------------
+# Dateisystem-Beobachtung
+# ---------------------------------------------------------------------------
+class PollingWatcher:
+    """Vergleicht (mtime, Groesse) aller .yaml im Intervall."""
+
+    def __init__(self, root: Path, interval: float = 1.0):
+        self.root = root
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self) -> dict:
+        snapshot = {}
+        for path in self.root.glob("**/*.yaml"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            snapshot[path] = (st.st_mtime_ns, st.st_size)
+        return snapshot
+
+    def wait(self) -> set[Path]:
+        while True:
+            time.sleep(self.interval)
+            current = self._scan()
+            changed = {p for p, sig in current.items() if self._snapshot.get(p) != sig}
+            changed |= set(self._snapshot) - set(current)
+            self._snapshot = current
+            if changed:
+                return changed
+
+
+class InotifyWatcher:
+    """inotify ueber ctypes; neue Unterordner werden automatisch beobachtet."""
+
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_IGNORED = 0x8000
+    IN_ISDIR = 0x40000000
+    MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    _HEADER = struct.Struct("iIII")
+
+    def __init__(self, root: Path):
+        libc_name = ctypes.util.find_library("c")
+        if not libc_name:
+            raise OSError("libc nicht gefunden")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError("inotify nicht verfuegbar")
+        self._fd = self._libc.inotify_init1(os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 fehlgeschlagen")
+        self._dirs = {}
+        self._add_tree(root)
+
+    def _add_tree(self, directory: Path):
+        for path in [directory, *(p for p in directory.glob("**/*") if p.is_dir())]:
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), self.MASK)
+            if wd >= 0:
+                self._dirs[wd] = path
+
+    def _remove_tree(self, directory: Path):
+        """Watches eines verschwundenen Verzeichnisses (samt Unterordnern) aufgeben."""
+        for wd, path in list(self._dirs.items()):
+            if path == directory or directory in path.parents:
+                self._libc.inotify_rm_watch(self._fd, wd)
+                del self._dirs[wd]
+
+    def _read(self, changed: set):
+        data = os.read(self._fd, 64 * 1024)
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = self._HEADER.unpack_from(data, offset)
+            offset += self._HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & self.IN_IGNORED:
+                # Watch vom Kernel entfernt (Verzeichnis geloescht)
+                self._dirs.pop(wd, None)
+                continue
+            directory = self._dirs.get(wd)
+            if directory is None or not name:
+                continue
+            path = directory / os.fsdecode(name)
+            if mask & self.IN_ISDIR:
+                if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                    self._add_tree(path)
+                    changed.update(path.glob("**/*.yaml"))
+                elif mask & (self.IN_MOVED_FROM | self.IN_DELETE):
+                    # Verzeichnis selbst melden: der Zustand kennt seine Dateien
+                    self._remove_tree(path)
+                    changed.add(path)
+                continue
+            if path.suffix == ".yaml":
+                changed.add(path)
+
+    def wait(self) -> set[Path]:
+        """Geaenderte .yaml-Dateien plus entfernte Verzeichnisse (siehe expand())."""
+        changed = set()
+        select.select([self._fd], [], [])
+        self._read(changed)
+        # Debounce: weitere Events derselben Speicher-Aktion einsammeln
+        while select.select([self._fd], [], [], DEBOUNCE_SECONDS)[0]:
+            self._read(changed)
+        return changed
+
+
+def make_watcher(root: Path, poll: bool = False, interval: float = 1.0):
+    """inotify wenn moeglich, sonst Polling."""
+    if not poll and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(root)
+        except OSError:
+            pass
+    return PollingWatcher(root, interval)
+
+
+# ---------------------------------------------------------------------------
+# Watch-Schleife
+# ---------------------------------------------------------------------------
+def watch(root: Path, cache=None, rules=DEFAULT_RULES, poll: bool = False,
+          interval: float = 1.0) -> int:
+    """Erstpruefung aller Dateien, danach nur noch Aenderungen."""
+    state = IncrementalState(root, cache, rules)
+    watcher = make_watcher(root, poll, interval)
+    mode = "inotify" if isinstance(watcher, InotifyWatcher) else f"Polling ({interval:g}s)"
+
+    print(f"\n{'='*60}")
+    print(f"  HA YAML Validator -- Watch-Modus ({mode})")
+    print(f"  Packages: {root}")
+    print(f"{'='*60}")
+
+    start = time.perf_counter()
+    for filepath in sorted(root.glob("**/*.yaml")):
+        update = state.update(filepath)
+        if not update["result"].ok or update["duplicates"] or update["knx_conflicts"]:
+            print_update(update, 0.0)
+    print(f"\n  {len(state.results)} Datei(en) geprueft in "
+          f"{(time.perf_counter() - start)*1000:.0f} ms, {state.error_count} Fehler. "
+          f"Warte auf Aenderungen (Strg+C beendet) ...\n")
+    sys.stdout.flush()
+
+    try:
+        while True:
+            for filepath in sorted(state.expand(watcher.wait())):
+                t0 = time.perf_counter()
+                update = state.update(filepath)
+                print_update(update, time.perf_counter() - t0)
+    except KeyboardInterrupt:
+        print("\n  Watch-Modus beendet.")
+    return 0 if state.error_count == 0 else 1
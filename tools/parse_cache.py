@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""Persistenter Parse-Cache fuer die HA-Validatoren.
+
+Speichert pro Datei-Inhalt (SHA-256 ueber Tool-Version + Bytes) den geparsten
+YAML-Inhalt und abgeleitete Daten (Entity-IDs, Automation-IDs). Unveraenderte
+Dateien werden damit nie erneut geparst.
+
+  - Invalidierung: jede Inhaltsaenderung ergibt einen neuen Schluessel,
+    eine neue TOOL_VERSION macht alle alten Eintraege ungueltig.
+  - Eviction: ueberschreitet der Cache max_bytes, werden die am laengsten
+    nicht genutzten Eintraege geloescht.
+
+Nutzung:
+  python tools/parse_cache.py --stats
+  python tools/parse_cache.py --clear
+"""
+
+import os
+import sys
+import pickle
+import hashlib
+import argparse
+import tempfile
+from pathlib import Path
+
+from ha_yaml import PROJECT_DIR, TOOL_VERSION
+
+DEFAULT_CACHE_DIR = PROJECT_DIR / ".cache" / "parse"
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def content_key(data: bytes) -> str:
+    """Cache-Schluessel aus Tool-Version und Datei-Inhalt."""
+    h = hashlib.sha256(TOOL_VERSION.encode("ascii"))
+    h.update(b"\0")
+    h.update(data)
+    return h.hexdigest()
+
+
+class ParseCache:
+    """Content-adressierter Cache, ein Pickle pro Eintrag."""
+
+    def __init__(self, directory: Path = DEFAULT_CACHE_DIR,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._written = False
+
+    def key_for(self, data: bytes) -> str:
+        return content_key(data)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.pickle"
+
+    def get(self, key: str) -> dict | None:
+        """Liefert den Eintrag oder None. Defekte Eintraege werden geloescht."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                entry = pickle.load(f)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception:
+            path.unlink(missing_ok=True)
+            self.misses += 1
+            return None
+        if not isinstance(entry, dict) or entry.get("version") != TOOL_VERSION:
+            path.unlink(missing_ok=True)
+            self.misses += 1
+            return None
+        # mtime dient als LRU-Zeitstempel fuer die Eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return entry
+
+    def put(self, key: str, entry: dict):
+        """Schreibt einen Eintrag atomar (tmp-Datei + rename)."""
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        entry = dict(entry, version=TOOL_VERSION)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        self._written = True
+
+    def _entries(self) -> list[tuple[float, int, Path]]:
+        entries = []
+        if not self.directory.is_dir():
+            return entries
+        for path in self.directory.glob("*/*.pickle"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def evict(self):
+        """Loescht die aeltesten Eintraege bis der Cache unter max_bytes liegt."""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+        for _, size, path in sorted(entries):
+            path.unlink(missing_ok=True)
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def flush(self):
+        """Nach einem Lauf aufrufen: Eviction nur wenn geschrieben wurde."""
+        if self._written:
+            self.evict()
+            self._written = False
+
+    def clear(self) -> int:
+        """Loescht alle Eintraege und gibt die Anzahl zurueck."""
+        count = 0
+        for _, _, path in self._entries():
+            path.unlink(missing_ok=True)
+            count += 1
+        return count
+
+    def stats(self) -> tuple[int, int]:
+        """(Anzahl Eintraege, Groesse in Bytes)."""
+        entries = self._entries()
+        return len(entries), sum(size for _, size, _ in entries)
+
+
+# ---------------------------------------------------------------------------
+# Main
+# ---------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="HA Parse-Cache verwalten")
+    parser.add_argument("--cache-dir", default=str(DEFAULT_CACHE_DIR),
+                        help="Cache-Verzeichnis (Default: .cache/parse)")
+    parser.add_argument("--clear", action="store_true", help="Cache leeren")
+    parser.add_argument("--stats", action="store_true", help="Cache-Groesse anzeigen")
+    args = parser.parse_args()
+
+    cache = ParseCache(Path(args.cache_dir))
+    if args.clear:
+        print(f"{cache.clear()} Eintraege geloescht.")
+        return 0
+    count, size = cache.stats()
+    print(f"Parse-Cache {cache.directory}: {count} Eintraege, {size/1024:.1f} KiB "
+          f"(max {cache.max_bytes/1024/1024:.0f} MiB, Tool-Version {TOOL_VERSION})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
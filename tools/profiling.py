@@ -0,0 +1,194 @@
+"""Messpunkte fuer die Validatoren: Zeit und Speicher pro Phase und Datei.
+
+Gemeinsam genutzt von yaml_validator.py, entity_reference_checker.py und
+run_tests.py. Ohne Optionen werden nur Phasen-Zeiten gemessen (fast
+kostenlos); die CLI-Optionen schalten mehr ein:
+
+  --timings text|json   Zeiten pro Phase UND pro Datei ausgeben (Dateien
+                        werden dafuer seriell geladen), JSON fuer Hooks/CI
+  --timings-out DATEI   Ziel der Ausgabe (Default: stderr)
+  --tracemalloc DATEI   Allokationen pro Phase/Datei messen (tracemalloc),
+                        Snapshot nach DATEI schreiben
+  --profile DATEI       cProfile-Dump (python -m pstats DATEI)
+
+So laesst sich unterscheiden, ob eine einzelne pathologische Datei oder ein
+bestimmter Pass einen Hook langsam macht.
+"""
+
+import sys
+import json
+import time
+import cProfile
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+from ha_yaml import load_document, load_documents
+
+SLOWEST_FILES = 10
+
+
+class Timings:
+    """Sammelt Zeit (und optional Allokationen) pro Phase und pro Datei."""
+
+    def __init__(self, tool: str, per_file: bool = False, output: str | None = None,
+                 out_path: str | None = None, profile_path: str | None = None,
+                 tracemalloc_path: str | None = None):
+        self.tool = tool
+        self.per_file = per_file
+        self.output = output
+        self.out_path = out_path
+        self.profile_path = profile_path
+        self.tracemalloc_path = tracemalloc_path
+        self.phases = {}                            # name -> {"seconds", "calls", ...}
+        self.files = defaultdict(dict)              # datei -> {phase: {"seconds", ...}}
+        self.total = 0.0
+        self._peaks = []
+
+    @classmethod
+    def from_args(cls, args, tool: str) -> "Timings":
+        # --tracemalloc ohne --timings: Allokationen pro Phase als Text
+        output = args.timings or ("text" if args.tracemalloc else None)
+        return cls(tool, per_file=bool(args.timings), output=output,
+                   out_path=args.timings_out, profile_path=args.profile,
+                   tracemalloc_path=args.tracemalloc)
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    # -- Messen -------------------------------------------------------------
+    @contextmanager
+    def _measure(self, target: dict):
+        tracing = self.tracing
+        if tracing:
+            before = tracemalloc.get_traced_memory()[0]
+            # reset_peak() in einer inneren Messung loescht die Spitze der
+            # aeusseren -- deshalb innere Spitzen ueber einen Stack weiterreichen
+            tracemalloc.reset_peak()
+            self._peaks.append(0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            target["seconds"] = target.get("seconds", 0.0) + time.perf_counter() - start
+            target["calls"] = target.get("calls", 0) + 1
+            if tracing:
+                current, peak = tracemalloc.get_traced_memory()
+                peak = max(peak, self._peaks.pop())
+                if self._peaks:
+                    self._peaks[-1] = max(self._peaks[-1], peak)
+                target["alloc_bytes"] = target.get("alloc_bytes", 0) + current - before
+                target["peak_bytes"] = max(target.get("peak_bytes", 0), peak - before)
+
+    @contextmanager
+    def phase(self, name: str):
+        """Misst eine Phase; wiederholte Aufrufe desselben Namens summieren."""
+        with self._measure(self.phases.setdefault(name, {})):
+            yield
+
+    def each(self, name: str, items: list, func, key=lambda item: str(item.path)) -> list:
+        """func(items) als Phase -- mit --timings einzeln pro Datei gemessen.
+
+        Liefert die Rueckgabewerte der Aufrufe als Liste.
+        """
+        with self.phase(name):
+            if not self.per_file:
+                return [func(items)]
+            results = []
+            for item in items:
+                with self._measure(self.files[key(item)].setdefault(name, {})):
+                    results.append(func([item]))
+            return results
+
+    def load(self, files: list[Path], cache=None, jobs: int | None = None, name: str = "Laden"):
+        """load_documents(); mit --timings seriell, damit jede Datei messbar ist."""
+        with self.phase(name):
+            if not self.per_file:
+                return load_documents(files, cache, jobs)
+            documents = []
+            for filepath in files:
+                with self._measure(self.files[str(filepath)].setdefault(name, {})):
+                    documents.append(load_document(filepath, cache))
+            return documents
+
+    @contextmanager
+    def session(self):
+        """Gesamtzeit, optional cProfile und tracemalloc; gibt danach aus."""
+        profiler = cProfile.Profile() if self.profile_path else None
+        if self.tracemalloc_path:
+            tracemalloc.start()
+        if profiler is not None:
+            profiler.enable()
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.total = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(self.profile_path)
+            if self.tracemalloc_path:
+                tracemalloc.take_snapshot().dump(self.tracemalloc_path)
+                tracemalloc.stop()
+            self.emit()
+
+    # -- Ausgabe ------------------------------------------------------------
+    def slowest_files(self, limit: int = SLOWEST_FILES) -> list[tuple[str, float]]:
+        totals = [(f, sum(p["seconds"] for p in phases.values()))
+                  for f, phases in self.files.items()]
+        return sorted(totals, key=lambda ft: -ft[1])[:limit]
+
+    def to_dict(self) -> dict:
+        return {
+            "tool": self.tool,
+            "total_seconds": self.total,
+            "tracemalloc": bool(self.tracemalloc_path),
+            "phases": [{"name": name, **values} for name, values in self.phases.items()],
+            "files": {f: {"total_seconds": sum(p["seconds"] for p in phases.values()),
+                          "phases": phases}
+                      for f, phases in self.files.items()},
+            "slowest_files": [f for f, _ in self.slowest_files()],
+            "profile": self.profile_path,
+            "tracemalloc_snapshot": self.tracemalloc_path,
+        }
+
+    def format_text(self) -> str:
+        lines = [f"  Laufzeiten {self.tool}:"]
+        for name, values in self.phases.items():
+            line = f"    {name:<22} {values['seconds']*1000:8.1f} ms"
+            if "alloc_bytes" in values:
+                line += (f"  {values['alloc_bytes'] / 1024:9.1f} KiB"
+                         f"  (Spitze {values['peak_bytes'] / 1024:.1f} KiB)")
+            lines.append(line)
+        lines.append(f"    {'Gesamt':<22} {self.total*1000:8.1f} ms")
+        slowest = self.slowest_files()
+        if slowest:
+            lines.append(f"\n  Langsamste Dateien:")
+            for f, seconds in slowest:
+                worst = max(self.files[f].items(), key=lambda kv: kv[1]["seconds"])[0]
+                lines.append(f"    {seconds*1000:8.1f} ms  {f}  (meiste Zeit: {worst})")
+        return "\n".join(lines) + "\n"
+
+    def emit(self):
+        if not self.output:
+            return
+        text = (json.dumps(self.to_dict(), ensure_ascii=False, indent=1) + "\n"
+                if self.output == "json" else self.format_text())
+        if self.out_path:
+            Path(self.out_path).write_text(text, encoding="utf-8")
+        else:
+            sys.stderr.write(text)
+
+
+def add_profiling_arguments(parser):
+    """Gemeinsame CLI-Optionen fuer Messpunkte und Profiling."""
+    parser.add_argument("--timings", choices=["text", "json"],
+                        help="Zeiten pro Phase und Datei ausgeben (nach stderr)")
+    parser.add_argument("--timings-out", metavar="DATEI",
+                        help="Zeiten in DATEI statt nach stderr schreiben")
+    parser.add_argument("--profile", metavar="DATEI",
+                        help="cProfile-Dump schreiben (auswerten mit python -m pstats)")
+    parser.add_argument("--tracemalloc", metavar="DATEI",
+                        help="Allokationen pro Phase/Datei messen, Snapshot nach DATEI")
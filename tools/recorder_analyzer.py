@@ -0,0 +1,533 @@
+#!/usr/bin/env python3
+"""Recorder-Analyse: Schreiblast und Groesse von home-assistant_v2.db.
+
+Oeffnet eine lokale Kopie der Recorder-DB (SQLite) nur lesend und geht die
+states-Tabelle Entity fuer Entity ueber den Index (metadata_id,
+last_updated_ts) durch -- in Bloecken per fetchmany(), nie eine ganze Tabelle
+im Speicher. Pro Entity und Domain:
+
+  Zustandswechsel    Zeilen mit neuem Zustand (last_changed_ts leer)
+  Attribut-Writes    Zeilen, in denen sich nur Attribute geaendert haben
+  Anteil an der DB   geschaetzt: Zeilen x Zeilengroesse + Zustands-Texte +
+                     Groesse der referenzierten Attribut-Blobs
+  unavailable        Zeitraeume in unavailable/unknown (Anzahl, Dauer, laengster)
+  Flattern           Bursts von >= N Zustandswechseln in M Minuten (nur
+                     diskrete Zustaende wie on/off, keine Messwerte)
+
+Dazu die echten Tabellengroessen, falls SQLite mit dbstat gebaut ist, und
+Statistik-Zeilen (statistics/statistics_short_term) pro Entity.
+
+`package` erzeugt aus den groessten Schreibern ein fertiges Package mit
+recorder: exclude: (Default packages/recorder_exclude.yaml). Schema ab
+HA 2023.4 (states_meta); aeltere DBs mit states.entity_id gehen auch.
+
+Nutzung:
+  python tools/recorder_analyzer.py report home-assistant_v2.db --days 7
+  python tools/recorder_analyzer.py report home-assistant_v2.db --entity sensor.pv_erzeugung
+  python tools/recorder_analyzer.py package home-assistant_v2.db --min-share 2 --dry-run
+"""
+
+import sys
+import sqlite3
+import fnmatch
+import argparse
+from collections import defaultdict, deque
+from datetime import datetime
+from pathlib import Path
+
+from ha_yaml import DEFAULT_PACKAGES_DIR
+from ets_import import write_if_changed
+
+# Windows-Encoding fix: UTF-8 erzwingen
+if sys.stdout.encoding != "utf-8":
+    sys.stdout.reconfigure(encoding="utf-8")
+
+CHUNK_ROWS = 5000
+# Groesse einer states-Zeile ohne Zustands-Text (IDs, Zeitstempel, Kontext-IDs, Index-Eintraege)
+ROW_BYTES = 120
+UNAVAILABLE_STATES = ("unavailable", "unknown")
+DEFAULT_FLAP_COUNT = 10
+DEFAULT_FLAP_MINUTES = 10
+DEFAULT_PACKAGE = DEFAULT_PACKAGES_DIR / "recorder_exclude.yaml"
+GENERATED_MARKER = "# Erzeugt von tools/recorder_analyzer.py"
+
+
+class Schema:
+    """Spalten der states-Tabelle: neues (states_meta) oder altes Schema."""
+
+    def __init__(self, db: sqlite3.Connection):
+        columns = {row[1] for row in db.execute("PRAGMA table_info(states)")}
+        if not columns:
+            raise sqlite3.DatabaseError("keine states-Tabelle -- keine Recorder-DB?")
+        tables = {row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        self.modern = "metadata_id" in columns and "states_meta" in tables
+        if self.modern:
+            self.key = "metadata_id"
+            self.updated = "last_updated_ts"
+            self.state_change = "last_changed_ts IS NULL OR last_changed_ts = last_updated_ts"
+        else:
+            self.key = "entity_id"
+            self.updated = "(julianday(last_updated) - 2440587.5) * 86400.0"
+            self.state_change = "last_changed IS NULL OR last_changed = last_updated"
+        self.attributes_id = "attributes_id" in columns and "state_attributes" in tables
+        # Altes Schema: Attribute als JSON direkt in der Zeile
+        self.inline_attributes = "LENGTH(attributes)" if "attributes" in columns else "0"
+        self.statistics = "statistics_meta" in tables
+
+    def entities(self, db: sqlite3.Connection) -> list[tuple]:
+        """[(key, entity_id)] -- key ist metadata_id bzw. die Entity-ID selbst."""
+        if self.modern:
+            return list(db.execute("SELECT metadata_id, entity_id FROM states_meta "
+                                   "WHERE entity_id IS NOT NULL ORDER BY entity_id"))
+        return [(e, e) for (e,) in db.execute("SELECT DISTINCT entity_id FROM states "
+                                              "WHERE entity_id IS NOT NULL ORDER BY entity_id")]
+
+
+def open_recorder(path: Path) -> sqlite3.Connection:
+    """Recorder-DB nur lesend oeffnen (auch eine Kopie, an der HA nicht schreibt)."""
+    if not Path(path).is_file():
+        raise FileNotFoundError(f"{path} nicht gefunden")
+    db = sqlite3.connect(f"file:{Path(path).resolve().as_posix()}?mode=ro", uri=True)
+    db.execute("PRAGMA query_only = 1")
+    return db
+
+
+def time_span(db: sqlite3.Connection, schema: Schema) -> tuple[float | None, float | None]:
+    """Aeltester und juengster Zeitstempel in states (ueber den Index)."""
+    return db.execute(f"SELECT MIN({schema.updated}), MAX({schema.updated}) FROM states").fetchone()
+
+
+def recorder_counts(path: Path) -> tuple[dict[str, int], float]:
+    """Zeilen pro Entity und abgedeckte Stunden (fuer trigger_load.py --sample)."""
+    db = open_recorder(path)
+    try:
+        schema = Schema(db)
+        names = dict(schema.entities(db))
+        counts = {}
+        for key, count in db.execute(f"SELECT {schema.key}, COUNT(*) FROM states "
+                                     f"GROUP BY {schema.key}"):
+            if key in names:
+                counts[names[key]] = count
+        first, last = time_span(db, schema)
+    finally:
+        db.close()
+    hours = (last - first) / 3600 if first is not None and last is not None else 0.0
+    return counts, hours
+
+
+# ---------------------------------------------------------------------------
+# Analyse pro Entity
+# ---------------------------------------------------------------------------
+class EntityStats:
+    __slots__ = ("entity", "rows", "state_changes", "attribute_writes", "state_bytes",
+                 "attribute_bytes", "attribute_ids", "unavailable", "unavailable_seconds",
+                 "longest_unavailable", "open_unavailable", "flaps", "max_burst",
+                 "first_flap", "statistics_rows")
+
+    def __init__(self, entity: str):
+        self.entity = entity
+        self.rows = 0
+        self.state_changes = 0
+        self.attribute_writes = 0
+        self.state_bytes = 0
+        self.attribute_bytes = 0
+        self.attribute_ids = set()
+        self.unavailable = 0
+        self.unavailable_seconds = 0.0
+        self.longest_unavailable = (0.0, None)     # (Sekunden, Beginn)
+        self.open_unavailable = None               # Beginn, falls bis zum Ende unavailable
+        self.flaps = 0
+        self.max_burst = 0
+        self.first_flap = None
+        self.statistics_rows = 0
+
+    @property
+    def domain(self) -> str:
+        return self.entity.split(".", 1)[0]
+
+    @property
+    def size(self) -> int:
+        return self.rows * ROW_BYTES + self.state_bytes + self.attribute_bytes
+
+
+class RecorderReport:
+    def __init__(self):
+        self.entities = []              # [EntityStats]
+        self.first = None
+        self.last = None
+        self.table_sizes = {}           # Tabelle -> Bytes (nur mit dbstat)
+        self.file_size = 0
+
+    @property
+    def days(self) -> float:
+        if self.first is None or self.last is None:
+            return 0.0
+        return max((self.last - self.first) / 86400, 1 / 24)
+
+    @property
+    def total_size(self) -> int:
+        return sum(e.size for e in self.entities) or 1
+
+
+def _scan_entity(db: sqlite3.Connection, schema: Schema, key, stats: EntityStats,
+                 since: float | None, end: float, flap_count: int, flap_seconds: float):
+    """Alle Zeilen einer Entity in Zeitfolge, blockweise."""
+    attributes = ", attributes_id" if schema.attributes_id else ", NULL"
+    query = (f"SELECT state, {schema.updated}, ({schema.state_change}){attributes}, "
+             f"IFNULL({schema.inline_attributes}, 0) "
+             f"FROM states WHERE {schema.key} = ?")
+    params = [key]
+    if since is not None:
+        query += f" AND {schema.updated} >= ?"
+        params.append(since)
+    cursor = db.execute(query + f" ORDER BY {schema.updated}", params)
+
+    previous = None
+    down_since = None
+    window = deque()
+    while True:
+        rows = cursor.fetchmany(CHUNK_ROWS)
+        if not rows:
+            break
+        for state, updated, changed, attributes_id, inline in rows:
+            stats.rows += 1
+            stats.state_bytes += len(state or "")
+            stats.attribute_bytes += inline
+            if attributes_id is not None:
+                stats.attribute_ids.add(attributes_id)
+            if not changed and state == previous:
+                stats.attribute_writes += 1
+                continue
+            stats.state_changes += 1
+            if updated is None:
+                previous = state
+                continue
+            # unavailable/unknown-Zeitraeume
+            if state in UNAVAILABLE_STATES and down_since is None:
+                down_since = updated
+                stats.unavailable += 1
+            elif state not in UNAVAILABLE_STATES and down_since is not None:
+                _close_unavailable(stats, down_since, updated)
+                down_since = None
+            # Flattern: flap_count Wechsel innerhalb von flap_seconds -- nur bei diskreten
+            # Zustaenden (on/off, unavailable ...), Messwerte aendern sich laufend
+            previous_state, previous = previous, state
+            if _numeric(state) and (previous_state is None or _numeric(previous_state)):
+                continue
+            window.append(updated)
+            while window and updated - window[0] > flap_seconds:
+                window.popleft()
+            if len(window) >= flap_count:
+                if stats.first_flap is None:
+                    stats.first_flap = window[0]
+                stats.flaps += 1
+                stats.max_burst = max(stats.max_burst, len(window))
+                window.clear()
+    if down_since is not None:
+        _close_unavailable(stats, down_since, end)
+        stats.open_unavailable = down_since
+
+
+def _numeric(state: str | None) -> bool:
+    try:
+        float(state)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+def _close_unavailable(stats: EntityStats, start: float, end: float):
+    duration = max(end - start, 0.0)
+    stats.unavailable_seconds += duration
+    if duration > stats.longest_unavailable[0]:
+        stats.longest_unavailable = (duration, start)
+
+
+def _attribute_sizes(db: sqlite3.Connection, stats: EntityStats):
+    """Groesse der Attribut-Blobs einer Entity (IN-Listen in Bloecken)."""
+    ids = sorted(stats.attribute_ids)
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        marks = ",".join("?" * len(chunk))
+        (size,) = db.execute(f"SELECT SUM(LENGTH(shared_attrs)) FROM state_attributes "
+                             f"WHERE attributes_id IN ({marks})", chunk).fetchone()
+        stats.attribute_bytes += size or 0
+    stats.attribute_ids = set()
+
+
+def _statistics_rows(db: sqlite3.Connection, report: RecorderReport):
+    by_entity = {e.entity: e for e in report.entities}
+    for table in ("statistics", "statistics_short_term"):
+        try:
+            rows = db.execute(f"SELECT m.statistic_id, c.n FROM (SELECT metadata_id, COUNT(*) AS n "
+                              f"FROM {table} GROUP BY metadata_id) c "
+                              f"JOIN statistics_meta m ON m.id = c.metadata_id")
+            for statistic_id, count in rows:
+                if statistic_id in by_entity:
+                    by_entity[statistic_id].statistics_rows += count
+        except sqlite3.OperationalError:
+            continue
+
+
+def _table_sizes(db: sqlite3.Connection) -> dict[str, int]:
+    try:
+        return dict(db.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name "
+                               "ORDER BY SUM(pgsize) DESC"))
+    except sqlite3.OperationalError:
+        return {}
+
+
+def analyze(path: Path, days: float | None = None, entity_patterns: list[str] | None = None,
+            flap_count: int = DEFAULT_FLAP_COUNT,
+            flap_minutes: float = DEFAULT_FLAP_MINUTES) -> RecorderReport:
+    """Recorder-DB auswerten (nur lesend, eine Entity nach der anderen)."""
+    report = RecorderReport()
+    report.file_size = Path(path).stat().st_size
+    db = open_recorder(path)
+    try:
+        schema = Schema(db)
+        first, last = time_span(db, schema)
+        if first is None:
+            return report
+        since = last - days * 86400 if days else None
+        report.first = max(first, since) if since is not None else first
+        report.last = last
+        for key, entity in schema.entities(db):
+            if entity_patterns and not any(fnmatch.fnmatchcase(entity, p)
+                                           for p in entity_patterns):
+                continue
+            stats = EntityStats(entity)
+            _scan_entity(db, schema, key, stats, since, last, flap_count, flap_minutes * 60)
+            if stats.rows == 0:
+                continue
+            _attribute_sizes(db, stats)
+            report.entities.append(stats)
+        if schema.statistics:
+            _statistics_rows(db, report)
+        report.table_sizes = _table_sizes(db)
+    finally:
+        db.close()
+    return report
+
+
+# ---------------------------------------------------------------------------
+# Ausgabe
+# ---------------------------------------------------------------------------
+def _format_time(ts: float | None) -> str:
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M") if ts else "-"
+
+
+def _format_duration(seconds: float) -> str:
+    if seconds >= 86400:
+        return f"{seconds / 86400:.1f} d"
+    if seconds >= 3600:
+        return f"{seconds / 3600:.1f} h"
+    return f"{seconds / 60:.0f} min"
+
+
+def _format_bytes(size: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def print_report(report: RecorderReport, top: int = 20) -> int:
+    print(f"\n{'='*60}")
+    print(f"  Recorder-Analyse -- {len(report.entities)} Entities, "
+          f"{_format_bytes(report.file_size)}")
+    print(f"  {_format_time(report.first)} .. {_format_time(report.last)} "
+          f"({report.days:.1f} Tage)")
+    print(f"{'='*60}")
+    if not report.entities:
+        print(f"\n  Keine State-Zeilen im Zeitraum.")
+        return 0
+
+    if report.table_sizes:
+        print(f"\n  Tabellen (dbstat):")
+        for name, size in list(report.table_sizes.items())[:8]:
+            print(f"    {_format_bytes(size):>10}  {name}")
+
+    days = report.days
+    total = report.total_size
+    ranked = sorted(report.entities, key=lambda e: (-e.size, e.entity))
+    shown = ranked[:top] if top else ranked
+    print(f"\n  Entities nach Anteil (Wechsel/Tag, Attribut-Writes/Tag, Statistik-Zeilen):")
+    for e in shown:
+        print(f"    {e.size / total * 100:5.1f} %  {e.state_changes / days:9.0f} "
+              f"{e.attribute_writes / days:9.0f} {e.statistics_rows:9d}  {e.entity}")
+
+    domains = defaultdict(lambda: [0, 0, 0, 0])
+    for e in report.entities:
+        d = domains[e.domain]
+        d[0] += 1
+        d[1] += e.state_changes
+        d[2] += e.attribute_writes
+        d[3] += e.size
+    print(f"\n  Domains (Entities, Wechsel/Tag, Attribut-Writes/Tag):")
+    for domain, (count, changes, writes, size) in sorted(domains.items(),
+                                                         key=lambda d: -d[1][3]):
+        print(f"    {size / total * 100:5.1f} %  {count:5d} {changes / days:9.0f} "
+              f"{writes / days:9.0f}  {domain}")
+
+    down = sorted((e for e in report.entities if e.unavailable),
+                  key=lambda e: (-e.unavailable_seconds, e.entity))
+    if down:
+        print(f"\n  unavailable/unknown ({len(down)} Entities; Anzahl, Summe, laengster ab):")
+        for e in down[:top] if top else down:
+            longest, start = e.longest_unavailable
+            still = "  -- noch immer" if e.open_unavailable is not None else ""
+            print(f"    {e.unavailable:5d}x {_format_duration(e.unavailable_seconds):>8}  "
+                  f"{_format_duration(longest):>8} ab {_format_time(start)}  {e.entity}{still}")
+
+    flapping = sorted((e for e in report.entities if e.flaps),
+                      key=lambda e: (-e.flaps, e.entity))
+    if flapping:
+        print(f"\n  Flattern ({len(flapping)} Entities; Bursts, groesster, erster):")
+        for e in flapping[:top] if top else flapping:
+            print(f"    {e.flaps:5d}x {e.max_burst:5d} Wechsel  {_format_time(e.first_flap)}  "
+                  f"{e.entity}")
+    print(f"\n  Anteile geschaetzt ({ROW_BYTES} Byte pro Zeile + Texte + Attribut-Blobs).")
+    print(f"{'='*60}\n")
+    return 0
+
+
+def print_entity(report: RecorderReport, entity: str) -> int:
+    matches = [e for e in report.entities if e.entity == entity]
+    if not matches:
+        print(f"  '{entity}' hat keine State-Zeilen im Zeitraum.")
+        return 1
+    e = matches[0]
+    days = report.days
+    print(f"\n  {e.entity}  ({_format_time(report.first)} .. {_format_time(report.last)})")
+    print(f"    Zeilen              {e.rows:10d}  ({_format_bytes(e.size)} geschaetzt)")
+    print(f"    Zustandswechsel     {e.state_changes:10d}  ({e.state_changes / days:.0f}/Tag)")
+    print(f"    Attribut-Writes     {e.attribute_writes:10d}  ({e.attribute_writes / days:.0f}/Tag)")
+    print(f"    Statistik-Zeilen    {e.statistics_rows:10d}")
+    print(f"    unavailable/unknown {e.unavailable:10d}x  {_format_duration(e.unavailable_seconds)}"
+          + (f"  (seit {_format_time(e.open_unavailable)})" if e.open_unavailable else ""))
+    if e.unavailable:
+        longest, start = e.longest_unavailable
+        print(f"    laengster Ausfall   {_format_duration(longest):>10}  ab {_format_time(start)}")
+    print(f"    Flattern            {e.flaps:10d}x  (groesster Burst {e.max_burst})")
+    return 0
+
+
+# ---------------------------------------------------------------------------
+# recorder: exclude: Package
+# ---------------------------------------------------------------------------
+def exclude_candidates(report: RecorderReport, min_share: float, min_per_day: float,
+                       keep: list[str]) -> list[EntityStats]:
+    """Entities ueber min_share Prozent der DB oder min_per_day Zeilen pro Tag."""
+    total = report.total_size
+    days = report.days
+    result = []
+    for e in sorted(report.entities, key=lambda e: (-e.size, e.entity)):
+        if any(fnmatch.fnmatchcase(e.entity, pattern) for pattern in keep):
+            continue
+        if e.size / total * 100 >= min_share or (min_per_day and e.rows / days >= min_per_day):
+            result.append(e)
+    return result
+
+
+def render_package(report: RecorderReport, candidates: list[EntityStats], source: str,
+                   path: Path) -> str:
+    total = report.total_size
+    days = report.days
+    width = max(len(e.entity) for e in candidates) + 2
+    lines = [
+        f"# packages/{path.name}",
+        "# " + "=" * 76,
+        f"{GENERATED_MARKER} aus {source}",
+        f"# Zeitraum {_format_time(report.first)} .. {_format_time(report.last)} "
+        f"({days:.1f} Tage)",
+        "# Ausgeschlossene Entities landen nicht mehr in History und Statistik.",
+        "# Automationen sind nicht betroffen (sie lesen den aktuellen Zustand).",
+        "# " + "=" * 76,
+        "",
+        "recorder:",
+        "  exclude:",
+        "    entities:",
+    ]
+    for e in candidates:
+        lines.append(f"      - {e.entity:<{width}}# {e.size / total * 100:.1f} % der DB, "
+                     f"{e.rows / days:.0f} Zeilen/Tag")
+    return "\n".join(lines) + "\n"
+
+
+def _add_analysis_arguments(parser):
+    parser.add_argument("database", help="Lokale Kopie von home-assistant_v2.db")
+    parser.add_argument("--days", type=float,
+                        help="Nur die letzten N Tage auswerten (Default: alles)")
+    parser.add_argument("--flap-count", type=int, default=DEFAULT_FLAP_COUNT,
+                        help=f"Flattern ab so vielen Wechseln ... (Default: {DEFAULT_FLAP_COUNT})")
+    parser.add_argument("--flap-minutes", type=float, default=DEFAULT_FLAP_MINUTES,
+                        help=f"... innerhalb dieser Minuten (Default: {DEFAULT_FLAP_MINUTES})")
+
+
+def is_generated(path: Path) -> bool:
+    """Traegt die Datei im Kopf den GENERATED_MARKER (wie ets_import --prune)?"""
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return GENERATED_MARKER in f.read(512)
+    except OSError:
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recorder-DB: Schreiblast, Groesse, Ausfaelle")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("report", help="Schreiblast pro Entity/Domain, unavailable, Flattern")
+    _add_analysis_arguments(p)
+    p.add_argument("--top", type=int, default=20, help="Anzahl pro Liste (Default: 20, 0 = alle)")
+    p.add_argument("--entity", help="Nur diese Entity im Detail")
+    p = sub.add_parser("package", help="recorder: exclude: Package aus den groessten Schreibern")
+    _add_analysis_arguments(p)
+    p.add_argument("--min-share", type=float, default=1.0,
+                   help="Ausschliessen ab diesem Anteil an der DB in Prozent (Default: 1.0)")
+    p.add_argument("--min-per-day", type=float, default=0,
+                   help="... oder ab so vielen Zeilen pro Tag (Default: aus)")
+    p.add_argument("--keep", action="append", default=[],
+                   help="Nie ausschliessen (fnmatch, mehrfach moeglich)")
+    p.add_argument("--output", "-o", default=str(DEFAULT_PACKAGE),
+                   help="Ziel-Package (Default: packages/recorder_exclude.yaml)")
+    p.add_argument("--dry-run", action="store_true", help="Nur anzeigen, nichts schreiben")
+    p.add_argument("--force", action="store_true",
+                   help="Auch eine nicht von diesem Tool erzeugte Datei ueberschreiben")
+    args = parser.parse_args()
+
+    patterns = [args.entity] if getattr(args, "entity", None) else None
+    try:
+        report = analyze(Path(args.database), args.days, patterns, args.flap_count,
+                         args.flap_minutes)
+    except (OSError, sqlite3.Error) as e:
+        print(f"Recorder-DB nicht lesbar: {e}")
+        return 1
+
+    if args.command == "report":
+        if args.entity:
+            return print_entity(report, args.entity)
+        return print_report(report, args.top)
+
+    candidates = exclude_candidates(report, args.min_share, args.min_per_day, args.keep)
+    if not candidates:
+        print(f"  Keine Entity ueber {args.min_share:g} % -- kein Package erzeugt.")
+        return 0
+    output = Path(args.output)
+    text = render_package(report, candidates, Path(args.database).name, output)
+    if args.dry_run:
+        print(text, end="")
+        return 0
+    if output.exists() and not args.force and not is_generated(output):
+        print(f"  {output} wurde nicht von diesem Tool erzeugt -- nicht ueberschrieben "
+              f"(anderes -o waehlen oder --force).")
+        return 1
+    changed = write_if_changed(output, text)
+    share = sum(e.size for e in candidates) / report.total_size * 100
+    print(f"  {output}: {len(candidates)} Entities ({share:.1f} % der DB)"
+          f"{'' if changed else ' -- unveraendert'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
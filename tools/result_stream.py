@@ -0,0 +1,129 @@
+"""Streaming-Ausgabe fuer blockierende Hooks: eine JSON-Zeile pro Datei.
+
+Statt alle Dateien zu laden und erst am Ende den Report zu drucken, wird
+jede Datei einzeln geladen, geprueft und sofort gemeldet -- die zuletzt
+geaenderten zuerst, denn dort stecken die wahrscheinlichen Fehler. Mit
+--fail-fast endet der Lauf beim ersten Fehler.
+
+Zeilen (NDJSON, ein Objekt pro Zeile, stdout):
+
+  {"type": "file", "file": "alarm.yaml", "path": "...", "ms": 0.4,
+   "errors": [{"file": ..., "message": ...}], "warnings": [...]}
+  {"type": "global", "check": "Doppelte IDs", "errors": [...], "warnings": [...]}
+  {"type": "summary", "files": 20, "checked": 20, "errors": 0, "warnings": 2,
+   "stopped": false, "ok": true}
+
+Die dateiuebergreifenden Pruefungen (doppelte Automation-IDs, KNX,
+Rueckkopplungen zwischen Automationen) brauchen
+alle Dateien und laufen deshalb erst am Ende -- bei --fail-fast nur, wenn
+bis dahin keine Datei einen Fehler hatte. Exit-Code wie im Text-Modus.
+
+Nutzung:
+  python tools/yaml_validator.py --format ndjson --fail-fast
+  python tools/yaml_validator.py --fail-fast          # Text-Report, frueher Abbruch
+"""
+
+import sys
+import json
+import time
+from pathlib import Path
+
+import yaml_validator
+from ha_yaml import load_document, save_documents
+from dependency_graph import dependency_pass, extract_dependencies
+from knx_checker import KnxReport, add_file, extract_knx, find_collisions, report_findings
+
+
+def newest_first(files: list[Path]) -> list[Path]:
+    """Zuletzt geaenderte Dateien zuerst; fehlende ganz vorne (sicherer Fehler)."""
+    def mtime(filepath: Path) -> float:
+        try:
+            return filepath.stat().st_mtime
+        except OSError:
+            return float("inf")
+    return sorted(files, key=mtime, reverse=True)
+
+
+def _messages(result: yaml_validator.ValidationResult, level: str) -> list[dict]:
+    return [{"file": file, "message": msg} for lvl, file, msg in result.entries if lvl == level]
+
+
+class _Emitter:
+    """Schreibt NDJSON-Zeilen sofort oder sammelt fuer den Text-Report."""
+
+    def __init__(self, output: str, out=None):
+        self.output = output
+        self.out = out or sys.stdout
+        self.total = yaml_validator.ValidationResult()
+
+    def emit(self, record: dict, result: yaml_validator.ValidationResult):
+        self.total.errors.extend(result.errors)
+        self.total.warnings.extend(result.warnings)
+        self.total.entries.extend(result.entries)
+        if self.output == "ndjson":
+            record["errors"] = _messages(result, "error")
+            record["warnings"] = _messages(result, "warning")
+            self.out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            # Sofort raus -- der Hook liest zeilenweise mit
+            self.out.flush()
+
+
+def stream_validate(files: list[Path], cache=None, output: str = "ndjson",
+                    fail_fast: bool = False) -> int:
+    """Prueft Datei fuer Datei und meldet sofort; liefert den Exit-Code."""
+    emitter = _Emitter(output)
+    documents = []
+    stopped = False
+
+    for filepath in newest_first(files):
+        start = time.perf_counter()
+        doc = load_document(filepath, cache)
+        result = yaml_validator.ValidationResult()
+        yaml_validator.syntax_pass([doc], result)
+        yaml_validator.structure_pass([doc], result)
+        yaml_validator.automation_id_pass([doc])
+        if doc.ok and doc.content is not None:
+            doc.memo("knx", lambda: extract_knx(doc.content))
+            doc.memo("dependencies", lambda: extract_dependencies(doc.content, doc.path.stem))
+        documents.append(doc)
+        emitter.emit({"type": "file", "file": doc.name, "path": str(filepath),
+                      "ms": round((time.perf_counter() - start) * 1000, 3)}, result)
+        if fail_fast and not result.ok:
+            stopped = True
+            break
+
+    if not stopped:
+        result = yaml_validator.ValidationResult()
+        yaml_validator.duplicate_id_pass(documents, result)
+        emitter.emit({"type": "global", "check": "Doppelte IDs"}, result)
+        stopped = fail_fast and not result.ok
+
+    if not stopped:
+        result = yaml_validator.ValidationResult()
+        knx = KnxReport()
+        for doc in documents:
+            if doc.ok and doc.content is not None:
+                add_file(knx, doc.name, doc.derived["knx"])
+        find_collisions(knx)
+        report_findings(knx, result)
+        emitter.emit({"type": "global", "check": "KNX"}, result)
+
+        result = yaml_validator.ValidationResult()
+        dependency_pass(documents, result)
+        emitter.emit({"type": "global", "check": "Abhaengigkeiten"}, result)
+
+    save_documents(documents, cache)
+
+    total = emitter.total
+    if output != "ndjson":
+        if stopped:
+            print(f"\n  Abbruch nach dem ersten Fehler (--fail-fast): "
+                  f"{len(documents)} von {len(files)} Datei(en) geprueft")
+        return yaml_validator.print_report(len(documents), total)
+
+    summary = {"type": "summary", "files": len(files), "checked": len(documents),
+               "errors": len(total.errors), "warnings": len(total.warnings),
+               "stopped": stopped, "ok": total.ok}
+    emitter.out.write(json.dumps(summary, ensure_ascii=False) + "\n")
+    emitter.out.flush()
+    return 0 if total.ok else 1
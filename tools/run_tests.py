@@ -1,5 +1,8 @@
 #!/usr/bin/env python3
-"""Test-Orchestrator: Fuehrt alle Validatoren nacheinander aus.
+"""Test-Orchestrator: Fuehrt alle Validatoren in einem Prozess aus.
+
+Jede Package-Datei wird genau einmal geladen; alle Pruefungen laufen als
+Passes ueber dasselbe Dokument-Modell (siehe ha_yaml.py).
 
 Reihenfolge:
   1. YAML Syntax + Struktur (yaml_validator.py)
@@ -7,9 +10,19 @@ Reihenfolge:
 """
 
 import sys
-import subprocess
 import time
-from pathlib import Path
+import argparse
+
+import yaml_validator
+import entity_reference_checker
+from knx_checker import knx_pass
+from dependency_graph import dependency_pass
+from ha_yaml import (add_loader_arguments, collect_files, open_cache, save_documents,
+                     DEFAULT_PACKAGES_DIR)
+from entity_registry import load_registry
+from naming_rules import load_rules
+from include_graph import add_resolve_arguments, open_resolver
+from profiling import Timings, add_profiling_arguments
 
 # Windows-Encoding fix: UTF-8 erzwingen
 if sys.stdout.encoding != "utf-8":
@@ -18,59 +31,150 @@ if sys.stderr.encoding != "utf-8":
     sys.stderr.reconfigure(encoding="utf-8")
 
 
-def run_validator(name: str, script: str, args: list[str]) -> bool:
-    """Fuehrt einen Validator aus und gibt True bei Erfolg zurueck."""
+def print_section(name: str):
     print(f"\n{'─'*60}")
     print(f"  [{name}]")
     print(f"{'─'*60}")
 
-    start = time.time()
-    try:
-        result = subprocess.run(
-            [sys.executable, script] + args,
-            capture_output=False,
-            timeout=120,
-        )
-        elapsed = time.time() - start
-        status = "BESTANDEN" if result.returncode == 0 else "FEHLGESCHLAGEN"
-        print(f"  -> {status} ({elapsed:.1f}s)")
-        return result.returncode == 0
-    except FileNotFoundError:
-        print(f"  -> UEBERSPRUNGEN (Script nicht gefunden: {script})")
-        return True
-    except subprocess.TimeoutExpired:
-        print(f"  -> TIMEOUT nach 120s")
-        return False
 
+def run_yaml_validator(loaded, documents, total: int, timings: Timings, resolver=None) -> bool:
+    """Syntax-, Struktur-, Duplikat-, KNX- und Abhaengigkeits-Pass ueber die geladenen Dokumente.
+
+    loaded sind alle gelesenen Dateien (Syntax), documents die zu pruefenden
+    -- mit --resolve die aufgeloesten Packages ohne Fragmente.
+    """
+    print_section("YAML Syntax + Struktur")
+    result = yaml_validator.ValidationResult()
+    if resolver is not None:
+        resolver.report_to(result)
+    timings.each("Syntax", loaded, lambda docs: yaml_validator.syntax_pass(docs, result))
+    timings.each("Struktur", documents,
+                 lambda docs: yaml_validator.structure_pass(docs, result))
+    timings.each("Automation-IDs", documents, yaml_validator.automation_id_pass)
+    with timings.phase("Doppelte IDs"):
+        yaml_validator.duplicate_id_pass(documents, result)
+    with timings.phase("KNX"):
+        knx_pass(documents, result)
+    with timings.phase("Abhaengigkeiten"):
+        dependency_pass(documents, result)
+    with timings.phase("Report YAML"):
+        returncode = yaml_validator.print_report(total, result)
+    status = "BESTANDEN" if returncode == 0 else "FEHLGESCHLAGEN"
+    print(f"  -> {status}")
+    return returncode == 0
+
+
+def run_reference_checker(documents, total: int, timings: Timings, rules,
+                          registry=None) -> bool:
+    """Entity-Extraktion, Umlaut-, Duplikat- und (optional) Registry-Pass."""
+    print_section("Entity Reference Check")
+    report = entity_reference_checker.ReferenceReport()
+    timings.each("Entity-Extraktion", documents,
+                 lambda docs: entity_reference_checker.extraction_pass(docs, report))
+    paths = {doc.name: str(doc.path) for doc in documents}
+    timings.each("Namensregeln", list(report.entities_by_file),
+                 lambda fnames: entity_reference_checker.naming_pass(report, rules, fnames),
+                 key=lambda fname: paths.get(fname, fname))
+    with timings.phase("Doppelte IDs (Refs)"):
+        entity_reference_checker.duplicate_id_pass(report)
+    if registry is not None:
+        with timings.phase("Registry-Abgleich"):
+            entity_reference_checker.registry_pass(documents, report, registry)
+    with timings.phase("Report Refs"):
+        returncode = entity_reference_checker.print_report(total, report)
+    status = "BESTANDEN" if returncode == 0 else "FEHLGESCHLAGEN"
+    print(f"  -> {status}")
+    return returncode == 0
+
+
+def run_self_check(documents, timings: Timings) -> bool:
+    """Prueft, dass Stream- und Baum-Extraktor dieselben Ergebnisse liefern."""
+    print_section("Self-Check: Stream- vs. Baum-Extraktor")
+    mismatches = []
+    with timings.phase("Self-Check"):
+        for doc in documents:
+            if not doc.ok or doc.content is None:
+                continue
+            found = set()
+            entity_reference_checker.extract_entity_ids(doc.content, found)
+            dynamic = set()
+            hits, auto_ids = entity_reference_checker.stream_file(doc.path, dynamic=dynamic)
+            streamed = {entity for entity, _ in hits}
+            if streamed != found:
+                mismatches.append(f"{doc.name}: Entities nur Baum {sorted(found - streamed)}, "
+                                  f"nur Stream {sorted(streamed - found)}")
+            tree_dynamic = set()
+            entity_reference_checker.extract_dynamic_refs(doc.content, tree_dynamic)
+            if dynamic != tree_dynamic:
+                mismatches.append(f"{doc.name}: Dynamische Referenzen weichen ab")
+            if auto_ids != entity_reference_checker.extract_automation_ids(doc.content):
+                mismatches.append(f"{doc.name}: Automation-IDs weichen ab")
+    for m in mismatches:
+        print(f"    FEHLER  {m}")
+    checked = sum(1 for d in documents if d.ok and d.content is not None)
+    status = "BESTANDEN" if not mismatches else "FEHLGESCHLAGEN"
+    print(f"  {checked} Datei(en) verglichen -> {status}")
+    return not mismatches
 
-def main():
-    project_dir = Path(__file__).resolve().parent.parent
-    tools_dir = project_dir / "tools"
-    pkg_dir = project_dir / "packages"
 
-    pkg_args = ["--packages-dir", str(pkg_dir)]
+def main():
+    parser = argparse.ArgumentParser(description="HA Test-Orchestrator")
+    parser.add_argument("--packages-dir", "-d", default=str(DEFAULT_PACKAGES_DIR),
+                        help="Packages-Verzeichnis (Default: packages/)")
+    parser.add_argument("--rules",
+                        help="Namensregeln (YAML, Default: naming_rules.yaml falls vorhanden)")
+    parser.add_argument("--registry",
+                        help="Registry-Snapshot (Default: .cache/entity_registry.json falls vorhanden)")
+    parser.add_argument("--self-check", action="store_true",
+                        help="Zusaetzlich Stream- gegen Baum-Extraktor pruefen")
+    add_loader_arguments(parser)
+    add_resolve_arguments(parser)
+    add_profiling_arguments(parser)
+    args = parser.parse_args()
 
     print(f"\n{'='*60}")
     print(f"  HA Test-Orchestrator")
-    print(f"  Packages: {pkg_dir}")
+    print(f"  Packages: {args.packages_dir}")
     print(f"{'='*60}")
 
-    results = {}
-
-    # 1. YAML Validator
-    results["YAML Syntax"] = run_validator(
-        "YAML Syntax + Struktur",
-        str(tools_dir / "yaml_validator.py"),
-        pkg_args,
-    )
-
-    # 2. Entity Reference Checker
-    results["Entity Refs"] = run_validator(
-        "Entity Reference Check",
-        str(tools_dir / "entity_reference_checker.py"),
-        pkg_args,
-    )
-
+    files = collect_files(packages_dir=args.packages_dir)
+    if not files:
+        print("Keine YAML-Dateien gefunden.")
+        return 0
+
+    timings = Timings.from_args(args, "run_tests")
+    with timings.session():
+        total_start = time.perf_counter()
+
+        # Jede Datei genau einmal laden (unveraenderte Dateien aus dem Cache)
+        cache = open_cache(not args.no_cache)
+        documents = timings.load(files, cache, args.jobs)
+        loaded = documents
+        resolver = open_resolver(args, args.packages_dir, cache)
+        if resolver is not None:
+            with timings.phase("Includes"):
+                documents = resolver.resolve(documents)
+            loaded = resolver.all_documents()
+
+        results = {}
+        results["YAML Syntax"] = run_yaml_validator(loaded, documents, len(files), timings,
+                                                    resolver)
+        results["Entity Refs"] = run_reference_checker(documents, len(files), timings,
+                                                       load_rules(args.rules),
+                                                       load_registry(args.registry))
+        if args.self_check:
+            results["Self-Check"] = run_self_check(loaded, timings)
+
+        with timings.phase("Cache schreiben"):
+            save_documents(loaded, cache)
+
+        total_elapsed = time.perf_counter() - total_start
+        return print_summary(results, files, timings, total_elapsed, cache)
+
+
+def print_summary(results: dict, files: list, timings: Timings, total_elapsed: float,
+                  cache) -> int:
+    """Gesamtergebnis und Laufzeiten pro Pass; liefert den Exit-Code."""
     # Gesamtergebnis
     all_passed = all(results.values())
     print(f"\n{'='*60}")
@@ -80,6 +184,13 @@ def main():
         icon = "OK" if passed else "FAIL"
         print(f"  [{icon:>4}] {name}")
 
+    print(f"\n  Laufzeiten ({len(files)} Datei(en)):")
+    for name, values in timings.phases.items():
+        print(f"    {name:<22} {values['seconds']*1000:8.1f} ms")
+    print(f"    {'Gesamt':<22} {total_elapsed*1000:8.1f} ms")
+    if cache is not None:
+        print(f"    Parse-Cache: {cache.hits} Treffer, {cache.misses} neu geparst")
+
     if all_passed:
         print(f"\n  Alle Tests bestanden.")
     else:
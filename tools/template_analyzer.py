@@ -0,0 +1,291 @@
+"""Jinja-Template-Analyse fuer die Entity-Extraktion.
+
+Sucht in den {{ ... }}- und {% ... %}-Bloecken eines Strings nach
+Entity-Referenzen und zerlegt die gefundenen Ausdruecke mit einem
+Jinja-Lexer in Tokens:
+
+  states('x'), is_state('x', ...), state_attr('x', ...), is_state_attr('x', ...),
+  has_value('x'), expand('x', 'y' / [...]), device_id('x'), area_name('x') ...
+  'x' | states, 'x' | is_state('on'), ['x', 'y'] | expand
+  states.domain.objekt, states['x'], states.domain['objekt']
+  {% set e = 'x' %} ... states(e)
+
+Referenzen, deren Ziel erst zur Laufzeit feststeht (states(trigger.entity_id),
+'sensor.' ~ raum, states.light | ..., expand(area_entities(...))), werden
+als dynamisch gemeldet -- mit dem Ausdruck, wie er im Template steht.
+
+Gelext wird nur ab den Fundstellen der bekannten Funktionsnamen, nicht das
+ganze Template; bis dahin (und ueber String-Literale und Kommentare hinweg)
+springt ein vorkompilierter Regex. Dieselben Templates stehen oft in Dutzenden
+Automationen -- die Analyse ist deshalb pro Template-Text gecacht
+(analyze_template, LRU). Der Cache ist so gross, dass die Templates eines
+grossen Baums zwischen den Passes eines Laufs (Abhaengigkeiten, Extraktion)
+nicht verdraengt werden.
+
+Geliefert werden nur Kandidaten (entity_id, offset im String); Domain-Pruefung
+und Service-Filter macht entity_reference_checker._string_entities().
+"""
+
+import re
+from functools import lru_cache
+from itertools import islice
+from typing import NamedTuple
+
+# Funktionen/Filter, deren erstes Argument (bzw. linker Operand) eine Entity ist
+ENTITY_FUNCTIONS = {
+    "states", "is_state", "state_attr", "is_state_attr", "has_value", "state_translated",
+    "device_id", "area_id", "area_name", "floor_id", "floor_name", "label_ids",
+    "is_hidden_entity", "device_attr", "is_device_attr",
+}
+# ... bei diesen ist jedes Argument eine Entity (oder Liste von Entities)
+MULTI_ENTITY_FUNCTIONS = {"expand"}
+
+_STRING = r"""'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*\""""
+
+BLOCK_START = re.compile(r"\{[{%#]-?")
+
+# Naechste Fundstelle im Block. Alles davor wird im Regex uebersprungen: ganze
+# Woerter, Attribute (.states), String-Literale (Namen darin zaehlen nicht,
+# }} darin beendet den Block nicht). Ohne weitere Fundstelle matcht das
+# Block-Ende ("end") bzw. das String-Ende. Haeufigster Fall states('x') /
+# is_state('x', ...): der String landet direkt in "arg", ohne Lexer.
+# Der Skip-Teil ist atomar -- (?=(...))\1 statt des possessiven *+, das es erst
+# ab Python 3.11 gibt; ohne das wuerde ein offener Block exponentiell
+# zurueckverfolgt.
+_NAMES = "|".join(sorted(ENTITY_FUNCTIONS | MULTI_ENTITY_FUNCTIONS | {"set"}, key=len,
+                         reverse=True))
+CANDIDATE_PATTERN = re.compile(
+    r"""(?=(?P<skip>(?:[^'"\w.}%]+|\.\w*|""" + _STRING + r"|(?!(?:" + _NAMES
+    + r""")\b)\w+|['"]"""
+    r"|[}%](?!\}))*))(?P=skip)"
+    r"(?:(?P<name>" + _NAMES + r")\b"
+    r"""(?:\(\s*(?P<arg>'[^'\\]*'|"[^"\\]*")\s*(?P<after>[,)]))?|(?P<end>[}%]\})|\Z)""")
+
+# Linker Operand eines Filters: 'x' | ..., ['x', 'y'] | ..., a.b | ..., f(...) | ...
+LEFT_OPERAND_PATTERN = re.compile(
+    r"(?P<operand>" + _STRING + r"|\[(?:[^\[\]'\"]|" + _STRING + r")*\]"
+    r"|[A-Za-z_][\w.]*(?:\([^()]*\))?)\s*\|\s*\Z")
+# So weit wird fuer den linken Operanden zurueckgeschaut
+LEFT_OPERAND_WINDOW = 200
+
+TOKEN_PATTERN = re.compile(r"""
+    \s*(?:
+      (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+    | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+    | (?P<number>\d+(?:\.\d+)?)
+    | (?P<op>==|!=|<=|>=|//|\*\*|[-+*/%~|.,:()\[\]{}<>=!?])
+    | (?P<other>\S)
+    )""", re.VERBOSE)
+
+OPENING = {"(": ")", "[": "]", "{": "}"}
+CLOSING = {")", "]", "}"}
+
+
+class Token(NamedTuple):
+    kind: str       # name, string, number, op, other
+    value: str
+    start: int      # Offset im analysierten String
+
+
+class TemplateRefs(NamedTuple):
+    """Ergebnis der Analyse eines Strings."""
+    entities: tuple     # ((entity_id, offset), ...)
+    dynamic: tuple      # (ausdruck, ...) -- Ziel erst zur Laufzeit bekannt
+
+
+EMPTY = TemplateRefs((), ())
+
+
+def lex(text: str, pos: int, end: int):
+    """Jinja-Tokens in text[pos:end] (Generator, Whitespace entfaellt)."""
+    for m in TOKEN_PATTERN.finditer(text, pos, end):
+        kind = m.lastgroup
+        if kind is not None:
+            yield Token(kind, m.group(kind), m.start(kind))
+
+
+def _lex_expression(text: str, pos: int, end: int, limit: int) -> list[Token]:
+    """Tokens ab pos: hoechstens limit auf oberster Ebene, offene Klammern werden
+    immer bis zur schliessenden gelesen."""
+    tokens = []
+    depth = 0
+    for token in lex(text, pos, end):
+        tokens.append(token)
+        if token.kind == "op":
+            if token.value in OPENING:
+                depth += 1
+            elif token.value in CLOSING:
+                depth -= 1
+                if depth <= 0 and len(tokens) > 2:
+                    break
+        if depth <= 0 and len(tokens) >= limit:
+            break
+    return tokens
+
+
+def _string_value(token: Token) -> str:
+    return token.value[1:-1]
+
+
+def _close(tokens: list[Token], i: int) -> int:
+    """Index der schliessenden Klammer zu tokens[i] (oder len(tokens))."""
+    depth = 0
+    for j in range(i, len(tokens)):
+        value = tokens[j].value if tokens[j].kind == "op" else ""
+        if value in OPENING:
+            depth += 1
+        elif value in CLOSING:
+            depth -= 1
+            if depth == 0:
+                return j
+    return len(tokens)
+
+
+def _split_args(tokens: list[Token], start: int, end: int) -> list[tuple[int, int]]:
+    """Positionsargumente zwischen start und end als (von, bis); Keyword-Args entfallen."""
+    args = []
+    depth = 0
+    first = start
+    for j in range(start, end + 1):
+        value = tokens[j].value if j < end and tokens[j].kind == "op" else ""
+        if value in OPENING:
+            depth += 1
+        elif value in CLOSING:
+            depth -= 1
+        if j == end or (value == "," and depth == 0):
+            keyword = (j - first >= 2 and tokens[first].kind == "name"
+                       and tokens[first + 1].value == "=")
+            if j > first and not keyword:
+                args.append((first, j))
+            first = j + 1
+    return args
+
+
+class _Analysis:
+    def __init__(self, text: str):
+        self.text = text
+        self.entities = []
+        self.dynamic = []
+        self.assigned = {}      # {% set name = 'x' %} -> Token des Strings
+
+    def source(self, tokens: list[Token], start: int, end: int) -> str:
+        """Ausdruck tokens[start:end] so, wie er im Template steht."""
+        last = tokens[end - 1]
+        return self.text[tokens[start].start:last.start + len(last.value)]
+
+    def static(self, token: Token):
+        self.entities.append((_string_value(token), token.start + 1))
+
+    def operand(self, tokens: list[Token], start: int, end: int, multi: bool):
+        """Ein Argument: String, Liste von Strings, gesetzte Variable -- sonst dynamisch."""
+        if end - start == 1:
+            token = tokens[start]
+            if token.kind == "string":
+                self.static(token)
+                return
+            if token.kind == "name" and token.value in self.assigned:
+                self.static(self.assigned[token.value])
+                return
+        if multi and tokens[start].value in ("[", "(") and _close(tokens, start) == end - 1:
+            items = _split_args(tokens, start + 1, end - 1)
+            if all(b - a == 1 and tokens[a].kind == "string" for a, b in items):
+                for a, _ in items:
+                    self.static(tokens[a])
+                return
+        self.dynamic.append(self.source(tokens, start, end))
+
+    def block(self, start: int) -> int:
+        """Alle Fundstellen eines Blocks ab start; liefert das Ende des Blocks."""
+        text = self.text
+        end = len(text)
+        for m in CANDIDATE_PATTERN.finditer(text, start):
+            name = m.group("name")
+            if name is None:
+                return m.end()
+            pos = m.start("name")
+            if name == "set":
+                self.assignment(pos)
+                continue
+            multi = name in MULTI_ENTITY_FUNCTIONS
+            j = pos - 1
+            while j >= start and text[j] in " \t\r\n":
+                j -= 1
+            if j >= start and text[j] == "|":
+                # Filter-Form: 'x' | states -- die Entity steht links
+                before = text[max(start, pos - LEFT_OPERAND_WINDOW):pos]
+                left = LEFT_OPERAND_PATTERN.search(before)
+                if left is not None:
+                    offset = pos - len(before) + left.start("operand")
+                    tokens = list(lex(text, offset, offset + len(left.group("operand"))))
+                    self.operand(tokens, 0, len(tokens), multi)
+                continue
+            arg = m.group("arg")
+            if arg is not None and (not multi or m.group("after") == ")"):
+                self.entities.append((arg[1:-1], m.start("arg") + 1))
+                continue
+            tokens = _lex_expression(text, pos, end, 5)
+            following = tokens[1].value if len(tokens) > 1 else ""
+            if following == "(":
+                close = _close(tokens, 1)
+                args = _split_args(tokens, 2, close)
+                for a, b in (args if multi else args[:1]):
+                    self.operand(tokens, a, b, multi)
+            elif name == "states":
+                self.states_access(tokens)
+
+    def assignment(self, pos: int):
+        """{% set name = 'x' %} merken; jede andere Zuweisung vergisst name."""
+        tokens = list(islice(lex(self.text, pos, len(self.text)), 5))
+        if len(tokens) < 4 or tokens[1].kind != "name" or tokens[2].value != "=":
+            return
+        if tokens[3].kind == "string" and (len(tokens) == 4 or tokens[4].value in ("%", "-")):
+            self.assigned[tokens[1].value] = tokens[3]
+        else:
+            self.assigned.pop(tokens[1].value, None)
+
+    def states_access(self, tokens: list[Token]):
+        """states.domain.objekt, states['x'], states.domain['objekt']"""
+        n = len(tokens)
+        if n > 1 and tokens[1].value == "[":
+            close = _close(tokens, 1)
+            if close == 3 and tokens[2].kind == "string":
+                self.static(tokens[2])
+            else:
+                self.dynamic.append(self.source(tokens, 0, min(close + 1, n)))
+            return
+        if not (n > 2 and tokens[1].value == "." and tokens[2].kind == "name"):
+            return
+        domain = tokens[2]
+        if n > 4 and tokens[3].value == "." and tokens[4].kind == "name":
+            self.entities.append((f"{domain.value}.{tokens[4].value}", domain.start))
+        elif n > 3 and tokens[3].value == "[":
+            close = _close(tokens, 3)
+            if close == 5 and tokens[4].kind == "string":
+                key = tokens[4]
+                self.entities.append((f"{domain.value}.{_string_value(key)}", domain.start))
+            else:
+                self.dynamic.append(self.source(tokens, 0, min(close + 1, n)))
+        else:
+            # Ganze Domain (states.light | selectattr(...))
+            self.dynamic.append(self.source(tokens, 0, 3))
+
+
+@lru_cache(maxsize=32768)
+def analyze_template(text: str) -> TemplateRefs:
+    """Entity-Kandidaten und dynamische Referenzen eines Strings (gecacht)."""
+    if "{" not in text:
+        return EMPTY
+    analysis = _Analysis(text)
+    pos = 0
+    while True:
+        m = BLOCK_START.search(text, pos)
+        if m is None:
+            break
+        if m.group().startswith("{#"):
+            end = text.find("#}", m.end())
+            pos = len(text) if end < 0 else end + 2
+        else:
+            pos = analysis.block(m.end())
+    if not analysis.entities and not analysis.dynamic:
+        return EMPTY
+    return TemplateRefs(tuple(analysis.entities), tuple(dict.fromkeys(analysis.dynamic)))
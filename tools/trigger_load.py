@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""Trigger-Last: wie oft wird jede Automation pro Stunde ausgewertet?
+
+Offline-Schaetzung ueber alle automation:-Bloecke, bevor etwas deployt wird:
+
+  time_pattern   exakt aus hours/minutes/seconds (wie HA: fehlende kleinere
+                 Einheiten werden 0, /1 bei hours heisst einmal pro Stunde)
+  time           Anzahl der at:-Zeiten pro Tag / 24
+  state,         Update-Rate jeder beobachteten Entity -- ausgewertet wird bei
+  numeric_state  jeder Aenderung, egal ob to:/above: am Ende passt
+  template       Summe der Raten aller referenzierten Entities; now() oder
+                 dynamische Referenzen mindestens einmal pro Minute
+  event, mqtt .. aus der Tabelle (events:/triggers:), sonst 1 pro Stunde
+  sun, ...       einmal pro Tag
+
+Update-Raten (Zustandsaenderungen pro Stunde) kommen in dieser Reihenfolge aus:
+gemessenen Zaehlungen (--sample: Recorder-DB home-assistant_v2.db oder ein
+Log mit state_changed-Debugzeilen), trigger_rates.yaml (entities, patterns,
+domains; Vorlage trigger_rates.example.yaml), der eingebauten Domain-Tabelle.
+
+Gemeldet werden Automationen und Entities nach Auswertungen pro Stunde und
+ueberbreite Trigger: ein State-Trigger ohne to:/from:/not_to:/not_from: feuert
+in HA auch bei jeder Attribut-Aenderung -- auf einer gespraechigen Entity
+(Rate >= chatty) ist das fast immer ungewollt.
+
+Nutzung:
+  python tools/trigger_load.py                          # Ranking ueber packages/
+  python tools/trigger_load.py --sample home-assistant_v2.db --top 30
+  python tools/trigger_load.py --max-per-hour 600       # Exit 1 darueber
+"""
+
+import re
+import sys
+import math
+import sqlite3
+import argparse
+import fnmatch
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import NamedTuple
+
+import yaml
+
+from ha_yaml import (add_loader_arguments, collect_files, load_documents, open_cache,
+                     save_documents, DEFAULT_PACKAGES_DIR, PROJECT_DIR, PackageDocument)
+from dependency_graph import _as_list, automation_node
+from entity_reference_checker import extract_dynamic_refs, extract_entity_ids
+from log_analyzer import RECORD_PATTERN
+from recorder_analyzer import recorder_counts
+
+# Windows-Encoding fix: UTF-8 erzwingen
+if sys.stdout.encoding != "utf-8":
+    sys.stdout.reconfigure(encoding="utf-8")
+
+DEFAULT_RATES_FILE = PROJECT_DIR / "trigger_rates.yaml"
+
+# Zustandsaenderungen pro Stunde, wenn nichts Genaueres bekannt ist
+DEFAULT_DOMAIN_RATES = {
+    "sensor": 30, "binary_sensor": 4, "light": 4, "switch": 2, "cover": 1, "climate": 6,
+    "media_player": 10, "person": 1, "device_tracker": 4, "sun": 2, "weather": 2,
+    "input_boolean": 1, "input_number": 1, "input_select": 1, "input_text": 1,
+    "input_datetime": 1, "input_button": 1, "counter": 1, "timer": 2, "automation": 1,
+    "script": 1, "alarm_control_panel": 1, "lock": 1, "zone": 1,
+}
+DEFAULT_RATE = 2.0
+DEFAULT_OTHER_RATE = 1.0
+DEFAULT_CHATTY = 60.0
+# Templates mit now() oder Referenzen erst zur Laufzeit: HA rendert hoechstens 1x/Minute neu
+TEMPLATE_MINUTE_RATE = 60.0
+DAILY_TRIGGERS = {"sun", "homeassistant", "calendar", "time"}
+NOW_PATTERN = re.compile(r"\b(?:now|utcnow)\(\)")
+
+# <Event state_changed[L]: entity_id=sensor.x, old_state=...  (logger homeassistant.core: debug)
+STATE_CHANGED_PATTERN = re.compile(
+    rb"<Event state_changed\[[LR]\]: entity_id=([a-z0-9_]+\.[a-z0-9_]+)")
+
+
+class Trigger(NamedTuple):
+    """Ein Trigger, wie er im Parse-Cache liegt (unabhaengig von der Raten-Tabelle)."""
+    platform: str
+    per_hour: float | None      # feste Rate (time, time_pattern) oder None
+    entities: tuple             # beobachtete Entities
+    broad: bool                 # State-Trigger ohne to/from -- auch Attribut-Aenderungen
+    minute: bool                # Template mit now()/dynamischen Referenzen
+    key: str                    # event_type bzw. Plattform fuer die Tabelle
+
+
+class Rates:
+    """Update-Raten pro Entity: gemessen > entities > patterns > domains."""
+
+    def __init__(self):
+        self.domains = dict(DEFAULT_DOMAIN_RATES)
+        self.entities = {}
+        self.patterns = []
+        self.events = {}
+        self.triggers = {}
+        self.measured = {}
+        self.chatty = DEFAULT_CHATTY
+
+    @classmethod
+    def from_file(cls, path: Path) -> "Rates":
+        rates = cls()
+        with open(path, "r", encoding="utf-8") as f:
+            data = yaml.safe_load(f) or {}
+        if not isinstance(data, dict):
+            raise ValueError(f"{path}: muss ein Dict sein")
+        rates.domains.update({str(k): float(v) for k, v in (data.get("domains") or {}).items()})
+        rates.entities = {str(k): float(v) for k, v in (data.get("entities") or {}).items()}
+        rates.patterns = [(str(k), float(v)) for k, v in (data.get("patterns") or {}).items()]
+        rates.events = {str(k): float(v) for k, v in (data.get("events") or {}).items()}
+        rates.triggers = {str(k): float(v) for k, v in (data.get("triggers") or {}).items()}
+        rates.chatty = float(data.get("chatty", DEFAULT_CHATTY))
+        return rates
+
+    def rate(self, entity: str) -> tuple[float, str]:
+        """(Aenderungen pro Stunde, Quelle)."""
+        if entity in self.measured:
+            return self.measured[entity], "gemessen"
+        if entity in self.entities:
+            return self.entities[entity], "Tabelle"
+        for pattern, value in self.patterns:
+            if fnmatch.fnmatchcase(entity, pattern):
+                return value, f"Muster {pattern}"
+        domain = entity.split(".", 1)[0]
+        if domain in self.domains:
+            return self.domains[domain], "Domain"
+        return DEFAULT_RATE, "Default"
+
+    def other(self, trigger: Trigger) -> float:
+        if trigger.platform == "event":
+            return self.events.get(trigger.key, DEFAULT_OTHER_RATE)
+        return self.triggers.get(trigger.key, DEFAULT_OTHER_RATE)
+
+
+def load_rates(path: str | None = None) -> Rates:
+    """Raten aus --rates, sonst trigger_rates.yaml, sonst Defaults."""
+    if path:
+        return Rates.from_file(Path(path))
+    if DEFAULT_RATES_FILE.is_file():
+        return Rates.from_file(DEFAULT_RATES_FILE)
+    return Rates()
+
+
+# ---------------------------------------------------------------------------
+# Gemessene Raten
+# ---------------------------------------------------------------------------
+def log_counts(path: Path) -> tuple[dict[str, int], float]:
+    """state_changed-Zeilen pro Entity und abgedeckte Stunden aus einem Debug-Log."""
+    counts = defaultdict(int)
+    first = last = None
+    with open(path, "rb") as f:
+        for line in f:
+            m = RECORD_PATTERN.match(line)
+            if m is not None:
+                stamp = m.group(1)
+                first = first or stamp
+                last = stamp
+            hit = STATE_CHANGED_PATTERN.search(line)
+            if hit is not None:
+                counts[hit.group(1).decode("ascii")] += 1
+    hours = 0.0
+    if first is not None:
+        span = datetime.fromisoformat(last.decode()) - datetime.fromisoformat(first.decode())
+        hours = span.total_seconds() / 3600
+    return dict(counts), hours
+
+
+def add_sample(rates: Rates, path: Path) -> tuple[int, float]:
+    """Gemessene Raten aus Recorder-DB oder Log uebernehmen: (Entities, Stunden)."""
+    with open(path, "rb") as f:
+        sqlite = f.read(16) == b"SQLite format 3\x00"
+    counts, hours = recorder_counts(path) if sqlite else log_counts(path)
+    if hours <= 0:
+        return 0, hours
+    # Mehrere Stichproben: die hoechste gemessene Rate zaehlt
+    for entity, count in counts.items():
+        rates.measured[entity] = max(rates.measured.get(entity, 0.0), count / hours)
+    return len(counts), hours
+
+
+# ---------------------------------------------------------------------------
+# Trigger-Extraktion pro Datei (gememot)
+# ---------------------------------------------------------------------------
+def _matches(value, size: int) -> float:
+    """Treffer pro Zyklus eines time_pattern-Felds (None/'*' = jeder Wert)."""
+    if value is None:
+        return size
+    text = str(value).strip()
+    if text == "*":
+        return size
+    if text.startswith("/"):
+        try:
+            step = int(text[1:])
+        except ValueError:
+            return size
+        return math.ceil(size / step) if step > 0 else size
+    return 1
+
+
+def time_pattern_rate(trigger: dict) -> float:
+    """Ausloesungen pro Stunde eines time_pattern-Triggers."""
+    hours = trigger.get("hours")
+    minutes = trigger.get("minutes")
+    seconds = trigger.get("seconds")
+    # Wie HA: groessere Einheit angegeben -> kleinere werden 0
+    if minutes is None and hours is not None:
+        minutes = 0
+    if seconds is None and minutes is not None:
+        seconds = 0
+    return _matches(seconds, 60) * _matches(minutes, 60) * _matches(hours, 24) / 24
+
+
+def extract_triggers(content, stem: str) -> list[tuple[str, list[Trigger]]]:
+    """[(automation, [Trigger, ...]), ...] einer Datei."""
+    if isinstance(content, dict):
+        automations = content.get("automation")
+    else:
+        automations = content
+    result = []
+    if not isinstance(automations, list):
+        return result
+    for i, auto in enumerate(automations):
+        if not isinstance(auto, dict):
+            continue
+        triggers = []
+        for trigger in _as_list(auto.get("triggers", auto.get("trigger"))):
+            if isinstance(trigger, dict):
+                # Als Tupel: die Klasse ist im Cache nicht von jedem Skript aus importierbar
+                triggers.append(tuple(_trigger(trigger)))
+        result.append((automation_node(auto, i, stem), triggers))
+    return result
+
+
+def _trigger(trigger: dict) -> Trigger:
+    platform = str(trigger.get("trigger", trigger.get("platform", "")))
+    if platform == "time_pattern":
+        return Trigger(platform, time_pattern_rate(trigger), (), False, False, platform)
+    if platform in DAILY_TRIGGERS:
+        times = len(_as_list(trigger.get("at"))) if platform == "time" else 1
+        return Trigger(platform, max(times, 1) / 24, (), False, False, platform)
+    if platform == "event":
+        types = [str(t) for t in _as_list(trigger.get("event_type"))]
+        return Trigger(platform, None, (), False, False, ",".join(types))
+
+    found = set()
+    if platform in ("state", "numeric_state"):
+        extract_entity_ids(trigger.get("entity_id"), found)
+    else:
+        extract_entity_ids(trigger, found)
+    broad = platform == "state" and not any(
+        k in trigger for k in ("to", "from", "not_to", "not_from", "attribute"))
+    minute = False
+    if platform == "template":
+        dynamic = set()
+        extract_dynamic_refs(trigger, dynamic)
+        template = trigger.get("value_template")
+        minute = bool(dynamic) or (isinstance(template, str)
+                                   and NOW_PATTERN.search(template) is not None)
+    return Trigger(platform, None, tuple(sorted(found)), broad, minute, platform)
+
+
+# ---------------------------------------------------------------------------
+# Auswertung
+# ---------------------------------------------------------------------------
+class AutomationLoad(NamedTuple):
+    automation: str
+    file: str
+    per_hour: float
+    parts: list         # [(beschreibung, pro Stunde)]
+
+
+class LoadReport:
+    def __init__(self):
+        self.automations = []                   # [AutomationLoad]
+        self.by_entity = defaultdict(float)     # Entity -> verursachte Auswertungen/h
+        self.watchers = defaultdict(set)        # Entity -> Automationen
+        self.broad = []                         # (datei, automation, entity, rate)
+        self.sources = {}                       # Entity -> Quelle der Rate
+
+
+def load_pass(documents: list[PackageDocument], rates: Rates) -> LoadReport:
+    """Auswertungen pro Stunde aller Automationen (Extraktion aus dem Cache)."""
+    report = LoadReport()
+    for doc in documents:
+        if not doc.ok or doc.content is None:
+            continue
+        for automation, triggers in doc.memo(
+                "trigger_load", lambda: extract_triggers(doc.content, doc.path.stem)):
+            parts = []
+            for trigger in triggers:
+                parts.extend(_evaluate(trigger, automation, doc.name, rates, report))
+            report.automations.append(AutomationLoad(automation, doc.name,
+                                                     sum(r for _, r in parts), parts))
+    report.automations.sort(key=lambda a: (-a.per_hour, a.file, a.automation))
+    return report
+
+
+def _evaluate(trigger: Trigger, automation: str, fname: str, rates: Rates,
+              report: LoadReport) -> list[tuple[str, float]]:
+    trigger = Trigger(*trigger)
+    if trigger.per_hour is not None:
+        return [(trigger.platform, trigger.per_hour)]
+    if not trigger.entities and not trigger.minute:
+        return [(f"{trigger.platform} {trigger.key}".strip(), rates.other(trigger))]
+    parts = []
+    for entity in trigger.entities:
+        rate, source = rates.rate(entity)
+        report.sources[entity] = source
+        report.by_entity[entity] += rate
+        report.watchers[entity].add(automation)
+        parts.append((f"{trigger.platform} {entity}", rate))
+        if trigger.broad and rate >= rates.chatty:
+            report.broad.append((fname, automation, entity, rate))
+    if trigger.minute:
+        parts.append((f"{trigger.platform} (now()/dynamisch)", TEMPLATE_MINUTE_RATE))
+    return parts
+
+
+def print_report(total: int, report: LoadReport, top: int = 20,
+                 max_per_hour: float | None = None) -> int:
+    print(f"\n{'='*60}")
+    print(f"  Trigger-Last -- {total} Datei(en), {len(report.automations)} Automation(en)")
+    print(f"{'='*60}")
+    overall = sum(a.per_hour for a in report.automations)
+    print(f"\n  Gesamt: {overall:,.0f} Auswertungen pro Stunde "
+          f"({overall / 3600:.2f} pro Sekunde)")
+
+    shown = report.automations[:top] if top else report.automations
+    print(f"\n  Automationen nach Auswertungen/h:")
+    for auto in shown:
+        print(f"    {auto.per_hour:10.1f}  {auto.automation} ({auto.file})")
+        for what, rate in sorted(auto.parts, key=lambda p: -p[1])[:3]:
+            print(f"                  {rate:8.1f}  {what}")
+
+    entities = sorted(report.by_entity.items(), key=lambda e: (-e[1], e[0]))
+    if entities:
+        print(f"\n  Entities nach verursachten Auswertungen/h (Automationen, Quelle der Rate):")
+        for entity, load in entities[:top] if top else entities:
+            print(f"    {load:10.1f}  {entity}  "
+                  f"({len(report.watchers[entity])}, {report.sources[entity]})")
+
+    if report.broad:
+        print(f"\n  WARNUNG: Ueberbreite Trigger ({len(report.broad)}) -- State-Trigger ohne "
+              f"to:/from: feuert auch bei Attribut-Aenderungen:")
+        for fname, automation, entity, rate in sorted(report.broad):
+            print(f"    {fname}: {automation} <- {entity} ({rate:.0f}/h)")
+        print(f"    Abhilfe: 'to: ~' (nur Zustandswechsel) oder konkrete to:/from:-Werte")
+
+    failed = []
+    if max_per_hour is not None:
+        failed = [a for a in report.automations if a.per_hour > max_per_hour]
+        if failed:
+            print(f"\n  FEHLER: {len(failed)} Automation(en) ueber {max_per_hour:g} "
+                  f"Auswertungen/h")
+    print(f"\n  ERGEBNIS: {'FEHLGESCHLAGEN' if failed else 'BESTANDEN'}")
+    print(f"{'='*60}\n")
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trigger-Last: Auswertungen pro Stunde schaetzen")
+    parser.add_argument("files", nargs="*", help="YAML-Dateien (Default: alle Packages)")
+    parser.add_argument("--packages-dir", "-d", default=str(DEFAULT_PACKAGES_DIR),
+                        help="Packages-Verzeichnis (Default: packages/)")
+    parser.add_argument("--rates",
+                        help="Raten-Tabelle (YAML, Default: trigger_rates.yaml falls vorhanden)")
+    parser.add_argument("--sample", action="append", default=[],
+                        help="Gemessene Raten aus Recorder-DB oder Debug-Log (mehrfach moeglich)")
+    parser.add_argument("--top", type=int, default=20,
+                        help="Anzahl Automationen/Entities im Ranking (Default: 20, 0 = alle)")
+    parser.add_argument("--max-per-hour", type=float,
+                        help="Exit 1, wenn eine Automation oefter ausgewertet wird")
+    add_loader_arguments(parser)
+    args = parser.parse_args()
+
+    try:
+        rates = load_rates(args.rates)
+    except (OSError, ValueError, TypeError, yaml.YAMLError) as e:
+        print(f"Raten-Tabelle nicht lesbar: {e}")
+        return 1
+    for sample in args.sample:
+        try:
+            count, hours = add_sample(rates, Path(sample))
+        except (OSError, sqlite3.Error, ValueError) as e:
+            print(f"Stichprobe {sample} nicht lesbar: {e}")
+            return 1
+        print(f"  Stichprobe {sample}: {count} Entities ueber {hours:.1f} h")
+
+    files = collect_files(args.files, args.packages_dir)
+    if not files:
+        print("Keine YAML-Dateien gefunden.")
+        return 0
+    cache = open_cache(not args.no_cache)
+    documents = load_documents(files, cache, args.jobs)
+    report = load_pass(documents, rates)
+    save_documents(documents, cache)
+    return print_report(len(files), report, args.top, args.max_per_hour)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,14 +6,31 @@ Prueft:
   2. UTF-8 Encoding
   3. Struktur: automations brauchen trigger+action, scripts brauchen sequence
   4. Doppelte Automation-IDs ueber alle Packages
+  5. KNX: ungueltige/doppelte GAs, DPT-Konflikte, Platzhalter, sync_state-Last
+     (siehe knx_checker.py)
+
+Mit --watch bleibt der Validator resident und prueft nur geaenderte Dateien
+(siehe package_watch.py). Mit --changed werden nur die laut git geaenderten
+Dateien geladen, der Rest kommt aus einem Index (siehe changed_set.py).
+Mit --format ndjson / --fail-fast wird jede Datei sofort gemeldet, die
+zuletzt geaenderten zuerst (siehe result_stream.py). Mit --resolve werden
+!include/!secret aufgeloest und eingebundene Dateien mitgeprueft (siehe
+include_graph.py).
 """
 
 import sys
-import yaml
 import argparse
 from pathlib import Path
 from collections import defaultdict
 
+from ha_yaml import (PackageDocument, add_loader_arguments, collect_files,
+                     load_document, open_cache, save_documents,
+                     DEFAULT_PACKAGES_DIR)
+from include_graph import add_resolve_arguments, open_resolver
+from dependency_graph import dependency_pass
+from knx_checker import knx_pass
+from profiling import Timings, add_profiling_arguments
+
 # Windows-Encoding fix: UTF-8 erzwingen
 if sys.stdout.encoding != "utf-8":
     sys.stdout.reconfigure(encoding="utf-8")
@@ -21,35 +38,6 @@ if sys.stderr.encoding != "utf-8":
     sys.stderr.reconfigure(encoding="utf-8")
 
 
-# ---------------------------------------------------------------------------
-# HA-kompatibler YAML-Loader (unterstuetzt !include, !secret, !input, etc.)
-# ---------------------------------------------------------------------------
-class HAYamlLoader(yaml.SafeLoader):
-    """YAML-Loader mit Home Assistant Custom Tags."""
-    pass
-
-
-def _ha_tag_constructor(loader, tag_suffix, node):
-    """Generischer Konstruktor fuer HA-Tags -- gibt Platzhalter zurueck."""
-    if isinstance(node, yaml.ScalarNode):
-        return f"!{tag_suffix} {loader.construct_scalar(node)}"
-    if isinstance(node, yaml.SequenceNode):
-        return loader.construct_sequence(node)
-    if isinstance(node, yaml.MappingNode):
-        return loader.construct_mapping(node)
-    return None
-
-
-# Alle HA-spezifischen Tags registrieren
-for tag in ("include", "include_dir_list", "include_dir_named",
-            "include_dir_merge_list", "include_dir_merge_named",
-            "secret", "input", "env_var"):
-    HAYamlLoader.add_constructor(
-        f"!{tag}",
-        lambda loader, node, t=tag: _ha_tag_constructor(loader, t, node),
-    )
-
-
 # ---------------------------------------------------------------------------
 # Validierungs-Logik
 # ---------------------------------------------------------------------------
@@ -57,30 +45,37 @@ class ValidationResult:
     def __init__(self):
         self.errors = []
         self.warnings = []
+        # Dieselben Meldungen strukturiert (level, datei, text) fuer --format ndjson
+        self.entries = []
 
     def error(self, file: str, msg: str):
         self.errors.append(f"  FEHLER  {file}: {msg}")
+        self.entries.append(("error", file, msg))
 
     def warn(self, file: str, msg: str):
         self.warnings.append(f"  WARNUNG {file}: {msg}")
+        self.entries.append(("warning", file, msg))
 
     @property
     def ok(self) -> bool:
         return len(self.errors) == 0
 
 
+def _report_load_error(doc: PackageDocument, result: ValidationResult):
+    """Meldet einen Ladefehler (fehlende Datei, Encoding, Syntax)."""
+    if not doc.path.exists():
+        result.error(str(doc.path), doc.error)
+    else:
+        result.error(doc.name, doc.error)
+
+
 def validate_yaml_syntax(filepath: Path, result: ValidationResult) -> dict | list | None:
     """Prueft YAML-Syntax und gibt geparsten Inhalt zurueck."""
-    try:
-        with open(filepath, "r", encoding="utf-8") as f:
-            content = yaml.load(f, Loader=HAYamlLoader)
-        return content
-    except UnicodeDecodeError as e:
-        result.error(filepath.name, f"Encoding-Fehler (kein gueltiges UTF-8): {e}")
-        return None
-    except yaml.YAMLError as e:
-        result.error(filepath.name, f"YAML-Syntax-Fehler: {e}")
+    doc = load_document(filepath)
+    if not doc.ok:
+        _report_load_error(doc, result)
         return None
+    return doc.content
 
 
 def validate_package_structure(filepath: Path, content, result: ValidationResult):
@@ -114,7 +109,7 @@ def validate_package_structure(filepath: Path, content, result: ValidationResult
         "template", "sensor", "binary_sensor", "switch", "light", "cover",
         "fan", "climate", "lock", "media_player", "notify", "group",
         "shell_command", "rest_command", "homeassistant", "knx",
-        "alert", "scene", "mqtt",
+        "alert", "scene", "mqtt", "recorder",
     }
 
     for key, value in content.items():
@@ -197,52 +192,48 @@ def _check_duplicate_ids(all_ids: list, result: ValidationResult):
 
 
 # ---------------------------------------------------------------------------
-# Main
+# Passes ueber das gemeinsame Dokument-Modell
 # ---------------------------------------------------------------------------
-def main():
-    parser = argparse.ArgumentParser(description="HA Package YAML Validator")
-    parser.add_argument("files", nargs="*", help="YAML-Dateien zum Pruefen")
-    parser.add_argument("--packages-dir", "-d",
-                        help="Packages-Verzeichnis (prueft alle .yaml darin)")
-    args = parser.parse_args()
+def syntax_pass(documents: list[PackageDocument], result: ValidationResult):
+    """Meldet alle Dateien, die nicht geladen werden konnten."""
+    for doc in documents:
+        if not doc.ok:
+            _report_load_error(doc, result)
 
-    # Dateien sammeln
-    files = []
-    if args.files:
-        files = [Path(f) for f in args.files]
-    elif args.packages_dir:
-        pkg_dir = Path(args.packages_dir)
-        if pkg_dir.is_dir():
-            files = sorted(pkg_dir.glob("**/*.yaml"))
-    else:
-        # Default: packages/ im Projektverzeichnis
-        project_dir = Path(__file__).resolve().parent.parent
-        pkg_dir = project_dir / "packages"
-        if pkg_dir.is_dir():
-            files = sorted(pkg_dir.glob("**/*.yaml"))
 
-    if not files:
-        print("Keine YAML-Dateien gefunden.")
-        return 0
+def structure_pass(documents: list[PackageDocument], result: ValidationResult):
+    """Prueft die Package-Struktur aller geladenen Dateien."""
+    for doc in documents:
+        if doc.ok and doc.content is not None:
+            validate_package_structure(doc.path, doc.content, result)
 
-    result = ValidationResult()
-    all_auto_ids = []
 
-    for filepath in files:
-        if not filepath.exists():
-            result.error(str(filepath), "Datei nicht gefunden")
-            continue
-        content = validate_yaml_syntax(filepath, result)
-        if content is not None:
-            validate_package_structure(filepath, content, result)
-            # Automation-IDs sammeln fuer Duplikat-Pruefung
-            _collect_automation_ids(filepath, content, all_auto_ids)
+def automation_id_pass(documents: list[PackageDocument]):
+    """Sammelt die Automation-IDs pro Datei vorab (Memo, fuer duplicate_id_pass)."""
+    for doc in documents:
+        if doc.ok and doc.content is not None:
+            doc.memo("automation_ids", lambda: _automation_id_pairs(doc))
+
 
-    # Doppelte Automation-IDs ueber alle Dateien pruefen
+def duplicate_id_pass(documents: list[PackageDocument], result: ValidationResult):
+    """Prueft doppelte Automation-IDs ueber alle Dateien."""
+    all_auto_ids = []
+    for doc in documents:
+        if doc.ok and doc.content is not None:
+            for aid, alias in doc.memo("automation_ids", lambda: _automation_id_pairs(doc)):
+                all_auto_ids.append((doc.name, aid, alias))
     _check_duplicate_ids(all_auto_ids, result)
 
-    # Ausgabe
-    total = len(files)
+
+def _automation_id_pairs(doc: PackageDocument) -> list[tuple]:
+    """(id, alias)-Paare eines Dokuments (cachebar, ohne Dateiname)."""
+    ids = []
+    _collect_automation_ids(doc.path, doc.content, ids)
+    return [(aid, alias) for _, aid, alias in ids]
+
+
+def print_report(total: int, result: ValidationResult) -> int:
+    """Gibt das Ergebnis aus und liefert den Exit-Code."""
     print(f"\n{'='*60}")
     print(f"  HA YAML Validator -- {total} Datei(en) geprueft")
     print(f"{'='*60}")
@@ -265,5 +256,90 @@ def main():
         return 0
 
 
+# ---------------------------------------------------------------------------
+# Main
+# ---------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="HA Package YAML Validator")
+    parser.add_argument("files", nargs="*", help="YAML-Dateien zum Pruefen")
+    parser.add_argument("--packages-dir", "-d",
+                        help="Packages-Verzeichnis (prueft alle .yaml darin)")
+    parser.add_argument("--watch", "-w", action="store_true",
+                        help="Resident bleiben und geaenderte Dateien sofort pruefen")
+    parser.add_argument("--poll", action="store_true",
+                        help="Im Watch-Modus Polling statt inotify nutzen")
+    parser.add_argument("--interval", type=float, default=1.0,
+                        help="Polling-Intervall in Sekunden (Default: 1.0)")
+    parser.add_argument("--changed", action="store_true",
+                        help="Nur geaenderte Dateien pruefen, Rest aus dem Index (siehe changed_set.py)")
+    parser.add_argument("--since", default="HEAD",
+                        help="Mit --changed: Git-Revision oder 'deployed' (Default: HEAD)")
+    parser.add_argument("--format", choices=["text", "ndjson"], default="text",
+                        help="Ausgabe: Report (text) oder eine JSON-Zeile pro Datei (ndjson)")
+    parser.add_argument("--fail-fast", action="store_true",
+                        help="Beim ersten Fehler abbrechen (zuletzt geaenderte Dateien zuerst)")
+    add_loader_arguments(parser)
+    add_resolve_arguments(parser)
+    add_profiling_arguments(parser)
+    args = parser.parse_args()
+
+    if args.watch:
+        from package_watch import watch
+        from naming_rules import load_rules
+        root = Path(args.packages_dir) if args.packages_dir else DEFAULT_PACKAGES_DIR
+        return watch(root, open_cache(not args.no_cache), load_rules(),
+                     poll=args.poll, interval=args.interval)
+
+    if args.resolve or args.timings or args.profile or args.tracemalloc:
+        if args.changed:
+            parser.error("--changed unterstuetzt --resolve, --timings, --profile und "
+                         "--tracemalloc nicht")
+        if args.format == "ndjson" or args.fail_fast:
+            parser.error("--format ndjson/--fail-fast unterstuetzen --resolve, --timings, "
+                         "--profile und --tracemalloc nicht")
+
+    if args.changed:
+        from changed_set import validate_changed
+        root = Path(args.packages_dir) if args.packages_dir else DEFAULT_PACKAGES_DIR
+        return validate_changed(root, args.files, args.since, open_cache(not args.no_cache),
+                                args.jobs, args.format, args.fail_fast)
+
+    files = collect_files(args.files, args.packages_dir)
+    if not files:
+        print("Keine YAML-Dateien gefunden.")
+        return 0
+
+    cache = open_cache(not args.no_cache)
+    if args.format == "ndjson" or args.fail_fast:
+        from result_stream import stream_validate
+        return stream_validate(files, cache, args.format, args.fail_fast)
+
+    timings = Timings.from_args(args, "yaml_validator")
+    with timings.session():
+        documents = timings.load(files, cache, args.jobs)
+        result = ValidationResult()
+        loaded = documents
+        resolver = open_resolver(args, args.packages_dir or DEFAULT_PACKAGES_DIR, cache)
+        if resolver is not None:
+            with timings.phase("Includes"):
+                documents = resolver.resolve(documents)
+                resolver.report_to(result)
+        timings.each("Syntax", loaded, lambda docs: syntax_pass(docs, result))
+        timings.each("Struktur", documents, lambda docs: structure_pass(docs, result))
+        timings.each("Automation-IDs", documents, automation_id_pass)
+        # Doppelte Automation-IDs ueber alle Dateien pruefen
+        with timings.phase("Doppelte IDs"):
+            duplicate_id_pass(documents, result)
+        with timings.phase("KNX"):
+            knx_pass(documents, result)
+        with timings.phase("Abhaengigkeiten"):
+            dependency_pass(documents, result)
+        with timings.phase("Cache schreiben"):
+            save_documents(resolver.all_documents() if resolver else loaded, cache)
+        with timings.phase("Ausgabe"):
+            returncode = print_report(len(files), result)
+    return returncode
+
+
 if __name__ == "__main__":
     sys.exit(main())